@@ -0,0 +1,160 @@
+"""
+Agente para perguntas que envolvem compras e finanças ao mesmo tempo.
+Reúne o contexto da política, o item identificado e as informações de
+orçamento e aprovação em um único prompt, respondendo em uma só geração
+em vez de consultar os dois agentes e depois combinar as respostas.
+"""
+
+from typing import List, Dict, Iterator, AsyncIterator
+from .finance_agent import FinanceAgent
+from .procurement_agent import ProcurementAgent
+from utils.resources import ResourceProvider, get_provider
+from utils.streaming import stream_completion, stream_completion_async
+
+class CombinedAgent:
+    """Agente que responde perguntas de compras e finanças em uma única geração."""
+    
+    def __init__(self, resources: ResourceProvider = None, procurement_agent: ProcurementAgent = None,
+                 finance_agent: FinanceAgent = None):
+        """Inicializa o agente combinado.
+
+        Args:
+            resources: Provedor do cliente OpenAI (padrão: o do processo)
+            procurement_agent: Agente de compras usado para identificar o item
+            finance_agent: Agente financeiro usado para valores, orçamento e aprovação
+        """
+        self.resources = resources or get_provider()
+        self.finance_agent = finance_agent or FinanceAgent(self.resources)
+        self.procurement_agent = procurement_agent or ProcurementAgent(self.resources, self.finance_agent)
+        self.system_prompt = """Você é um especialista em processos de compras corporativas e finanças.
+        Responda cobrindo tanto as regras e etapas de compra quanto orçamento e aprovações.
+        Seja claro, conciso e profissional, e mencione a fonte das informações quando disponível."""
+    
+    def _facts(self, question: str, amount: float) -> List[str]:
+        """Informações estruturadas da pergunta: item, orçamento e fluxo de aprovação."""
+        facts = []
+        item_info = self.procurement_agent.identify_item_category(question)
+        if item_info:
+            facts.append(item_info["message"])
+        
+        if amount > 0:
+            ledger = self.finance_agent.ledger
+            department = item_info.get("centro_custo") if item_info else None
+            facts.append(self.finance_agent.format_budget_check(ledger.check_budget(amount, department)))
+            band = ledger.approval_band(amount)
+            if band is not None:
+                facts.append(f"Fluxo de aprovação para R$ {amount:,.2f}: {', '.join(band.approvers)} "
+                             f"(tempo estimado: {band.estimated_time}).")
+        return facts
+    
+    def _compose(self, question: str, context: List[Dict], amount: float) -> tuple:
+        """Monta a resposta direta ou as mensagens para o modelo.
+        
+        Returns:
+            tuple: (resposta, None) quando não é preciso chamar o modelo,
+                   ou (None, mensagens) caso contrário
+        """
+        facts = self._facts(question, amount)
+        if not context and not facts:
+            return "Desculpe, não encontrei informações relevantes para responder sua pergunta.", None
+        
+        context_text = "\n\n".join([
+            f"Conteúdo: {chunk['content']}\n"
+            f"Fonte: {chunk['metadata']['source']}\n"
+            f"Seção: {chunk['metadata']['section'] if 'section' in chunk['metadata'] else ''}"
+            for chunk in context
+        ])
+        facts_text = "\n".join(f"- {fact}" for fact in facts) or "- Nenhuma"
+        
+        prompt = f"""Com base nas informações de políticas de compras e financeiras abaixo, responda à pergunta do usuário
+        em uma única resposta, organizada em processo de compra e aspectos financeiros (orçamento e aprovação).
+        Se a informação não estiver disponível, diga que não tem informação suficiente.
+        
+        Contexto:
+        {context_text}
+        
+        Informações de orçamento e aprovação:
+        {facts_text}
+        
+        Pergunta: {question}
+        
+        Resposta:"""
+        
+        return None, [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def answer(self, question: str, context: List[Dict]) -> str:
+        """
+        Gera uma resposta para a pergunta usando o contexto fornecido.
+        
+        Args:
+            question: A pergunta do usuário
+            context: Lista de chunks relevantes encontrados pelo RAG
+        
+        Returns:
+            str: Resposta gerada
+        """
+        amount = self.finance_agent.extract_amount(question)
+        text, messages = self._compose(question, context, amount)
+        if text is not None:
+            return text
+        
+        try:
+            response = self.resources.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages
+            )
+            return response.choices[0].message.content
+        
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            return "Desculpe, ocorreu um erro ao processar sua pergunta."
+    
+    async def answer_async(self, question: str, context: List[Dict], async_client) -> str:
+        """Versão assíncrona de answer, usando um cliente AsyncOpenAI."""
+        amount = await self.finance_agent.extract_amount_async(question, async_client)
+        text, messages = self._compose(question, context, amount)
+        if text is not None:
+            return text
+        
+        try:
+            response = await async_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages
+            )
+            return response.choices[0].message.content
+        
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            return "Desculpe, ocorreu um erro ao processar sua pergunta."
+    
+    def stream_answer(self, question: str, context: List[Dict]) -> Iterator[str]:
+        """Versão de answer que gera a resposta em fragmentos, à medida que o modelo os produz."""
+        amount = self.finance_agent.extract_amount(question)
+        text, messages = self._compose(question, context, amount)
+        if text is not None:
+            yield text
+            return
+        
+        try:
+            yield from stream_completion(self.resources.client, messages)
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            yield "Desculpe, ocorreu um erro ao processar sua pergunta."
+    
+    async def stream_answer_async(self, question: str, context: List[Dict], async_client) -> AsyncIterator[str]:
+        """Versão assíncrona de stream_answer, usando um cliente AsyncOpenAI."""
+        amount = await self.finance_agent.extract_amount_async(question, async_client)
+        text, messages = self._compose(question, context, amount)
+        if text is not None:
+            yield text
+            return
+        
+        try:
+            async for piece in stream_completion_async(async_client, messages):
+                yield piece
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            yield "Desculpe, ocorreu um erro ao processar sua pergunta."
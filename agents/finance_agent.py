@@ -3,88 +3,26 @@ Agente especializado em questões financeiras.
 Responsável por responder perguntas sobre orçamentos e aprovações financeiras.
 """
 
-import json
 import os
-from typing import List, Dict
-from openai import OpenAI
-from dotenv import load_dotenv
+import re
+from typing import List, Dict, Optional, Iterator, AsyncIterator
 import time
-
-# Inicializa o cliente OpenAI
-client = OpenAI()
-
-# Carregar variáveis de ambiente
-load_dotenv()
-
-# Carregar regras financeiras do JSON
-try:
-    with open('data/raw/finance_rules.json', 'r', encoding='utf-8') as file:
-        FINANCE_RULES = json.load(file)
-    print("Regras financeiras carregadas com sucesso.")
-except Exception as e:
-    print(f"Erro ao carregar regras financeiras: {str(e)}")
-    FINANCE_RULES = {
-        "orcamentos": [],
-        "limites_aprovacao": []
-    }
-
-# Converter dados de orçamento para o formato usado internamente
-BUDGET_DATA = {}
-for item in FINANCE_RULES.get("orcamentos", []):
-    BUDGET_DATA[item["centro_custo"]] = {
-        "total_mensal": item["orcamento_mensal"],
-        "gasto_atual": item["orcamento_mensal"] - item["disponivel"],
-        "disponivel": item["disponivel"],
-        "responsavel": item["responsavel"]
-    }
+from utils.currency import extract_amount, extract_amounts
+from utils.budget_ledger import BudgetCheck, ApprovalBand
+from utils.resources import ResourceProvider, get_provider
+from utils.streaming import stream_completion, stream_completion_async
+
+# Respostas pré-programadas de orçamento: centro de custo de cada chave (valores do BudgetLedger)
+BUDGET_RESPONSES = {
+    "orçamento ti infra": "TI – Infraestrutura",
+    "orçamento ti ferramentas": "TI – Ferramentas",
+    "orçamento rh": "RH – Desenvolvimento",
+    "orçamento facilities": "Facilities",
+    "orçamento home office": "Facilities - Home Office"
+}
 
 # Respostas pré-programadas para demonstração
 FINANCE_RESPONSES = {
-    "orçamento ti infra": f"""
-Atualmente, o centro de custo "TI – Infraestrutura" possui:
-- Orçamento mensal: R$ {BUDGET_DATA.get("TI – Infraestrutura", {}).get("total_mensal", 0):,}
-- Valor já utilizado: R$ {BUDGET_DATA.get("TI – Infraestrutura", {}).get("gasto_atual", 0):,}
-- Disponível: R$ {BUDGET_DATA.get("TI – Infraestrutura", {}).get("disponivel", 0):,}
-
-O responsável por este orçamento é {BUDGET_DATA.get("TI – Infraestrutura", {}).get("responsavel", "Não informado")}.
-""",
-
-    "orçamento ti ferramentas": f"""
-Atualmente, o centro de custo "TI – Ferramentas" possui:
-- Orçamento mensal: R$ {BUDGET_DATA.get("TI – Ferramentas", {}).get("total_mensal", 0):,}
-- Valor já utilizado: R$ {BUDGET_DATA.get("TI – Ferramentas", {}).get("gasto_atual", 0):,}
-- Disponível: R$ {BUDGET_DATA.get("TI – Ferramentas", {}).get("disponivel", 0):,}
-
-O responsável por este orçamento é {BUDGET_DATA.get("TI – Ferramentas", {}).get("responsavel", "Não informado")}.
-""",
-
-    "orçamento rh": f"""
-Atualmente, o centro de custo "RH – Desenvolvimento" possui:
-- Orçamento mensal: R$ {BUDGET_DATA.get("RH – Desenvolvimento", {}).get("total_mensal", 0):,}
-- Valor já utilizado: R$ {BUDGET_DATA.get("RH – Desenvolvimento", {}).get("gasto_atual", 0):,}
-- Disponível: R$ {BUDGET_DATA.get("RH – Desenvolvimento", {}).get("disponivel", 0):,}
-
-O responsável por este orçamento é {BUDGET_DATA.get("RH – Desenvolvimento", {}).get("responsavel", "Não informado")}.
-""",
-
-    "orçamento facilities": f"""
-Atualmente, o centro de custo "Facilities" possui:
-- Orçamento mensal: R$ {BUDGET_DATA.get("Facilities", {}).get("total_mensal", 0):,}
-- Valor já utilizado: R$ {BUDGET_DATA.get("Facilities", {}).get("gasto_atual", 0):,}
-- Disponível: R$ {BUDGET_DATA.get("Facilities", {}).get("disponivel", 0):,}
-
-O responsável por este orçamento é {BUDGET_DATA.get("Facilities", {}).get("responsavel", "Não informado")}.
-""",
-
-    "orçamento home office": f"""
-Atualmente, o centro de custo "Facilities - Home Office" possui:
-- Orçamento mensal: R$ {BUDGET_DATA.get("Facilities - Home Office", {}).get("total_mensal", 0):,}
-- Valor já utilizado: R$ {BUDGET_DATA.get("Facilities - Home Office", {}).get("gasto_atual", 0):,}
-- Disponível: R$ {BUDGET_DATA.get("Facilities - Home Office", {}).get("disponivel", 0):,}
-
-O responsável por este orçamento é {BUDGET_DATA.get("Facilities - Home Office", {}).get("responsavel", "Não informado")}.
-""",
-
     "compra monitor 5000": """
 Para uma compra de monitor no valor de R$ 5.000:
 
@@ -160,114 +98,266 @@ Atenção: Acima de R$ 10.000, a solicitação deve incluir:
 """
 }
 
+# Modelos das respostas diretas, montadas só com os dados de finance_rules.json
+DIRECT_TEMPLATES = {
+    "orcamento_centro": """
+Atualmente, o centro de custo "{center.name}" possui:
+- Orçamento mensal: R$ {center.monthly_budget:,}
+- Valor já utilizado: R$ {center.spent:,}
+- Disponível: R$ {center.available:,}
+
+O responsável por este orçamento é {center.owner}.
+""",
+
+    "aprovacao": """
+Para uma compra de R$ {amount:,.2f}:
+
+O fluxo de aprovação requer:
+{approvers}
+
+Tempo estimado para aprovação: {band.estimated_time}
+""",
+
+    "verificacao": """
+Para uma compra de R$ {amount:,.2f} no centro de custo "{center.name}":
+
+1. Verificação orçamentária: {budget_info}
+2. Fluxo de aprovação: {approvers_inline}
+3. Tempo estimado para aprovação: {band.estimated_time}
+"""
+}
+
+# Intenções reconhecidas nas respostas diretas
+APPROVAL_INTENT = re.compile(r'\bquem\b.*\baprov|\baprova(?:r|ção|cao|dores?)?\b|fluxo de aprova')
+BUDGET_INTENT = re.compile(r'\b(?:orçamento|orcamento|verba|saldo|disponível|disponivel)\b')
+PURCHASE_INTENT = re.compile(r'\b(?:posso|pode|podemos|consigo|quero|preciso|cabe|comporta)\b|\b(?:há|ha|tem) orçamento')
+# Número inteiro sem marcador logo após um verbo de aprovação ou "orçamento" ("quem aprova 15000")
+BARE_AMOUNT_CUE = re.compile(r'\b(?:aprova(?:r|ção|cao)?|orçamento|orcamento)\s+(?:de\s+)?$')
+# Inteiros nessa faixa são tratados como ano ("orçamento 2025")
+YEAR_RANGE = (1900, 2100)
+# Perguntas que dependem do texto da política (ou de análise) não têm resposta direta
+OPEN_QUESTION = re.compile(
+    r'\b(?:como|por que|porque|processo|etapas?|documentos?|cotaç(?:ão|ões)|cotac|fornecedor(?:es)?|'
+    r'política|politica|regras?|prazo|requisição|requisicao|formulário|formulario|alternativas?|'
+    r'dividir|transferência|transferencia|realocar|justificativa)\b'
+)
+
 class FinanceAgent:
     """Agente especializado em questões financeiras."""
     
-    def __init__(self):
-        """Inicializa o agente financeiro."""
+    def __init__(self, resources: ResourceProvider = None):
+        """Inicializa o agente financeiro.
+        
+        Args:
+            resources: Provedor do cliente OpenAI e das regras (padrão: o do processo)
+        """
+        self.resources = resources or get_provider()
         self.system_prompt = """Você é um especialista em finanças corporativas.
         Sua função é responder perguntas sobre orçamentos, aprovações e regras financeiras.
         Seja claro, conciso e profissional em suas respostas.
         Sempre mencione a fonte das informações quando disponível."""
         
-        # Carrega regras financeiras
-        self.finance_rules = self._load_finance_rules()
+        # Regras financeiras, orçamentos e faixas de aprovação (compartilhados pelo provedor)
+        self.finance_rules = self.resources.finance_rules
+        self.ledger = self.resources.ledger
+        
+        # Extração de valores: local, com o LLM apenas como fallback opcional
+        self.amount_settings = self.resources.settings(
+            'amount_settings', {"min_confidence": 0.5, "llm_fallback": False})
+        
+        # Respostas diretas (sem LLM) para perguntas totalmente estruturadas; o valor
+        # precisa de marcador de moeda ou multiplicador ("R$ 5.000", "5 mil reais")
+        self.direct_settings = self.resources.settings(
+            'direct_answer_settings', {"enabled": True, "min_amount_confidence": 0.8})
     
-    def _load_finance_rules(self) -> Dict:
-        """Carrega regras financeiras do arquivo JSON."""
-        try:
-            with open('data/raw/finance_rules.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Erro ao carregar regras financeiras: {e}")
-            return {
-                "orcamentos": [],
-                "limites_aprovacao": []
-            }
+    def extract_amount(self, text: str) -> float:
+        """Extrai o valor monetário do texto (0.0 se não houver).
+        
+        Usa o parser local; o LLM só é consultado se amount_settings.llm_fallback
+        estiver habilitado e nenhum valor atingir a confiança mínima.
+        """
+        amount = extract_amount(text, self.amount_settings['min_confidence'])
+        if amount is not None:
+            return amount.value
+        if self.amount_settings['llm_fallback']:
+            return self._extract_amount(text)
+        return 0.0
+    
+    async def extract_amount_async(self, text: str, async_client) -> float:
+        """Versão assíncrona de extract_amount."""
+        amount = extract_amount(text, self.amount_settings['min_confidence'])
+        if amount is not None:
+            return amount.value
+        if self.amount_settings['llm_fallback']:
+            return await self._extract_amount_async(text, async_client)
+        return 0.0
+    
+    def _amount_messages(self, text: str) -> List[Dict]:
+        """Mensagens para extrair o valor monetário do texto."""
+        return [
+            {"role": "system", "content": "Extraia apenas o valor monetário do texto. Retorne apenas o número."},
+            {"role": "user", "content": text}
+        ]
     
     def _extract_amount(self, text: str) -> float:
         """Extrai valor monetário do texto usando OpenAI."""
         try:
-            response = client.chat.completions.create(
+            response = self.resources.client.chat.completions.create(
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Extraia apenas o valor monetário do texto. Retorne apenas o número."},
-                    {"role": "user", "content": text}
-                ]
+                messages=self._amount_messages(text)
             )
             amount = float(response.choices[0].message.content.strip())
             return amount
         except:
             return 0.0
     
+    async def _extract_amount_async(self, text: str, async_client) -> float:
+        """Versão assíncrona de _extract_amount."""
+        try:
+            response = await async_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=self._amount_messages(text)
+            )
+            return float(response.choices[0].message.content.strip())
+        except Exception:
+            return 0.0
+    
     def _get_budget_info(self, amount: float, department: str = None) -> str:
         """Verifica informações de orçamento com base no valor e departamento."""
-        # Verifica se o valor excede o orçamento total disponível
-        total_budget = sum(budget["disponivel"] for budget in BUDGET_DATA.values())
-        if amount > total_budget:
-            return f"⚠️ Alerta: O valor de R$ {amount:,.2f} excede o orçamento total disponível (R$ {total_budget:,.2f})."
-        
-        # Se for especificado um departamento, verifica o orçamento específico
-        if department and department in BUDGET_DATA:
-            available = BUDGET_DATA[department]["disponivel"]
-            if amount > available:
-                return f"⚠️ Alerta: O valor de R$ {amount:,.2f} excede o orçamento disponível para {department} (R$ {available:,.2f})."
-            else:
-                return f"✅ O departamento {department} possui orçamento disponível (R$ {available:,.2f}) para esta compra de R$ {amount:,.2f}."
-        
-        # Sugere departamentos com orçamento suficiente
-        suitable_depts = [dept for dept, data in BUDGET_DATA.items() if data["disponivel"] >= amount]
-        if suitable_depts:
-            return f"💡 Os seguintes departamentos possuem orçamento disponível para esta compra de R$ {amount:,.2f}: {', '.join(suitable_depts)}."
-        else:
-            return f"⚠️ Nenhum departamento possui orçamento disponível para o valor solicitado (R$ {amount:,.2f})."
+        return self.format_budget_check(self.ledger.check_budget(amount, department))
     
-    def answer(self, question: str, context: List[Dict]) -> str:
+    def format_budget_check(self, check: BudgetCheck) -> str:
+        """Formata o resultado de uma verificação de orçamento."""
+        amount = check.amount
+        if check.status == 'exceeds_total':
+            return f"⚠️ Alerta: O valor de R$ {amount:,.2f} excede o orçamento total disponível (R$ {check.total_available:,.2f})."
+        if check.status == 'center_insufficient':
+            return f"⚠️ Alerta: O valor de R$ {amount:,.2f} excede o orçamento disponível para {check.cost_center.name} (R$ {check.cost_center.available:,.2f})."
+        if check.status == 'center_ok':
+            return f"✅ O departamento {check.cost_center.name} possui orçamento disponível (R$ {check.cost_center.available:,.2f}) para esta compra de R$ {amount:,.2f}."
+        if check.status == 'suitable':
+            return f"💡 Os seguintes departamentos possuem orçamento disponível para esta compra de R$ {amount:,.2f}: {', '.join(center.name for center in check.suitable)}."
+        return f"⚠️ Nenhum departamento possui orçamento disponível para o valor solicitado (R$ {amount:,.2f})."
+    
+    def format_approval(self, amount: float, band: ApprovalBand) -> str:
+        """Formata o fluxo de aprovação de uma faixa para o valor."""
+        return f"""
+                        Para uma compra de R$ {amount:,.2f}:
+                        
+                        Fluxo de aprovação:
+                        {', '.join(band.approvers)}
+                        
+                        Tempo estimado: {band.estimated_time}
+                        """
+    
+    def _mentioned_amounts(self, question: str) -> List:
+        """Números da pergunta que a extração de valores trataria como dinheiro."""
+        return [amount for amount in extract_amounts(question)
+                if amount.confidence >= self.amount_settings['min_confidence']]
+    
+    def direct_amount(self, question: str) -> Optional[float]:
+        """Valor da pergunta, se houver um único e com confiança suficiente para uma resposta direta.
+        
+        Números sem marcador de moeda nem multiplicador só bastam quando são inteiros
+        logo após "aprova"/"orçamento" e não podem ser um ano ("quem aprova 15000" sim,
+        "orçamento 2025" não); nos demais casos a pergunta segue para o pipeline completo.
         """
-        Gera uma resposta para a pergunta usando o contexto fornecido.
+        amounts = self._mentioned_amounts(question)
+        if len(amounts) != 1:
+            return None
+        amount = amounts[0]
+        if amount.confidence < self.direct_settings['min_amount_confidence'] and not self._is_cued_bare_amount(
+                question, amount):
+            return None
+        return amount.value
+    
+    @staticmethod
+    def _is_cued_bare_amount(question: str, amount) -> bool:
+        """Indica se o valor é um inteiro sem marcador logo após um verbo de aprovação ou "orçamento"."""
+        if not amount.text.isdigit() or YEAR_RANGE[0] <= amount.value <= YEAR_RANGE[1]:
+            return False
+        return BARE_AMOUNT_CUE.search(question[:amount.span[0]].lower()) is not None
+    
+    def direct_answer(self, question: str) -> Optional[str]:
+        """Resposta montada só com os dados estruturados, sem chamar o modelo.
+        
+        Só responde quando a intenção (aprovação, orçamento ou verificação de compra),
+        o valor e o centro de custo necessários foram extraídos sem ambiguidade.
         
-        Args:
-            question: A pergunta do usuário
-            context: Lista de chunks relevantes encontrados pelo RAG
-            
         Returns:
-            str: Resposta gerada
+            Optional[str]: A resposta, ou None se a pergunta precisar do pipeline completo
         """
-        # Checa respostas pré-definidas para demonstração
+        predefined = self._predefined_answer(question)
+        if predefined:
+            return predefined
+        if not self.direct_settings['enabled']:
+            return None
+        
+        text = question.lower()
+        if OPEN_QUESTION.search(text):
+            return None
+        amount = self.direct_amount(question)
+        centers = self.ledger.find_cost_centers(question)
+        center = centers[0] if len(centers) == 1 else None
+        
+        # Verificação de uma compra em um centro de custo
+        if amount is not None and center is not None and (BUDGET_INTENT.search(text) or PURCHASE_INTENT.search(text)
+                                                         or APPROVAL_INTENT.search(text)):
+            band = self.ledger.approval_band(amount)
+            if band is None:
+                return None
+            check = self.ledger.check_budget(amount, center.name)
+            return DIRECT_TEMPLATES["verificacao"].format(
+                amount=amount, center=center, band=band,
+                budget_info=self.format_budget_check(check),
+                approvers_inline=', '.join(band.approvers))
+        
+        # Fluxo de aprovação de um valor
+        if amount is not None and not centers and APPROVAL_INTENT.search(text):
+            band = self.ledger.approval_band(amount)
+            if band is None:
+                return None
+            approvers = "\n".join(f"{i}. {approver}" for i, approver in enumerate(band.approvers, 1))
+            return DIRECT_TEMPLATES["aprovacao"].format(amount=amount, band=band, approvers=approvers)
+        
+        # Situação do orçamento de um centro de custo (sem nenhum valor ou ano em aberto na pergunta)
+        if (amount is None and center is not None and BUDGET_INTENT.search(text) and not APPROVAL_INTENT.search(text)
+                and not self._mentioned_amounts(question)):
+            return DIRECT_TEMPLATES["orcamento_centro"].format(center=center)
+        
+        return None
+    
+    def _predefined_answer(self, question: str) -> str:
+        """Resposta pré-definida para demonstração, se houver."""
+        question_lower = question.lower()
+        for key, center_name in BUDGET_RESPONSES.items():
+            center = self.ledger.cost_center(center_name)
+            if key in question_lower and center is not None:
+                return DIRECT_TEMPLATES["orcamento_centro"].format(center=center)
         for key, response in FINANCE_RESPONSES.items():
             if key.lower() in question.lower():
                 return response
+        return None
+    
+    def _compose(self, question: str, context: List[Dict], amount: float) -> tuple:
+        """Monta a resposta direta ou as mensagens para o modelo.
         
-        # Extrai valor monetário se presente na pergunta
-        amount = self._extract_amount(question)
-        
+        Returns:
+            tuple: (resposta, None) quando não é preciso chamar o modelo,
+                   ou (None, mensagens) caso contrário
+        """
         if not context:
             # Se não tiver contexto mas tiver valor monetário, tenta gerar uma resposta básica
             if amount > 0:
                 budget_info = self._get_budget_info(amount)
-                approval_info = ""
-                
-                for threshold in self.finance_rules.get("limites_aprovacao", []):
-                    min_val = threshold.get("valor_minimo", 0)
-                    max_val = threshold.get("valor_maximo", float("inf"))
-                    
-                    if min_val <= amount <= max_val:
-                        approval_info = f"""
-                        Para uma compra de R$ {amount:,.2f}:
-                        
-                        Fluxo de aprovação:
-                        {', '.join(threshold.get("aprovadores", []))}
-                        
-                        Tempo estimado: {threshold.get("tempo_estimado", "Não especificado")}
-                        """
-                        break
+                band = self.ledger.approval_band(amount)
                 
-                if approval_info:
-                    return budget_info + "\n\n" + approval_info
+                if band is not None:
+                    return budget_info + "\n\n" + self.format_approval(amount, band), None
                 else:
-                    return budget_info
+                    return budget_info, None
                     
-            return "Desculpe, não encontrei informações financeiras relevantes para responder sua pergunta."
+            return "Desculpe, não encontrei informações financeiras relevantes para responder sua pergunta.", None
         
         # Prepara o contexto
         context_text = "\n\n".join([
@@ -294,20 +384,109 @@ class FinanceAgent:
 
         Resposta:"""
         
+        return None, [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def answer(self, question: str, context: List[Dict]) -> str:
+        """
+        Gera uma resposta para a pergunta usando o contexto fornecido.
+        
+        Args:
+            question: A pergunta do usuário
+            context: Lista de chunks relevantes encontrados pelo RAG
+            
+        Returns:
+            str: Resposta gerada
+        """
+        # Checa respostas pré-definidas para demonstração
+        predefined = self._predefined_answer(question)
+        if predefined:
+            return predefined
+        
+        # Extrai valor monetário se presente na pergunta
+        amount = self.extract_amount(question)
+        
+        text, messages = self._compose(question, context, amount)
+        if text is not None:
+            return text
+        
         try:
             # Gera resposta usando OpenAI
-            response = client.chat.completions.create(
+            response = self.resources.client.chat.completions.create(
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": prompt}
-                ]
+                messages=messages
             )
             return response.choices[0].message.content
             
         except Exception as e:
             print(f"Erro ao gerar resposta: {e}")
             return "Desculpe, ocorreu um erro ao processar sua pergunta sobre finanças."
+    
+    async def answer_async(self, question: str, context: List[Dict], async_client) -> str:
+        """Versão assíncrona de answer, usando um cliente AsyncOpenAI."""
+        predefined = self._predefined_answer(question)
+        if predefined:
+            return predefined
+        
+        amount = await self.extract_amount_async(question, async_client)
+        
+        text, messages = self._compose(question, context, amount)
+        if text is not None:
+            return text
+        
+        try:
+            response = await async_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages
+            )
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            return "Desculpe, ocorreu um erro ao processar sua pergunta sobre finanças."
+    
+    def stream_answer(self, question: str, context: List[Dict]) -> Iterator[str]:
+        """Versão de answer que gera a resposta em fragmentos, à medida que o modelo os produz."""
+        predefined = self._predefined_answer(question)
+        if predefined:
+            yield predefined
+            return
+        
+        amount = self.extract_amount(question)
+        
+        text, messages = self._compose(question, context, amount)
+        if text is not None:
+            yield text
+            return
+        
+        try:
+            yield from stream_completion(self.resources.client, messages)
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            yield "Desculpe, ocorreu um erro ao processar sua pergunta sobre finanças."
+    
+    async def stream_answer_async(self, question: str, context: List[Dict], async_client) -> AsyncIterator[str]:
+        """Versão assíncrona de stream_answer, usando um cliente AsyncOpenAI."""
+        predefined = self._predefined_answer(question)
+        if predefined:
+            yield predefined
+            return
+        
+        amount = await self.extract_amount_async(question, async_client)
+        
+        text, messages = self._compose(question, context, amount)
+        if text is not None:
+            yield text
+            return
+        
+        try:
+            async for piece in stream_completion_async(async_client, messages):
+                yield piece
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            yield "Desculpe, ocorreu um erro ao processar sua pergunta sobre finanças."
 
 if __name__ == "__main__":
     # Iniciar assistente
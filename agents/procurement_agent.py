@@ -4,27 +4,13 @@ Responsável por responder perguntas sobre políticas de compras e processos de
 """
 
 import os
-from dotenv import load_dotenv
 import time
 import re
-from openai import OpenAI
-from typing import List, Dict
-from .finance_agent import FinanceAgent
-
-# Inicializa o cliente OpenAI
-client = OpenAI()
-
-# Carregar variáveis de ambiente
-load_dotenv()
-
-# Carregar o conteúdo da política
-try:
-    with open('data/raw/politica.md', 'r', encoding='utf-8') as file:
-        policy_content = file.read()
-    print("Política carregada com sucesso.")
-except Exception as e:
-    print(f"Erro ao carregar a política: {str(e)}")
-    policy_content = ""
+from typing import List, Dict, Optional, Iterator, AsyncIterator
+from .finance_agent import FinanceAgent, APPROVAL_INTENT, PURCHASE_INTENT, OPEN_QUESTION
+from utils.keyword_matcher import KeywordMatcher
+from utils.resources import ResourceProvider, get_provider
+from utils.streaming import stream_completion, stream_completion_async
 
 # Categorias de itens permitidos e proibidos
 ITEM_CATEGORIES = {
@@ -36,13 +22,48 @@ ITEM_CATEGORIES = {
     "proibidos": ["presente", "pessoal", "uso particular", "streaming", "netflix", "spotify", "bebida", "alcool", "álcool", "cerveja", "vinho", "camisa", "roupa", "vestuário", "vestuario"]
 }
 
+# Autômato com todas as palavras-chave do catálogo, montado uma única vez
+ITEM_MATCHER = KeywordMatcher(ITEM_CATEGORIES)
+
+# Padrões para extrair o nome do item da pergunta
+ITEM_PATTERNS = [
+    re.compile(r'(?:comprar|adquirir|requisitar)\s+(?:um|uma|uns|umas|o|a|os|as)?\s+([a-záàâãéèêíïóôõöúçñ\s]+?)(?:\s+(?:de|para|com|por|no valor|que custa))'),
+    re.compile(r'(?:sobre|para)\s+(?:um|uma|uns|umas|o|a|os|as)?\s+([a-záàâãéèêíïóôõöúçñ\s]+?)(?:\s+(?:de|para|com|por|no valor|que custa))'),
+    re.compile(r'(?:compra|aquisição)\s+(?:de|da|do)?\s+(?:um|uma|uns|umas|o|a|os|as)?\s+([a-záàâãéèêíïóôõöúçñ\s]+?)(?:\s+(?:de|para|com|por|no valor|que custa))')
+]
+
+# Termos que indicam compra para home office
+HOME_OFFICE_CONTEXT = re.compile(r'home office|casa|remoto|remota|residência')
+
+# Quantidade de itens ("5 notebooks", "R$ 800 cada"): o valor citado não é o total da compra
+QUANTITY_BEFORE_ITEM = re.compile(r'\b(?:\d+|dois|duas|três|tres|quatro|cinco|seis|sete|oito|nove|dez)\s+$')
+EACH_CUE = re.compile(r'\bcada\b')
+
+# Modelos das respostas diretas sobre itens (sem LLM)
+DIRECT_ITEM_TEMPLATES = {
+    "permitido": """✅ {item_info[message]}
+
+{budget_info}
+
+Fluxo de aprovação: {approvers} ({band.estimated_time}).""",
+
+    "proibido": """❌ {item_info[message]}
+
+Por favor, consulte a política de compras para mais detalhes sobre itens permitidos."""
+}
+
 class ProcurementAgent:
     """Agente especializado em questões de compras."""
     
-    def __init__(self):
-        """Inicializa o agente de compras."""
-        self.finance_agent = FinanceAgent()
-        self.policy = policy_content
+    def __init__(self, resources: ResourceProvider = None, finance_agent: FinanceAgent = None):
+        """Inicializa o agente de compras.
+        
+        Args:
+            resources: Provedor do cliente OpenAI e da política (padrão: o do processo)
+            finance_agent: Agente financeiro a consultar (padrão: um novo, com o mesmo provedor)
+        """
+        self.resources = resources or get_provider()
+        self.finance_agent = finance_agent or FinanceAgent(self.resources)
         self.conversation_memory = {
             "last_item": None,
             "last_value": None,
@@ -50,110 +71,52 @@ class ProcurementAgent:
             "history": []
         }
     
+    @property
+    def policy(self) -> str:
+        """Texto da política de compras (carregado no primeiro acesso)."""
+        return self.resources.policy
+    
     def extract_monetary_value(self, query):
         """Extrai valores monetários da consulta do usuário."""
-        query_lower = query.lower()
-        
-        # Padrão para encontrar valores em diversos formatos
-        patterns = [
-            r'r\$\s*(\d+[\.,]?\d*)', # R$ 5.000 ou R$5000
-            r'(\d+)[\.,]?(\d*)\s*reais', # 5.000 reais ou 5000 reais
-            r'(\d+)[\.,]?(\d*)\s*mil', # 5 mil ou 5.5 mil
-            r'valor\s*de\s*(\d+)[\.,]?(\d*)', # valor de 5.000
-            r'custa\s*(\d+)[\.,]?(\d*)', # custa 5.000
-            r'(\d+)[\.,]?(\d*)\s*k', # 5k ou 5.5k
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, query_lower)
-            if matches:
-                # Se encontrou algo, tenta converter para um número
-                try:
-                    if "mil" in pattern or "k" in pattern:
-                        # Para valores como "5 mil" ou "5k"
-                        if isinstance(matches[0], tuple):
-                            value = matches[0][0]
-                            decimal = matches[0][1] if len(matches[0]) > 1 and matches[0][1] else "0"
-                            if decimal:
-                                return float(f"{value}.{decimal}") * 1000
-                            else:
-                                return float(value) * 1000
-                        else:
-                            return float(matches[0]) * 1000
-                    
-                    elif isinstance(matches[0], tuple):
-                        # Se o padrão tem grupos separados por vírgula ou ponto
-                        if len(matches[0]) > 1 and matches[0][1]:  # Se tem casas decimais
-                            number = f"{matches[0][0]}.{matches[0][1]}"
-                        else:
-                            number = matches[0][0]
-                    else:
-                        # Se o valor está em um único grupo
-                        number = matches[0].replace('.', '').replace(',', '.')
-                    
-                    return float(number)
-                except:
-                    pass
-        
-        return None
+        return self.finance_agent.extract_amount(query) or None
+    
+    async def extract_monetary_value_async(self, query, async_client):
+        """Versão assíncrona de extract_monetary_value (o fallback no modelo não bloqueia o laço de eventos)."""
+        return await self.finance_agent.extract_amount_async(query, async_client) or None
     
     def identify_item_category(self, query):
         """Identifica a categoria do item mencionado na consulta."""
         query_lower = query.lower()
         
-        # Extrai o que parece ser o nome do item
-        item_patterns = [
-            r'(?:comprar|adquirir|requisitar)\s+(?:um|uma|uns|umas|o|a|os|as)?\s+([a-záàâãéèêíïóôõöúçñ\s]+?)(?:\s+(?:de|para|com|por|no valor|que custa))',
-            r'(?:sobre|para)\s+(?:um|uma|uns|umas|o|a|os|as)?\s+([a-záàâãéèêíïóôõöúçñ\s]+?)(?:\s+(?:de|para|com|por|no valor|que custa))',
-            r'(?:compra|aquisição)\s+(?:de|da|do)?\s+(?:um|uma|uns|umas|o|a|os|as)?\s+([a-záàâãéèêíïóôõöúçñ\s]+?)(?:\s+(?:de|para|com|por|no valor|que custa))'
-        ]
-        
         extracted_item = None
         
-        # Tenta extrair o nome do item usando os padrões acima
-        for pattern in item_patterns:
-            matches = re.findall(pattern, query_lower)
-            if matches:
-                extracted_item = matches[0].strip()
+        # Tenta extrair o nome do item usando os padrões pré-compilados
+        for pattern in ITEM_PATTERNS:
+            match = pattern.search(query_lower)
+            if match:
+                extracted_item = match.group(1).strip()
                 break
         
-        # Se não conseguiu extrair, procura por palavras-chave
+        # Se não conseguiu extrair, usa a palavra-chave de maior prioridade do catálogo
         if not extracted_item:
-            for category, keywords in ITEM_CATEGORIES.items():
-                for keyword in keywords:
-                    if keyword in query_lower:
-                        extracted_item = keyword
-                        break
-                if extracted_item:
-                    break
+            first_hit = KeywordMatcher.first(ITEM_MATCHER.find_all(query_lower))
+            if first_hit:
+                extracted_item = first_hit.keyword
         
         # Verificar se o contexto indica home office
-        is_home_office = "home office" in query_lower or "casa" in query_lower or "remoto" in query_lower or "remota" in query_lower or "residência" in query_lower
+        is_home_office = HOME_OFFICE_CONTEXT.search(query_lower) is not None
         
         # Verifica em qual categoria o item se encaixa
         if extracted_item:
-            # Verificar se é um item que pode ser tanto de escritório quanto de home office
-            is_furniture = False
-            for keyword in ITEM_CATEGORIES["mobiliario"]:
-                if keyword in extracted_item:
-                    is_furniture = True
-                    break
+            # Uma única passada encontra todas as categorias presentes no item
+            hits = ITEM_MATCHER.find_all(extracted_item)
             
-            is_home_office_item = False
-            for keyword in ITEM_CATEGORIES["home_office"]:
-                if keyword in extracted_item:
-                    is_home_office_item = True
-                    break
+            # Verificar se é um item que pode ser tanto de escritório quanto de home office
+            is_furniture = any(hit.category == "mobiliario" for hit in hits)
             
-            # Define a categoria do item
-            item_category = None
-            for category, keywords in ITEM_CATEGORIES.items():
-                for keyword in keywords:
-                    if keyword in extracted_item:
-                        item_category = category
-                        break
-                if item_category:
-                    break
+            # Define a categoria do item (primeira categoria do catálogo encontrada)
+            first_hit = KeywordMatcher.first(hits)
+            item_category = first_hit.category if first_hit else None
             
             # Ajusta a categoria para home office se necessário
             if is_furniture and is_home_office:
@@ -193,36 +156,93 @@ class ProcurementAgent:
         
         return None
     
-    def answer(self, question: str, context: List[Dict]) -> str:
+    def direct_answer(self, question: str) -> Optional[str]:
+        """Resposta sobre a compra de um item montada só com dados estruturados, sem chamar o modelo.
+        
+        Responde quando a pergunta pede para comprar (ou aprovar) um item do catálogo:
+        itens proibidos são recusados; os demais precisam de um valor sem ambiguidade,
+        verificado no centro de custo da categoria do item.
+        
+        Returns:
+            Optional[str]: A resposta, ou None se a pergunta precisar do pipeline completo
         """
-        Gera uma resposta para a pergunta usando o contexto fornecido.
+        if not self.finance_agent.direct_settings['enabled']:
+            return None
+        text = question.lower()
+        if OPEN_QUESTION.search(text) or not (PURCHASE_INTENT.search(text) or APPROVAL_INTENT.search(text)):
+            return None
+        hits = ITEM_MATCHER.find_words(text)
+        if not hits:
+            return None
+        # Com quantidade, o total da compra não é o valor citado
+        if EACH_CUE.search(text) or any(QUANTITY_BEFORE_ITEM.search(text[:hit.start]) for hit in hits):
+            return None
+        
+        item_info = self.identify_item_category(question)
+        if not item_info or not item_info["category"] or not self._is_word_match(item_info):
+            return None
+        if not item_info["allowed"]:
+            return DIRECT_ITEM_TEMPLATES["proibido"].format(item_info=item_info)
+        
+        amount = self.finance_agent.direct_amount(question)
+        if amount is None or not item_info["centro_custo"]:
+            return None
+        # Um centro de custo citado diferente do da categoria do item fica para o pipeline completo
+        centers = self.finance_agent.ledger.find_cost_centers(question)
+        if centers and [center.name for center in centers] != [item_info["centro_custo"]]:
+            return None
+        band = self.finance_agent.ledger.approval_band(amount)
+        if band is None:
+            return None
+        self.conversation_memory["last_value"] = amount
+        check = self.finance_agent.ledger.check_budget(amount, item_info["centro_custo"])
+        return DIRECT_ITEM_TEMPLATES["permitido"].format(
+            item_info=item_info, band=band,
+            budget_info=self.finance_agent.format_budget_check(check),
+            approvers=', '.join(band.approvers))
+    
+    @staticmethod
+    def _is_word_match(item_info: Dict) -> bool:
+        """Indica se a categoria do item vem de uma palavra inteira do item, e não de um trecho dela."""
+        categories = {hit.category for hit in ITEM_MATCHER.find_words(item_info["item"])}
+        if item_info["category"] == "home_office":
+            return bool(categories & {"home_office", "mobiliario"})
+        return item_info["category"] in categories
+    
+    def _is_finance_question(self, question: str) -> bool:
+        """Indica se a pergunta deve ser delegada ao agente financeiro."""
+        return any(keyword in question.lower() for keyword in ['orçamento', 'valor', 'custo', 'preço', 'financeiro'])
+    
+    def _analyze(self, question: str, monetary_value: Optional[float]) -> tuple:
+        """Identifica o item da pergunta e a consulta a fazer ao agente financeiro.
         
         Args:
             question: A pergunta do usuário
-            context: Lista de chunks relevantes encontrados pelo RAG
-            
+            monetary_value: Valor já extraído da pergunta (pela versão síncrona ou assíncrona)
+        
         Returns:
-            str: Resposta gerada
+            tuple: (item_info, monetary_value, finance_query)
         """
-        # Se a pergunta envolve aspectos financeiros, delega para o agente financeiro
-        if any(keyword in question.lower() for keyword in ['orçamento', 'valor', 'custo', 'preço', 'financeiro']):
-            return self.finance_agent.answer(question, context)
-        
-        # Tenta extrair informações sobre item e valor
+        # Tenta extrair informações sobre o item
         item_info = self.identify_item_category(question)
-        monetary_value = self.extract_monetary_value(question)
         
         # Atualiza a memória de conversação
         if monetary_value:
             self.conversation_memory["last_value"] = monetary_value
         
         # Consulta o agente financeiro se a pergunta envolver valores financeiros
-        finance_info = None
+        finance_query = None
         if monetary_value and item_info and item_info["centro_custo"]:
-            finance_context = []  # Contexto vazio para uma resposta mais concisa
             finance_query = f"Posso fazer uma compra de {monetary_value} reais para o centro de custo {item_info['centro_custo']}?"
-            finance_info = self.finance_agent.answer(finance_query, finance_context)
+        return item_info, monetary_value, finance_query
+    
+    def _compose(self, question: str, context: List[Dict], item_info, monetary_value, finance_info) -> tuple:
+        """Monta a resposta direta ou as mensagens para o modelo.
         
+        Returns:
+            tuple: (resposta, None) quando não é preciso chamar o modelo,
+                   ou (None, mensagens) caso contrário
+        """
         # Se identificou um item ou valor, gera uma resposta enriquecida
         if item_info or monetary_value:
             # Adiciona informações do contexto
@@ -269,11 +289,11 @@ class ProcurementAgent:
                 response_parts.append("\nInformações adicionais da política de compras:")
                 response_parts.append(enriched_context)
             
-            return "\n\n".join(response_parts)
+            return "\n\n".join(response_parts), None
         
         # Se não conseguiu extrair informações específicas, usa o método padrão
         if not context:
-            return "Desculpe, não encontrei informações relevantes para responder sua pergunta."
+            return "Desculpe, não encontrei informações relevantes para responder sua pergunta.", None
         
         # Prepara o contexto
         context_text = "\n\n".join([
@@ -294,20 +314,120 @@ class ProcurementAgent:
 
         Resposta:"""
         
+        return None, [
+            {"role": "system", "content": "Você é um especialista em processos de compras corporativas."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def answer(self, question: str, context: List[Dict]) -> str:
+        """
+        Gera uma resposta para a pergunta usando o contexto fornecido.
+        
+        Args:
+            question: A pergunta do usuário
+            context: Lista de chunks relevantes encontrados pelo RAG
+            
+        Returns:
+            str: Resposta gerada
+        """
+        # Se a pergunta envolve aspectos financeiros, delega para o agente financeiro
+        if self._is_finance_question(question):
+            return self.finance_agent.answer(question, context)
+        
+        item_info, monetary_value, finance_query = self._analyze(question, self.extract_monetary_value(question))
+        finance_info = None
+        if finance_query:
+            finance_context = []  # Contexto vazio para uma resposta mais concisa
+            finance_info = self.finance_agent.answer(finance_query, finance_context)
+        
+        text, messages = self._compose(question, context, item_info, monetary_value, finance_info)
+        if text is not None:
+            return text
+        
         try:
             # Gera resposta usando OpenAI
-            response = client.chat.completions.create(
+            response = self.resources.client.chat.completions.create(
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Você é um especialista em processos de compras corporativas."},
-                    {"role": "user", "content": prompt}
-                ]
+                messages=messages
             )
             return response.choices[0].message.content
             
         except Exception as e:
             print(f"Erro ao gerar resposta: {e}")
             return "Desculpe, ocorreu um erro ao processar sua pergunta sobre compras."
+    
+    async def answer_async(self, question: str, context: List[Dict], async_client) -> str:
+        """Versão assíncrona de answer, usando um cliente AsyncOpenAI."""
+        if self._is_finance_question(question):
+            return await self.finance_agent.answer_async(question, context, async_client)
+        
+        monetary_value = await self.extract_monetary_value_async(question, async_client)
+        item_info, monetary_value, finance_query = self._analyze(question, monetary_value)
+        finance_info = None
+        if finance_query:
+            finance_info = await self.finance_agent.answer_async(finance_query, [], async_client)
+        
+        text, messages = self._compose(question, context, item_info, monetary_value, finance_info)
+        if text is not None:
+            return text
+        
+        try:
+            response = await async_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages
+            )
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            return "Desculpe, ocorreu um erro ao processar sua pergunta sobre compras."
+    
+    def stream_answer(self, question: str, context: List[Dict]) -> Iterator[str]:
+        """Versão de answer que gera a resposta em fragmentos, à medida que o modelo os produz."""
+        if self._is_finance_question(question):
+            yield from self.finance_agent.stream_answer(question, context)
+            return
+        
+        item_info, monetary_value, finance_query = self._analyze(question, self.extract_monetary_value(question))
+        finance_info = None
+        if finance_query:
+            finance_info = self.finance_agent.answer(finance_query, [])
+        
+        text, messages = self._compose(question, context, item_info, monetary_value, finance_info)
+        if text is not None:
+            yield text
+            return
+        
+        try:
+            yield from stream_completion(self.resources.client, messages)
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            yield "Desculpe, ocorreu um erro ao processar sua pergunta sobre compras."
+    
+    async def stream_answer_async(self, question: str, context: List[Dict], async_client) -> AsyncIterator[str]:
+        """Versão assíncrona de stream_answer, usando um cliente AsyncOpenAI."""
+        if self._is_finance_question(question):
+            async for piece in self.finance_agent.stream_answer_async(question, context, async_client):
+                yield piece
+            return
+        
+        monetary_value = await self.extract_monetary_value_async(question, async_client)
+        item_info, monetary_value, finance_query = self._analyze(question, monetary_value)
+        finance_info = None
+        if finance_query:
+            finance_info = await self.finance_agent.answer_async(finance_query, [], async_client)
+        
+        text, messages = self._compose(question, context, item_info, monetary_value, finance_info)
+        if text is not None:
+            yield text
+            return
+        
+        try:
+            async for piece in stream_completion_async(async_client, messages):
+                yield piece
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            yield "Desculpe, ocorreu um erro ao processar sua pergunta sobre compras."
 
 if __name__ == "__main__":
     # Iniciar assistente
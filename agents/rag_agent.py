@@ -3,114 +3,349 @@ Agente responsável por buscar informações relevantes nos documentos.
 Utiliza RAG (Retrieval Augmented Generation) para encontrar e processar informações.
 """
 
-import json
 import os
-from typing import List, Dict
-from openai import OpenAI
+import threading
+from typing import List, Dict, Iterable
 import numpy as np
-from dotenv import load_dotenv
 import faiss
-
-# Carrega variáveis de ambiente
-load_dotenv()
-
-# Inicializa o cliente OpenAI
-client = OpenAI()
+from utils.embedding_store import EmbeddingStore, normalize_vectors, vector_id
+from utils.vector_index import (load_or_build_index, build_index, update_index,
+                                apply_search_params, save_index)
+from utils.batch_embedder import BatchEmbedder
+from utils.embedding_cache import QueryEmbeddingCache
+from utils.micro_batcher import MicroBatcher
+from utils.resources import ResourceProvider, get_provider
 
 class RAGAgent:
     """Agente responsável por buscar informações relevantes nos documentos."""
     
-    def __init__(self):
-        """Inicializa o agente RAG."""
-        self.config = self._load_config()
+    def __init__(self, resources: ResourceProvider = None):
+        """Inicializa o agente RAG.
+        
+        Args:
+            resources: Provedor do cliente OpenAI e da configuração (padrão: o do processo)
+        """
+        self.resources = resources or get_provider()
+        self.config = self.resources.config
+        self.store = None
+        self.index = None
+        self.index_spec = None
+        self.row_by_vector_id = {}
+        self._update_lock = threading.RLock()
+        self._embedder = None
+        self.query_cache = QueryEmbeddingCache.from_settings(
+            self.config.get('cache_settings', {}), self.config['embedding_settings']['model'])
+        # Perguntas simultâneas compartilham uma chamada de embeddings e uma busca no índice
+        self.batcher = self._create_batcher()
         self.embeddings, self.contents, self.metadata = self._load_embeddings()
         self.index = self._create_index(self.embeddings) if len(self.embeddings) > 0 else None
     
-    def _load_config(self) -> Dict:
-        """Carrega configuração do arquivo."""
-        try:
-            with open('config/rag_config.json', 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Erro ao carregar configuração: {e}")
-            return {
-                "embedding_settings": {
-                    "model": "text-embedding-ada-002"
-                }
-            }
-    
     def _load_embeddings(self) -> tuple:
-        """Carrega todos os embeddings e seus conteúdos."""
-        embeddings = []
-        contents = []
-        metadata = []
-        
+        """Abre o armazenamento binário de embeddings (mapeado em memória, sem cópia)."""
         try:
-            # Carrega embeddings do diretório
-            for root, _, files in os.walk('data/embeddings'):
-                for file in files:
-                    if file.endswith('.json'):
-                        with open(os.path.join(root, file), 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            embeddings.append(data['embedding'])
-                            contents.append(data['content'])
-                            metadata.append(data['metadata'])
+            self.store = EmbeddingStore()
         except Exception as e:
             print(f"Erro ao carregar embeddings: {e}")
         
-        if not embeddings:
+        if self.store is None or self.store.live_count == 0:
             print("Nenhum embedding encontrado. Execute o setup.py primeiro.")
             return np.array([]), [], []
         
-        return np.array(embeddings), contents, metadata
+        if not self.store.normalized:
+            # Armazenamentos antigos: normaliza em memória para a busca por cosseno
+            print("Embeddings não normalizados. Execute o setup.py novamente para evitar esta cópia.")
+            self.store.vectors = normalize_vectors(self.store.vectors)
+        
+        return self.store.vectors, self.store.contents, self.store.metadata
     
     def _create_index(self, embeddings: np.ndarray) -> faiss.Index:
-        """Cria um índice FAISS para busca de similaridade."""
+        """Carrega o índice FAISS persistido, reconstruindo-o só se o corpus mudou."""
         if len(embeddings) == 0:
             return None
             
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(embeddings)
+        index, self.index_spec = load_or_build_index(self.store, self._index_settings())
+        self.row_by_vector_id = dict(zip(self.store.live_vector_ids().tolist(), self.store.live_rows()))
         return index
     
+    def _index_settings(self) -> Dict:
+        """Configurações do índice em search_settings.index."""
+        return self.config.get('search_settings', {}).get('index', {})
+    
+    def _reload(self) -> None:
+        """Reabre o índice e os chunks a partir do armazenamento atual."""
+        self.embeddings, self.contents, self.metadata = self.store.vectors, self.store.contents, self.store.metadata
+        self.index = self._create_index(self.embeddings) if self.store.live_count > 0 else None
+    
+    def reload_if_changed(self) -> bool:
+        """Recarrega o corpus se outro processo (ex.: setup ou CLI) o alterou."""
+        with self._update_lock:
+            if self.store is None:
+                self.store = EmbeddingStore()
+            elif not self.store.refresh():
+                return False
+            self._reload()
+            return True
+    
+    def _create_batcher(self) -> MicroBatcher:
+        """Agrupador de perguntas configurado em batching_settings (None se desabilitado)."""
+        return MicroBatcher.from_settings(self._lookup_batch, self.config.get('batching_settings'), 'query-batcher')
+    
+    def after_fork(self) -> None:
+        """Descarta o que não pode ser herdado de outro processo (gerador de embeddings, SQLite e threads)."""
+        self._embedder = None
+        if self.query_cache is not None:
+            self.query_cache.reopen()
+        self.batcher = self._create_batcher()
+    
+    def get_embedder(self) -> BatchEmbedder:
+        """Gerador de embeddings em lote usado para novos chunks."""
+        if self._embedder is None:
+            embedding_settings = self.config['embedding_settings']
+            self._embedder = BatchEmbedder(self.resources.client, embedding_settings['model'], embedding_settings)
+        return self._embedder
+    
+    def _open_store(self) -> EmbeddingStore:
+        """Armazenamento de embeddings, aberto (ainda vazio) se não havia nenhum."""
+        if self.store is None:
+            self.reload_if_changed()
+        return self.store
+    
+    def _apply_index_update(self, remove_ids: List[int], records: List[Dict], rewritten: bool = False) -> None:
+        """Atualiza o índice em memória e persistido após uma alteração no armazenamento.
+        
+        rewritten indica que o armazenamento foi regravado (ex.: compactado) e
+        suas linhas renumeradas, caso em que o mapa de linhas é refeito.
+        """
+        add_ids = [vector_id(r['id']) for r in records]
+        vectors = normalize_vectors([r['embedding'] for r in records]) if records else None
+        
+        # Altera uma cópia do índice; buscas em andamento continuam usando o atual
+        index = None
+        if self.index is not None:
+            try:
+                index = faiss.clone_index(self.index)
+                if not update_index(index, remove_ids, vectors, add_ids):
+                    index = None
+            except RuntimeError:
+                index = None
+        
+        if index is None:
+            # O índice não suporta a operação (ex.: remoção em HNSW): reconstrói
+            index, self.index_spec = load_or_build_index(self.store, self._index_settings())
+        else:
+            save_index(index, self.store.corpus_hash, self.index_spec, self.store.path)
+            apply_search_params(index, self._index_settings())
+        
+        if rewritten:
+            row_by_vector_id = dict(zip(self.store.live_vector_ids().tolist(), self.store.live_rows()))
+        else:
+            row_by_vector_id = dict(self.row_by_vector_id)
+            for vid in remove_ids:
+                row_by_vector_id.pop(vid, None)
+            for record, vid in zip(records, add_ids):
+                row_by_vector_id[vid] = self.store.row_by_id[record['id']]
+        
+        self.embeddings, self.contents, self.metadata = self.store.vectors, self.store.contents, self.store.metadata
+        self.row_by_vector_id = row_by_vector_id
+        self.index = index if self.store.live_count > 0 else None
+    
+    def upsert(self, chunks: List[Dict]) -> Dict:
+        """Insere ou atualiza chunks sem reconstruir o índice.
+        
+        Cada chunk deve ter 'id', 'content' e 'metadata'; 'embedding' é
+        gerado quando ausente.
+        """
+        missing = [chunk for chunk in chunks if not chunk.get('embedding')]
+        if missing:
+            for chunk, embedding in zip(missing, self.get_embedder().embed([c['content'] for c in missing])):
+                chunk['embedding'] = embedding
+        records = [chunk for chunk in chunks if chunk.get('embedding')]
+        if not records:
+            return {'added': [], 'replaced': []}
+        
+        with self._update_lock, self._open_store().lock:
+            self.reload_if_changed()
+            generation = self.store.manifest.get('generation')
+            result = self.store.upsert(records)
+            records = list({r['id']: r for r in records}.values())
+            # Armazenamentos antigos ou vazios são regravados por inteiro no upsert
+            self._apply_index_update([vector_id(i) for i in result['replaced']], records,
+                                     rewritten=self.store.manifest.get('generation') != generation)
+        return result
+    
+    def delete(self, chunk_ids: Iterable[str]) -> List[str]:
+        """Remove chunks pelo id sem reconstruir o índice."""
+        with self._update_lock, self._open_store().lock:
+            self.reload_if_changed()
+            removed = self.store.delete(chunk_ids)
+            if removed:
+                self._apply_index_update([vector_id(i) for i in removed], [])
+        return removed
+    
     def _get_embedding(self, text: str) -> List[float]:
-        """Gera embedding para o texto usando OpenAI API."""
+        """Gera embedding para o texto usando OpenAI API (consultando o cache de perguntas)."""
+        if self.query_cache is not None:
+            cached = self.query_cache.get(text)
+            if cached is not None:
+                return cached
         try:
-            response = client.embeddings.create(
+            response = self.resources.client.embeddings.create(
                 input=text,
                 model=self.config['embedding_settings']['model']
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
         except Exception as e:
             print(f"Erro ao gerar embedding: {e}")
             return None
+        if self.query_cache is not None:
+            self.query_cache.put(text, embedding)
+        return embedding
+    
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings de várias perguntas em uma única chamada à API (None nas que falharem)."""
+        embeddings = [self.query_cache.get(text) if self.query_cache is not None else None for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+        try:
+            response = self.resources.client.embeddings.create(
+                input=[texts[i] for i in missing],
+                model=self.config['embedding_settings']['model']
+            )
+        except Exception as e:
+            print(f"Erro ao gerar embeddings: {e}")
+            return embeddings
+        for i, item in zip(missing, sorted(response.data, key=lambda item: item.index)):
+            embeddings[i] = item.embedding
+            if self.query_cache is not None:
+                self.query_cache.put(texts[i], item.embedding)
+        return embeddings
+    
+    def _lookup_batch(self, queries: List[str]) -> List[tuple]:
+        """Embedding normalizado e resultados da busca de cada pergunta de um lote."""
+        embeddings = self._embed_texts(queries)
+        found = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        results = [(None, [])] * len(queries)
+        if found:
+            matrix = normalize_vectors([embeddings[i] for i in found])
+            for i, vector, hits in zip(found, matrix, self.search_by_embeddings(matrix)):
+                results[i] = (vector, hits)
+        return results
+    
+    def embed_and_search(self, query: str) -> tuple:
+        """Embedding normalizado da pergunta (None em caso de erro) e chunks mais próximos.
+        
+        Com o agrupador habilitado, a pergunta entra no lote das que chegarem ao mesmo tempo.
+        """
+        if self.batcher is not None:
+            return self.batcher.run(query)
+        query_embedding = self.embed_query(query)
+        if query_embedding is None:
+            return None, []
+        return query_embedding, self.search_by_embedding(query_embedding)
+    
+    async def embed_and_search_async(self, query: str, async_client) -> tuple:
+        """Versão assíncrona de embed_and_search.
+        
+        Com o agrupador habilitado, a pergunta entra no mesmo lote das chamadas síncronas
+        (sem bloquear o laço de eventos); sem ele, usa o cliente AsyncOpenAI.
+        """
+        if self.batcher is not None:
+            return await self.batcher.run_async(query)
+        query_embedding = await self.embed_query_async(query, async_client)
+        if query_embedding is None:
+            return None, []
+        return query_embedding, self.search_by_embedding(query_embedding)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embedding normalizado da pergunta (None em caso de erro)."""
+        embedding = self._get_embedding(query)
+        if not embedding:
+            return None
+        return normalize_vectors([embedding])[0]
+    
+    async def embed_query_async(self, query: str, async_client) -> np.ndarray:
+        """Versão assíncrona de embed_query, usando um cliente AsyncOpenAI."""
+        embedding = self.query_cache.get(query) if self.query_cache is not None else None
+        if embedding is None:
+            try:
+                response = await async_client.embeddings.create(
+                    input=query,
+                    model=self.config['embedding_settings']['model']
+                )
+                embedding = response.data[0].embedding
+            except Exception as e:
+                print(f"Erro ao gerar embedding: {e}")
+                return None
+            if self.query_cache is not None:
+                self.query_cache.put(query, embedding)
+        return normalize_vectors([embedding])[0]
     
-    def search(self, query: str, k: int = 3) -> List[Dict]:
-        """Busca chunks similares à query."""
+    def search(self, query: str, k: int = None, query_embedding: np.ndarray = None) -> List[Dict]:
+        """Busca chunks similares à query (similaridade de cosseno).
+        
+        query_embedding permite reutilizar um embedding já calculado com embed_query.
+        """
         if not self.index or len(self.contents) == 0:
             print("Nenhum embedding disponível para busca. Execute o setup.py primeiro.")
             return []
-            
+        
         # Gera embedding para a query
-        query_embedding = self._get_embedding(query)
-        if not query_embedding:
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+            if query_embedding is None:
+                return []
+        
+        return self.search_by_embedding(query_embedding, k)
+    
+    async def search_async(self, query: str, async_client, k: int = None,
+                           query_embedding: np.ndarray = None) -> List[Dict]:
+        """Versão assíncrona de search; só a geração do embedding é feita pela rede."""
+        if not self.index or len(self.contents) == 0:
+            print("Nenhum embedding disponível para busca. Execute o setup.py primeiro.")
             return []
         
-        # Busca chunks similares
-        distances, indices = self.index.search(np.array([query_embedding]), k)
-        
-        # Prepara resultados
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.contents):
-                results.append({
-                    'content': self.contents[idx],
-                    'metadata': self.metadata[idx],
-                    'similarity': float(1 / (1 + distances[0][i]))  # Converte distância para similaridade
-                })
+        if query_embedding is None:
+            query_embedding = await self.embed_query_async(query, async_client)
+            if query_embedding is None:
+                return []
         
-        return results
+        return self.search_by_embedding(query_embedding, k)
+    
+    def search_by_embedding(self, query_embedding: np.ndarray, k: int = None) -> List[Dict]:
+        """Busca no índice os chunks mais próximos de um embedding de pergunta."""
+        return self.search_by_embeddings([query_embedding], k)[0]
+    
+    def search_by_embeddings(self, query_embeddings: np.ndarray, k: int = None) -> List[List[Dict]]:
+        """Busca de várias perguntas em uma única consulta ao índice (uma lista de resultados por pergunta)."""
+        # Captura o estado atual; atualizações concorrentes trocam as referências
+        index, row_by_vector_id = self.index, self.row_by_vector_id
+        contents, metadata = self.contents, self.metadata
+        if not index or len(contents) == 0:
+            return [[] for _ in range(len(query_embeddings))]
+            
+        search_settings = self.config.get('search_settings', {})
+        k = k or search_settings.get('top_k', 3)
+        threshold = search_settings.get('similarity_threshold', 0.0)
+        
+        # Busca chunks similares (produto interno entre vetores normalizados = cosseno)
+        scores, ids = index.search(normalize_vectors(query_embeddings), k)
+        
+        # Prepara resultados, descartando os que ficam abaixo do limiar
+        batch_results = []
+        for query_scores, query_ids in zip(scores, ids):
+            results = []
+            for score, vid in zip(query_scores, query_ids):
+                row = row_by_vector_id.get(int(vid))
+                if row is not None and score >= threshold:
+                    results.append({
+                        'content': contents[row],
+                        'metadata': metadata[row],
+                        'similarity': float(score)
+                    })
+            batch_results.append(results)
+        
+        return batch_results
 
 def generate_response(query: str, similar_chunks: List[Dict]) -> str:
     """Gera resposta usando os chunks similares encontrados."""
@@ -135,7 +370,7 @@ Resposta:"""
     
     try:
         # Gera resposta usando OpenAI
-        response = client.chat.completions.create(
+        response = get_provider().client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "Você é um assistente especializado em políticas de compras e regras financeiras."},
@@ -3,31 +3,112 @@ Coordenador principal do sistema.
 Gerencia a comunicação entre os diferentes agentes e coordena o fluxo de processamento.
 """
 
-from typing import Dict, List, Optional
+import asyncio
+import contextvars
+import threading
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 from agents.rag_agent import RAGAgent
-from agents.procurement_agent import ProcurementAgent
+from agents.procurement_agent import ProcurementAgent, ITEM_CATEGORIES
 from agents.finance_agent import FinanceAgent
-from openai import OpenAI
+from agents.combined_agent import CombinedAgent
+from utils.response_cache import ResponseCache
+from utils.embedding_cache import normalize_query
+from utils.single_flight import SingleFlight
+from utils.question_classifier import QuestionClassifier
+from utils.resources import ResourceProvider, get_provider
+from utils.stage_timer import stage
 
-# Inicializa o cliente OpenAI
-client = OpenAI()
+# Tempos máximos padrão de cada etapa do pipeline assíncrono, em segundos
+DEFAULT_STAGE_TIMEOUTS = {
+    "retrieval": 10.0,
+    "classification": 10.0,
+    "agent": 45.0,
+    "combine": 30.0
+}
+
+# Títulos das seções quando as respostas de compras e finanças são transmitidas em sequência
+COMBINED_SECTIONS = (
+    "Informações sobre Processo de Compra:\n",
+    "\n\nInformações Financeiras:\n"
+)
+
+# Formas de responder perguntas "combined" (pipeline_settings.combine_strategy):
+# single_pass - um único agente recebe o contexto de compras e finanças e responde em uma geração
+# sectioned   - as respostas dos dois agentes são unidas em seções, sem chamada extra ao modelo
+# llm         - as respostas dos dois agentes são combinadas por uma terceira chamada ao modelo
+COMBINE_STRATEGIES = ("single_pass", "sectioned", "llm")
 
 class Coordinator:
-    def __init__(self):
-        """Inicializa o coordenador e seus agentes."""
-        # Inicializa os agentes
-        self.rag_agent = RAGAgent()
-        self.procurement_agent = ProcurementAgent()
-        self.finance_agent = FinanceAgent()
-        
-        # Cache para respostas similares
-        self.response_cache: Dict[str, str] = {}
+    def __init__(self, resources: ResourceProvider = None):
+        """Inicializa o coordenador e seus agentes.
         
-    def classify_question(self, question: str) -> Dict[str, float]:
+        Args:
+            resources: Provedor de clientes, configuração e regras compartilhado
+                       pelos agentes (padrão: o do processo)
         """
-        Classifica o tipo da pergunta usando GPT-3.5.
-        Retorna um dicionário com as probabilidades para cada tipo.
+        self.resources = resources or get_provider()
+        
+        # Inicializa os agentes (o agente de compras consulta o mesmo agente financeiro)
+        self.rag_agent = RAGAgent(self.resources)
+        self.finance_agent = FinanceAgent(self.resources)
+        self.procurement_agent = ProcurementAgent(self.resources, self.finance_agent)
+        self.combined_agent = CombinedAgent(self.resources, self.procurement_agent, self.finance_agent)
+        
+        # Estratégia para perguntas que envolvem compras e finanças
+        pipeline_settings = self.rag_agent.config.get('pipeline_settings', {})
+        self.combine_strategy = pipeline_settings.get('combine_strategy', 'single_pass')
+        if self.combine_strategy not in COMBINE_STRATEGIES:
+            print(f"Estratégia de combinação desconhecida '{self.combine_strategy}', usando 'single_pass'")
+            self.combine_strategy = 'single_pass'
+        
+        # Perguntas iguais simultâneas aguardam a primeira em vez de repetir o pipeline
+        self.single_flight = SingleFlight() if pipeline_settings.get('single_flight', True) else None
+        
+        # Cache para respostas similares (perguntas equivalentes com as mesmas entidades)
+        cache_settings = self.rag_agent.config.get('cache_settings', {})
+        cost_centers = [center.name for center in self.resources.ledger.cost_centers]
+        item_keywords = [keyword for keywords in ITEM_CATEGORIES.values() for keyword in keywords]
+        self.response_cache = ResponseCache.from_settings(cache_settings.get('response_cache'), cost_centers,
+                                                          item_keywords)
+        
+        # Respostas do modelo em cache valem para a versão do corpus carregada
+        self._sync_completion_cache()
+        
+        # Classificador local: o LLM só é consultado quando a confiança é baixa
+        self.classifier = QuestionClassifier.from_settings(self.rag_agent.config.get('classifier_settings'))
+        
+        # Perguntas respondidas só com dados estruturados (sem busca, classificação nem LLM)
+        self.questions = 0
+        self.direct_answers = 0
+        self._stats_lock = threading.Lock()
+        
+    def _direct_answer(self, question: str) -> Optional[str]:
+        """Resposta determinística dos agentes, quando a pergunta é totalmente estruturada."""
+        response = self.procurement_agent.direct_answer(question)
+        if response is None:
+            response = self.finance_agent.direct_answer(question)
+        with self._stats_lock:
+            self.questions += 1
+            if response is not None:
+                self.direct_answers += 1
+        return response
+    
+    def after_fork(self) -> None:
+        """Prepara um processo filho criado por fork para atender perguntas.
+        
+        Índice, chunks e agentes continuam compartilhados com o processo pai
+        (cópia na escrita); clientes HTTP, limitador e conexões SQLite são recriados.
         """
+        self.resources.discard('client', 'async_client', 'limiter')
+        completion_cache = self.resources.completion_cache
+        if completion_cache is not None:
+            completion_cache.reopen()
+        if self.classifier is not None:
+            self.classifier.reopen()
+        self.rag_agent.after_fork()
+    
+    def _classification_messages(self, question: str) -> List[Dict]:
+        """Mensagens para classificar a pergunta."""
         prompt = f"""
         Classifique a seguinte pergunta em uma das categorias:
         - procurement: Perguntas sobre processos, regras e políticas de compras
@@ -38,63 +119,238 @@ class Coordinator:
 
         Responda apenas com o nome da categoria mais apropriada.
         """
-        
+        return [
+            {"role": "system", "content": "Você é um classificador de perguntas."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _local_classification(self, question: str, query_embedding=None) -> Optional[Dict]:
+        """Classificação local, quando confiante o suficiente para dispensar o LLM."""
+        if self.classifier is None:
+            return None
+        prediction = self.classifier.predict(question, query_embedding)
+        if not prediction['confident']:
+            return None
+        self.classifier.record_local(prediction)
+        return {"category": prediction['category'], "confidence": prediction['confidence'],
+                "source": prediction['source']}
+    
+    def _record_llm_classification(self, question: str, query_embedding, classification: Dict) -> None:
+        """Registra a decisão do LLM como exemplo de treino do classificador local."""
+        if self.classifier is not None:
+            category = classification["category"] if classification.get("source") == "llm" else None
+            self.classifier.record_fallback(question, query_embedding, category)
+    
+    def _classify_with_llm(self, question: str) -> Dict[str, float]:
+        """Classifica a pergunta com GPT-3.5."""
         try:
-            response = client.chat.completions.create(
+            response = self.resources.client.chat.completions.create(
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Você é um classificador de perguntas."},
-                    {"role": "user", "content": prompt}
-                ]
+                messages=self._classification_messages(question)
             )
             
             category = response.choices[0].message.content.strip().lower()
-            return {"category": category}
+            return {"category": category, "source": "llm"}
             
         except Exception as e:
             print(f"Erro ao classificar pergunta: {e}")
-            return {"category": "combined"}
+            return {"category": "combined", "source": "default"}
+    
+    def classify_question(self, question: str, query_embedding=None) -> Dict[str, float]:
+        """
+        Classifica o tipo da pergunta, localmente ou, se a confiança for baixa, usando GPT-3.5.
+        Retorna um dicionário com a categoria, a confiança e a origem da decisão.
+        """
+        local = self._local_classification(question, query_embedding)
+        if local is not None:
+            return local
+        classification = self._classify_with_llm(question)
+        self._record_llm_classification(question, query_embedding, classification)
+        return classification
+    
+    def _route(self, question: str) -> tuple:
+        """Etapas anteriores aos agentes: resposta direta, cache, busca e classificação.
+        
+        Returns:
+            tuple: (resposta, None, None, None) quando a pergunta já tem resposta,
+                   ou (None, contexto, categoria, embedding da pergunta)
+        """
+        # Perguntas estruturadas são respondidas sem nenhuma chamada ao modelo
+        with stage("direct"):
+            direct = self._direct_answer(question)
+        if direct is not None:
+            return direct, None, None, None
+        
+        # 1. Busca contexto relevante usando RAG (em lote com as perguntas simultâneas)
+        with stage("retrieval"):
+            query_embedding, context = self.rag_agent.embed_and_search(question)
+        
+        # Verifica cache pelo embedding da pergunta
+        if self.response_cache is not None:
+            with stage("cache"):
+                cached = self.response_cache.get(question, query_embedding)
+            if cached is not None:
+                return cached, None, None, None
+        
+        # 2. Classifica o tipo da pergunta
+        with stage("classification"):
+            classification = self.classify_question(question, query_embedding)
+        return None, context, classification["category"], query_embedding
+    
+    def _answer_combined(self, question: str, context: List[Dict]) -> str:
+        """Responde perguntas "combined" segundo a estratégia configurada."""
+        with stage("agent"):
+            if self.combine_strategy == "single_pass":
+                return self.combined_agent.answer(question, context)
+            
+            # Obtém respostas de ambos os agentes
+            proc_response = self.procurement_agent.answer(question, context)
+            fin_response = self.finance_agent.answer(question, context)
+        if self.combine_strategy == "sectioned":
+            return self.sectioned_answer(proc_response, fin_response)
+        with stage("combine"):
+            return self.combine_answers(proc_response, fin_response)
     
     def process_question(self, question: str) -> str:
         """
         Processa uma pergunta do usuário e retorna uma resposta apropriada.
         """
-        # Verifica cache
-        if question in self.response_cache:
-            return self.response_cache[question]
-        
+        if self.single_flight is None:
+            return self._process_question(question)
+        return self.single_flight.do(normalize_query(question), lambda: self._process_question(question))
+    
+    def _process_question(self, question: str) -> str:
+        """Pipeline completo de uma pergunta."""
         try:
-            # 1. Busca contexto relevante usando RAG
-            context = self.rag_agent.search(question)
-            
-            # 2. Classifica o tipo da pergunta
-            classification = self.classify_question(question)
-            category = classification["category"]
+            response, context, category, query_embedding = self._route(question)
+            if response is not None:
+                return response
             
             # 3. Processa com o agente apropriado
             if category == "procurement":
-                response = self.procurement_agent.answer(question, context)
+                with stage("agent"):
+                    response = self.procurement_agent.answer(question, context)
             elif category == "finance":
-                response = self.finance_agent.answer(question, context)
+                with stage("agent"):
+                    response = self.finance_agent.answer(question, context)
             else:  # combined
-                # Obtém respostas de ambos os agentes
-                proc_response = self.procurement_agent.answer(question, context)
-                fin_response = self.finance_agent.answer(question, context)
-                
-                # Combina as respostas
-                response = self.combine_answers(proc_response, fin_response)
+                response = self._answer_combined(question, context)
             
             # Armazena no cache
-            self.response_cache[question] = response
+            if self.response_cache is not None:
+                self.response_cache.put(question, response, query_embedding)
             return response
             
         except Exception as e:
             return f"Desculpe, ocorreu um erro ao processar sua pergunta: {str(e)}"
     
-    def combine_answers(self, proc_response: str, fin_response: str) -> str:
+    def stream_question(self, question: str) -> Iterator[str]:
         """
-        Combina respostas dos agentes de compras e finanças de forma coerente.
+        Processa uma pergunta gerando a resposta em fragmentos, à medida que ficam prontos.
+        
+        Em perguntas "combined" a resposta do agente combinado é transmitida ou, nas
+        demais estratégias, as seções de compras e de finanças em sequência, sem a
+        etapa de combinação (que só começaria com as duas completas).
+        
+        Se a mesma pergunta já estiver em andamento, a resposta dela é entregue inteira ao terminar.
         """
+        if self.single_flight is None:
+            yield from self._stream_question(question)
+            return
+        key = normalize_query(question)
+        future, leader = self.single_flight.join(key)
+        if not leader:
+            try:
+                yield future.result()
+                return
+            except Exception:
+                # A pergunta líder foi interrompida: gera a própria resposta
+                yield from self._stream_question(question)
+                return
+        
+        parts = []
+        try:
+            for piece in self._stream_question(question):
+                parts.append(piece)
+                yield piece
+        except BaseException as e:
+            self.single_flight.fail(key, future, e)
+            raise
+        self.single_flight.complete(key, future, "".join(parts))
+    
+    def _stream_question(self, question: str) -> Iterator[str]:
+        """Pipeline completo de uma pergunta, em fragmentos."""
+        try:
+            response, context, category, query_embedding = self._route(question)
+        except Exception as e:
+            yield f"Desculpe, ocorreu um erro ao processar sua pergunta: {str(e)}"
+            return
+        if response is not None:
+            yield response
+            return
+        
+        if category == "procurement":
+            streams = [self.procurement_agent.stream_answer(question, context)]
+        elif category == "finance":
+            streams = [self.finance_agent.stream_answer(question, context)]
+        elif self.combine_strategy == "single_pass":
+            streams = [self.combined_agent.stream_answer(question, context)]
+        else:  # combined
+            streams = [iter([COMBINED_SECTIONS[0]]), self.procurement_agent.stream_answer(question, context),
+                       iter([COMBINED_SECTIONS[1]]), self.finance_agent.stream_answer(question, context)]
+        
+        parts = []
+        try:
+            with stage("agent"):
+                for stream in streams:
+                    for piece in stream:
+                        parts.append(piece)
+                        yield piece
+        except Exception as e:
+            yield f"Desculpe, ocorreu um erro ao processar sua pergunta: {str(e)}"
+            return
+        
+        # Só respostas completas vão para o cache
+        if self.response_cache is not None:
+            self.response_cache.put(question, "".join(parts), query_embedding)
+    
+    def _sync_completion_cache(self) -> None:
+        """Alinha a versão do cache de respostas do modelo com o corpus carregado."""
+        completion_cache = self.resources.completion_cache
+        if completion_cache is not None and self.rag_agent.store is not None:
+            completion_cache.set_version(self.rag_agent.store.corpus_hash)
+    
+    def clear_cache(self) -> None:
+        """Descarta as respostas em cache (ex.: após alteração nos documentos)."""
+        if self.response_cache is not None:
+            self.response_cache.clear()
+        self._sync_completion_cache()
+    
+    def stats(self) -> Dict[str, Dict]:
+        """Estatísticas das respostas diretas, dos caches e do classificador local."""
+        stats = {
+            'respostas_diretas': {
+                'count': self.direct_answers,
+                'rate': self.direct_answers / self.questions if self.questions else 0.0
+            }
+        }
+        if self.response_cache is not None:
+            stats['respostas'] = self.response_cache.stats()
+        if self.rag_agent.query_cache is not None:
+            stats['embeddings'] = self.rag_agent.query_cache.stats()
+        if self.rag_agent.batcher is not None:
+            stats['lotes_busca'] = self.rag_agent.batcher.stats()
+        if self.single_flight is not None:
+            stats['perguntas_simultaneas'] = self.single_flight.stats()
+        if self.resources.completion_cache is not None:
+            stats['respostas_modelo'] = self.resources.completion_cache.stats()
+        if self.classifier is not None:
+            stats['classificacao'] = self.classifier.stats()
+        stats['limites_api'] = self.resources.limiter.stats()
+        return stats
+    
+    def _combine_messages(self, proc_response: str, fin_response: str) -> List[Dict]:
+        """Mensagens para combinar as respostas dos agentes."""
         prompt = f"""
         Combine as seguintes respostas em uma única resposta coerente e bem estruturada:
 
@@ -106,24 +362,396 @@ class Coordinator:
 
         Mantenha todas as informações importantes e organize de forma clara.
         """
-        
+        return [
+            {"role": "system", "content": "Você é um assistente que combina informações de forma clara e organizada."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def sectioned_answer(self, proc_response: str, fin_response: str) -> str:
+        """Une as respostas dos agentes em seções, sem chamar o modelo."""
+        return f"{COMBINED_SECTIONS[0]}{proc_response.strip()}{COMBINED_SECTIONS[1]}{fin_response.strip()}"
+    
+    def _separate_answers(self, proc_response: str, fin_response: str) -> str:
+        """Respostas dos agentes lado a lado, usadas quando a combinação falha."""
+        return self.sectioned_answer(proc_response, fin_response)
+    
+    def combine_answers(self, proc_response: str, fin_response: str) -> str:
+        """
+        Combina respostas dos agentes de compras e finanças de forma coerente.
+        """
         try:
-            response = client.chat.completions.create(
+            response = self.resources.client.chat.completions.create(
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Você é um assistente que combina informações de forma clara e organizada."},
-                    {"role": "user", "content": prompt}
-                ]
+                messages=self._combine_messages(proc_response, fin_response)
             )
             
             return response.choices[0].message.content
             
         except Exception as e:
             # Em caso de erro, retorna as respostas separadas
-            return f"""
-            Informações sobre Processo de Compra:
-            {proc_response}
+            return self._separate_answers(proc_response, fin_response)
+
+
+class AsyncCoordinator(Coordinator):
+    """Coordenador que executa as etapas independentes em paralelo com AsyncOpenAI.
+    
+    Busca e classificação rodam ao mesmo tempo e, em perguntas "combined", os
+    agentes de compras e finanças são consultados em paralelo; cada etapa tem
+    um tempo máximo (pipeline_settings.timeouts) e é cancelada ao estourá-lo.
+    """
+    
+    def __init__(self, resources: ResourceProvider = None):
+        """Inicializa o coordenador, seus agentes e o cliente assíncrono."""
+        super().__init__(resources)
+        self.async_client = self.resources.async_client
+        pipeline_settings = self.rag_agent.config.get('pipeline_settings', {})
+        self.timeouts = {**DEFAULT_STAGE_TIMEOUTS, **pipeline_settings.get('timeouts', {})}
+        self._loop = None
+        self._loop_lock = threading.Lock()
+    
+    def after_fork(self) -> None:
+        """Prepara o processo filho: novo cliente assíncrono e descarte do laço de eventos herdado."""
+        super().after_fork()
+        self.async_client = self.resources.async_client
+        # A thread do laço não existe no filho; um novo é criado no primeiro uso
+        self._loop = None
+        self._loop_lock = threading.Lock()
+    
+    async def _with_timeout(self, stage: str, awaitable, default, timed_out: List[str] = None):
+        """Aguarda uma etapa respeitando seu tempo máximo; em caso de estouro retorna default.
+        
+        Se timed_out for informado, a etapa é anotada nele quando o default for usado.
+        """
+        try:
+            return await asyncio.wait_for(awaitable, self.timeouts[stage])
+        except asyncio.TimeoutError:
+            print(f"Tempo esgotado na etapa '{stage}' ({self.timeouts[stage]}s)")
+            if timed_out is not None:
+                timed_out.append(stage)
+            return default
+    
+    async def _classify_with_llm_async(self, question: str) -> Dict[str, float]:
+        """Versão assíncrona de _classify_with_llm."""
+        try:
+            response = await self.async_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=self._classification_messages(question)
+            )
+            return {"category": response.choices[0].message.content.strip().lower(), "source": "llm"}
+        except Exception as e:
+            print(f"Erro ao classificar pergunta: {e}")
+            return {"category": "combined", "source": "default"}
+    
+    async def classify_question_async(self, question: str, query_embedding=None) -> Dict[str, float]:
+        """Versão assíncrona de classify_question."""
+        local = self._local_classification(question, query_embedding)
+        if local is not None:
+            return local
+        classification = await self._classify_with_llm_async(question)
+        self._record_llm_classification(question, query_embedding, classification)
+        return classification
+    
+    async def combine_answers_async(self, proc_response: str, fin_response: str) -> str:
+        """Versão assíncrona de combine_answers."""
+        try:
+            response = await self.async_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=self._combine_messages(proc_response, fin_response)
+            )
+            return response.choices[0].message.content
+        except Exception:
+            return self._separate_answers(proc_response, fin_response)
+    
+    def _start_llm_classification(self, question: str) -> asyncio.Task:
+        """Inicia a classificação pelo LLM dentro do tempo máximo da etapa."""
+        return asyncio.create_task(self._with_timeout(
+            "classification", self._classify_with_llm_async(question),
+            {"category": "combined", "source": "default"}))
+    
+    async def _agent_answer(self, agent, question: str, context: List[Dict], fallback: str,
+                            timed_out: List[str]) -> str:
+        """Consulta um agente dentro do tempo máximo da etapa (o estouro é anotado em timed_out)."""
+        return await self._with_timeout(
+            "agent", agent.answer_async(question, context, self.async_client), fallback, timed_out)
+    
+    async def _route_async(self, question: str) -> tuple:
+        """Versão assíncrona de _route, com busca e classificação em paralelo."""
+        # Perguntas estruturadas são respondidas sem nenhuma chamada ao modelo
+        with stage("direct"):
+            direct = self._direct_answer(question)
+        if direct is not None:
+            return direct, None, None, None
+        
+        # Palavras-chave primeiro; se não bastarem e o modelo local ainda não puder
+        # ajudar, o LLM começa a classificar junto com o embedding da pergunta
+        classification = self._local_classification(question)
+        classification_task = None
+        if classification is None and (self.classifier is None or not self.classifier.uses_embeddings):
+            classification_task = self._start_llm_classification(question)
+        try:
+            # 1. Busca contexto relevante (em lote com as perguntas simultâneas)
+            with stage("retrieval"):
+                query_embedding, context = await self._with_timeout(
+                    "retrieval", self.rag_agent.embed_and_search_async(question, self.async_client), (None, []))
+            if self.response_cache is not None:
+                with stage("cache"):
+                    cached = self.response_cache.get(question, query_embedding)
+                if cached is not None:
+                    return cached, None, None, None
+            
+            # 2. Classifica com o modelo local ou aguarda o LLM (só a espera que sobra após a busca é medida)
+            with stage("classification"):
+                if classification is None and classification_task is None:
+                    classification = self._local_classification(question, query_embedding)
+                if classification is None:
+                    if classification_task is None:
+                        classification_task = self._start_llm_classification(question)
+                    classification = await classification_task
+                    self._record_llm_classification(question, query_embedding, classification)
+            return None, context, classification["category"], query_embedding
+        finally:
+            # Em acerto de cache, erro ou cancelamento, não deixa a classificação pendente
+            if classification_task is not None and not classification_task.done():
+                classification_task.cancel()
+    
+    async def process_question_async(self, question: str) -> str:
+        """
+        Processa uma pergunta do usuário executando em paralelo as etapas independentes.
+        """
+        if self.single_flight is None:
+            return await self._process_question_async(question)
+        return await self.single_flight.do_async(
+            normalize_query(question), lambda: self._process_question_async(question))
+    
+    async def _process_question_async(self, question: str) -> str:
+        """Pipeline assíncrono completo de uma pergunta."""
+        try:
+            response, context, category, query_embedding = await self._route_async(question)
+            if response is not None:
+                return response
+            
+            # 3. Processa com o agente apropriado
+            timed_out = []
+            if category == "procurement":
+                with stage("agent"):
+                    response = await self._agent_answer(
+                        self.procurement_agent, question, context,
+                        "Desculpe, o tempo para responder sua pergunta sobre compras se esgotou.", timed_out)
+            elif category == "finance":
+                with stage("agent"):
+                    response = await self._agent_answer(
+                        self.finance_agent, question, context,
+                        "Desculpe, o tempo para responder sua pergunta sobre finanças se esgotou.", timed_out)
+            elif self.combine_strategy == "single_pass":
+                with stage("agent"):
+                    response = await self._agent_answer(
+                        self.combined_agent, question, context,
+                        "Desculpe, o tempo para responder sua pergunta se esgotou.", timed_out)
+            else:  # combined
+                # Consulta os dois agentes ao mesmo tempo
+                with stage("agent"):
+                    proc_response, fin_response = await asyncio.gather(
+                        self._agent_answer(self.procurement_agent, question, context,
+                                           "Não foi possível obter a resposta de compras a tempo.", timed_out),
+                        self._agent_answer(self.finance_agent, question, context,
+                                           "Não foi possível obter a resposta financeira a tempo.", timed_out)
+                    )
+                if self.combine_strategy == "sectioned":
+                    response = self.sectioned_answer(proc_response, fin_response)
+                else:
+                    with stage("combine"):
+                        response = await self._with_timeout(
+                            "combine", self.combine_answers_async(proc_response, fin_response),
+                            self._separate_answers(proc_response, fin_response))
+            
+            # Respostas com o aviso de tempo esgotado não vão para o cache: a próxima pergunta tenta de novo
+            if self.response_cache is not None and not timed_out:
+                self.response_cache.put(question, response, query_embedding)
+            return response
+            
+        except Exception as e:
+            return f"Desculpe, ocorreu um erro ao processar sua pergunta: {str(e)}"
+    
+    async def _stream_with_timeout(self, stage: str, stream: AsyncIterator[str], fallback: str,
+                                   timed_out: List[str]) -> AsyncIterator[str]:
+        """Repassa os fragmentos de um stream; se o próximo demorar mais que o tempo da etapa, encerra com fallback.
+        
+        O estouro é anotado em timed_out: a resposta fica incompleta e não deve ir para o cache.
+        """
+        try:
+            while True:
+                try:
+                    piece = await asyncio.wait_for(stream.__anext__(), self.timeouts[stage])
+                except StopAsyncIteration:
+                    return
+                yield piece
+        except asyncio.TimeoutError:
+            print(f"Tempo esgotado na etapa '{stage}' ({self.timeouts[stage]}s)")
+            timed_out.append(stage)
+            yield fallback
+        finally:
+            await stream.aclose()
+    
+    def _agent_stream(self, agent, question: str, context: List[Dict], fallback: str,
+                      timed_out: List[str]) -> AsyncIterator[str]:
+        """Stream da resposta de um agente dentro do tempo máximo da etapa (o estouro é anotado em timed_out)."""
+        return self._stream_with_timeout(
+            "agent", agent.stream_answer_async(question, context, self.async_client), fallback, timed_out)
+    
+    async def stream_question_async(self, question: str) -> AsyncIterator[str]:
+        """
+        Versão assíncrona de stream_question.
+        
+        Em perguntas "combined" fora da estratégia single_pass, a resposta financeira
+        é gerada em paralelo enquanto a de compras é transmitida, e é entregue logo em seguida.
+        """
+        if self.single_flight is None:
+            async for piece in self._stream_question_async(question):
+                yield piece
+            return
+        key = normalize_query(question)
+        future, leader = self.single_flight.join(key)
+        if not leader:
+            try:
+                yield await asyncio.shield(asyncio.wrap_future(future))
+                return
+            except Exception:
+                # A pergunta líder foi interrompida: gera a própria resposta
+                async for piece in self._stream_question_async(question):
+                    yield piece
+                return
+        
+        parts = []
+        try:
+            async for piece in self._stream_question_async(question):
+                parts.append(piece)
+                yield piece
+        except BaseException as e:
+            self.single_flight.fail(key, future, e)
+            raise
+        self.single_flight.complete(key, future, "".join(parts))
+    
+    async def _stream_question_async(self, question: str) -> AsyncIterator[str]:
+        """Pipeline assíncrono completo de uma pergunta, em fragmentos."""
+        try:
+            response, context, category, query_embedding = await self._route_async(question)
+        except Exception as e:
+            yield f"Desculpe, ocorreu um erro ao processar sua pergunta: {str(e)}"
+            return
+        if response is not None:
+            yield response
+            return
+        
+        parts = []
+        timed_out = []
+        finance_task = None
+        try:
+            with stage("agent"):
+                if category == "procurement":
+                    async for piece in self._agent_stream(
+                            self.procurement_agent, question, context,
+                            "Desculpe, o tempo para responder sua pergunta sobre compras se esgotou.", timed_out):
+                        parts.append(piece)
+                        yield piece
+                elif category == "finance":
+                    async for piece in self._agent_stream(
+                            self.finance_agent, question, context,
+                            "Desculpe, o tempo para responder sua pergunta sobre finanças se esgotou.", timed_out):
+                        parts.append(piece)
+                        yield piece
+                elif self.combine_strategy == "single_pass":
+                    async for piece in self._agent_stream(
+                            self.combined_agent, question, context,
+                            "Desculpe, o tempo para responder sua pergunta se esgotou.", timed_out):
+                        parts.append(piece)
+                        yield piece
+                else:  # combined
+                    # A resposta financeira vai sendo acumulada enquanto a de compras é transmitida
+                    finance_queue = asyncio.Queue()
+                
+                    async def collect_finance():
+                        try:
+                            async for piece in self._agent_stream(
+                                    self.finance_agent, question, context,
+                                    "Não foi possível obter a resposta financeira a tempo.", timed_out):
+                                await finance_queue.put(piece)
+                        finally:
+                            await finance_queue.put(None)
+                
+                    finance_task = asyncio.create_task(collect_finance())
+                    parts.append(COMBINED_SECTIONS[0])
+                    yield COMBINED_SECTIONS[0]
+                    async for piece in self._agent_stream(
+                            self.procurement_agent, question, context,
+                            "Não foi possível obter a resposta de compras a tempo.", timed_out):
+                        parts.append(piece)
+                        yield piece
+                    parts.append(COMBINED_SECTIONS[1])
+                    yield COMBINED_SECTIONS[1]
+                    while (piece := await finance_queue.get()) is not None:
+                        parts.append(piece)
+                        yield piece
+        except Exception as e:
+            yield f"Desculpe, ocorreu um erro ao processar sua pergunta: {str(e)}"
+            return
+        finally:
+            if finance_task is not None and not finance_task.done():
+                finance_task.cancel()
+        
+        # Só respostas completas vão para o cache
+        if self.response_cache is not None and not timed_out:
+            self.response_cache.put(question, "".join(parts), query_embedding)
+    
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        """Laço de eventos próprio, em uma thread dedicada e mantido entre perguntas.
+        
+        O laço roda continuamente, e não só enquanto alguém aguarda um resultado:
+        tarefas iniciadas nele (líderes do single-flight, janelas do agrupador de
+        perguntas, conexões do cliente) avançam mesmo quando quem consome um
+        stream está parado entre dois fragmentos.
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='async-coordinator', daemon=True).start()
+                self._loop = loop
+            return self._loop
+    
+    def _run(self, awaitable, context: contextvars.Context):
+        """Executa o awaitable no laço próprio, no contexto de quem chamou, e aguarda o resultado."""
+        return asyncio.run_coroutine_threadsafe(_run_in_context(awaitable, context), self._event_loop()).result()
+    
+    def process_question(self, question: str) -> str:
+        """Interface síncrona: executa o pipeline no laço de eventos próprio."""
+        return self._run(self.process_question_async(question), contextvars.copy_context())
+    
+    def stream_question(self, question: str) -> Iterator[str]:
+        """Interface síncrona de stream_question_async, no laço de eventos próprio."""
+        # O contexto (ex.: o temporizador das etapas) é o de quem começou a consumir o stream
+        context = contextvars.copy_context()
+        stream = self.stream_question_async(question)
+        try:
+            while True:
+                try:
+                    piece = self._run(stream.__anext__(), context)
+                except StopAsyncIteration:
+                    return
+                yield piece
+        finally:
+            self._run(stream.aclose(), context)
+
+
+async def _run_in_context(awaitable, context: contextvars.Context):
+    """Aguarda o awaitable em uma tarefa criada no contexto informado."""
+    return await context.run(asyncio.ensure_future, awaitable)
+
+
+def use_async_pipeline(resources: ResourceProvider) -> bool:
+    """Indica se o pipeline assíncrono está habilitado em pipeline_settings."""
+    return resources.settings('pipeline_settings', {'async': True})['async']
+
 
-            Informações Financeiras:
-            {fin_response}
-            """ 
\ No newline at end of file
+def create_coordinator(resources: ResourceProvider = None) -> Coordinator:
+    """Coordenador configurado (assíncrono por padrão: etapas independentes em paralelo)."""
+    resources = resources or get_provider()
+    return (AsyncCoordinator if use_async_pipeline(resources) else Coordinator)(resources)
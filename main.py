@@ -4,7 +4,9 @@ Ponto de entrada principal do Assistente de Compras Internas.
 Este arquivo fornece uma interface simples para interagir com o sistema.
 """
 
-from coordinator import Coordinator
+from coordinator import create_coordinator
+from utils.resources import get_provider
+from utils.corpus_sync import CorpusWatcher
 import os
 import sys
 from dotenv import load_dotenv
@@ -48,6 +50,8 @@ def show_help():
     print(f"\n{Fore.GREEN}🔍 Comandos disponíveis:{Style.RESET_ALL}")
     print(f"{Fore.CYAN}ajuda{Style.RESET_ALL}: Mostra esta mensagem de ajuda")
     print(f"{Fore.CYAN}exemplos{Style.RESET_ALL}: Mostra exemplos de perguntas")
+    print(f"{Fore.CYAN}atualizar{Style.RESET_ALL}: Aplica as edições feitas em data/raw/ sem reiniciar")
+    print(f"{Fore.CYAN}estatisticas{Style.RESET_ALL}: Mostra estatísticas dos caches e da classificação")
     print(f"{Fore.CYAN}sair{Style.RESET_ALL}: Encerra o programa")
 
 def main():
@@ -71,8 +75,20 @@ def main():
     
     try:
         print(f"\n{Fore.YELLOW}Inicializando agentes...{Style.RESET_ALL}")
-        # Inicializa o coordenador
-        coordinator = Coordinator()
+        # Inicializa o coordenador (assíncrono por padrão: etapas independentes em paralelo)
+        resources = get_provider()
+        coordinator = create_coordinator(resources)
+        stream_answers = resources.settings('pipeline_settings', {'stream': True})['stream']
+        
+        # Observa data/raw/ e aplica edições no índice sem reiniciar
+        sync_settings = coordinator.rag_agent.config.get('sync_settings', {})
+        watcher = CorpusWatcher(
+            coordinator.rag_agent,
+            interval=sync_settings.get('interval', 2.0),
+            on_change=coordinator.clear_cache
+        )
+        if sync_settings.get('watch', True):
+            watcher.start()
         print(f"{Fore.GREEN}✅ Sistema pronto!{Style.RESET_ALL}")
         
         # Interface do usuário
@@ -101,16 +117,35 @@ def main():
                 show_examples()
                 continue
             
+            if comando == 'atualizar':
+                results = watcher.check()
+                if not results:
+                    print(f"{Fore.CYAN}Nenhuma alteração encontrada em data/raw/.{Style.RESET_ALL}")
+                for result in results:
+                    print(f"{Fore.GREEN}✅ {result['source']}: {result['upserted']} chunks atualizados, "
+                          f"{result['deleted']} removidos{Style.RESET_ALL}")
+                continue
+            
+            if comando == 'estatisticas':
+                for name, stats in coordinator.stats().items():
+                    print(f"{Fore.CYAN}{name}:{Style.RESET_ALL} " +
+                          ", ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                                    for key, value in stats.items()))
+                continue
+            
             try:
                 # Processando...
                 print(f"{Fore.YELLOW}⏳ Processando sua pergunta...{Style.RESET_ALL}")
                 
-                # Processa a pergunta
-                resposta = coordinator.process_question(pergunta)
-                
                 # Exibe a resposta com formatação
                 print(f"\n{Fore.CYAN}💡 Resposta:{Style.RESET_ALL}")
-                print(f"{resposta}")
+                if stream_answers:
+                    # Mostra cada fragmento assim que é gerado
+                    for fragmento in coordinator.stream_question(pergunta):
+                        print(fragmento, end="", flush=True)
+                    print()
+                else:
+                    print(f"{coordinator.process_question(pergunta)}")
                 
             except Exception as e:
                 print(f"\n{Fore.RED}❌ Erro ao processar pergunta: {str(e)}{Style.RESET_ALL}")
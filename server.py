@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Servidor HTTP do Assistente de Compras Internas.
+Expõe o coordenador para a intranet em /ask, /ask/stream e /health.
+
+No modo pre-fork (padrão), o processo principal carrega o índice e os agentes
+uma única vez, abre o socket e só então cria os workers com fork: todos
+compartilham as mesmas páginas de memória (cópia na escrita), de modo que o
+consumo de memória não cresce com o número de workers. Sem pre-fork, cada
+worker do uvicorn carrega seu próprio coordenador.
+
+Uso:
+    python server.py                       # host, porta, workers e modo de server_settings
+    python server.py --workers 16 --port 9000
+    python server.py --no-prefork          # workers independentes do uvicorn
+"""
+
+import argparse
+import contextvars
+import gc
+import json
+import os
+import signal
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterator
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from coordinator import Coordinator, AsyncCoordinator, create_coordinator
+from utils.corpus_sync import CorpusWatcher, WATCHER_LEASE_PATH
+from utils.resources import get_provider
+from utils.stage_timer import StageTimer, measure
+
+# Valores padrão de server_settings
+DEFAULT_SERVER_SETTINGS = {
+    "host": "0.0.0.0",
+    "port": 8000,
+    "workers": 4,
+    "prefork": True,
+    "backlog": 2048
+}
+
+# Coordenador carregado pelo processo principal antes do fork (modo pre-fork)
+_preloaded = None
+
+
+class Question(BaseModel):
+    """Corpo das requisições de /ask e /ask/stream."""
+    pergunta: str
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Usa o coordenador herdado do processo principal ou carrega um para o worker; observa data/raw/."""
+    load_dotenv()
+    coordinator = _preloaded
+    if coordinator is None:
+        # O coordenador assíncrono roda no próprio laço de eventos do servidor
+        coordinator = await run_in_threadpool(create_coordinator, get_provider())
+    app.state.coordinator = coordinator
+
+    # Só um worker (o que obtém a trava) sincroniza data/raw/ e grava armazenamento e
+    # índice; os demais recarregam o índice gravado por ele e limpam seus caches.
+    # A thread do observador é daemon: termina junto com o worker, sem atrasar o
+    # encerramento enquanto uma sincronização aguarda a API
+    sync_settings = coordinator.rag_agent.config.get('sync_settings', {})
+    if sync_settings.get('watch', True):
+        CorpusWatcher(coordinator.rag_agent, interval=sync_settings.get('interval', 2.0),
+                      on_change=coordinator.clear_cache, lease_path=WATCHER_LEASE_PATH).start()
+    yield
+
+
+app = FastAPI(title="Assistente de Compras Internas", lifespan=lifespan)
+
+
+def _question_text(question: Question) -> str:
+    """Texto da pergunta, rejeitando perguntas vazias."""
+    text = question.pergunta.strip()
+    if not text:
+        raise HTTPException(status_code=422, detail="A pergunta não pode ser vazia.")
+    return text
+
+
+def _server_timing(timer: StageTimer) -> str:
+    """Cabeçalho Server-Timing com a duração de cada etapa."""
+    summary = timer.summary()
+    entries = [f"{stage};dur={ms}" for stage, ms in summary['etapas_ms'].items()]
+    entries.append(f"total;dur={summary['total_ms']}")
+    return ", ".join(entries)
+
+
+def _answer_sync(coordinator: Coordinator, question: str) -> tuple:
+    """Responde pelo pipeline síncrono (executado em uma thread do pool)."""
+    with measure() as timer:
+        response = coordinator.process_question(question)
+    return response, timer
+
+
+def _in_context(iterator: Iterator[str], context: contextvars.Context) -> Iterator[str]:
+    """Avança o iterador sempre no mesmo contexto, qualquer que seja a thread."""
+    while True:
+        try:
+            yield context.run(next, iterator)
+        except StopIteration:
+            return
+
+
+def _event(data: Dict, event: str = None) -> str:
+    """Evento no formato text/event-stream."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_events(coordinator: Coordinator, question: str) -> AsyncIterator[str]:
+    """Fragmentos da resposta como eventos, seguidos dos tempos de cada etapa."""
+    with measure() as timer:
+        if isinstance(coordinator, AsyncCoordinator):
+            pieces = coordinator.stream_question_async(question)
+        else:
+            pieces = iterate_in_threadpool(
+                _in_context(coordinator.stream_question(question), contextvars.copy_context()))
+        async for piece in pieces:
+            timer.mark_first_fragment()
+            yield _event({"texto": piece})
+        yield _event({"tempos": timer.summary()}, "fim")
+
+
+@app.post("/ask")
+async def ask(question: Question, request: Request) -> JSONResponse:
+    """Responde a pergunta e informa o tempo de cada etapa."""
+    coordinator = request.app.state.coordinator
+    text = _question_text(question)
+    if isinstance(coordinator, AsyncCoordinator):
+        with measure() as timer:
+            response = await coordinator.process_question_async(text)
+    else:
+        response, timer = await run_in_threadpool(_answer_sync, coordinator, text)
+    return JSONResponse({"resposta": response, "tempos": timer.summary()},
+                        headers={"Server-Timing": _server_timing(timer)})
+
+
+@app.post("/ask/stream")
+async def ask_stream(question: Question, request: Request) -> StreamingResponse:
+    """Transmite a resposta em eventos à medida que é gerada; o último traz os tempos."""
+    coordinator = request.app.state.coordinator
+    text = _question_text(question)
+    return StreamingResponse(_stream_events(coordinator, text), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/health")
+async def health(request: Request) -> Dict:
+    """Estado do worker: índice carregado e estatísticas dos caches e limites."""
+    coordinator = request.app.state.coordinator
+    return {
+        "status": "ok",
+        "pid": os.getpid(),
+        "indice": coordinator.rag_agent.index is not None,
+        "chunks": coordinator.rag_agent.index.ntotal if coordinator.rag_agent.index is not None else 0,
+        "estatisticas": coordinator.stats()
+    }
+
+
+def _listen(host: str, port: int, backlog: int) -> socket.socket:
+    """Socket de escuta aberto pelo processo principal e herdado pelos workers."""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket) -> None:
+    """Corpo de um worker criado por fork: recria os recursos por processo e atende no socket herdado."""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _preloaded.after_fork()
+    uvicorn.Server(uvicorn.Config(app, lifespan="on")).run(sockets=[sock])
+
+
+def serve_prefork(host: str, port: int, workers: int, backlog: int = 2048) -> None:
+    """Carrega o coordenador uma vez e cria os workers por fork, substituindo os que terminarem."""
+    global _preloaded
+    load_dotenv()
+    print("Carregando índice e agentes no processo principal...")
+    _preloaded = create_coordinator(get_provider())
+    sock = _listen(host, port, backlog)
+
+    # Objetos já criados saem do coletor de lixo, que assim não escreve em
+    # suas páginas e elas continuam compartilhadas com os workers
+    gc.collect()
+    gc.freeze()
+
+    children = set()
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(sock)
+            except BaseException as e:
+                print(f"Erro no worker {os.getpid()}: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        spawn()
+    print(f"Servidor em http://{host}:{port} com {workers} workers (pre-fork)")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} terminou (status {status}); iniciando outro")
+            time.sleep(1)
+            spawn()
+    sock.close()
+
+
+def main():
+    settings = get_provider().settings('server_settings', DEFAULT_SERVER_SETTINGS)
+    parser = argparse.ArgumentParser(description="Servidor HTTP do Assistente de Compras Internas")
+    parser.add_argument('--host', default=settings['host'])
+    parser.add_argument('--port', type=int, default=settings['port'])
+    parser.add_argument('--workers', type=int, default=settings['workers'])
+    parser.add_argument('--prefork', action=argparse.BooleanOptionalAction, default=settings['prefork'])
+    args = parser.parse_args()
+
+    if args.prefork and hasattr(os, 'fork'):
+        serve_prefork(args.host, args.port, args.workers, settings['backlog'])
+    else:
+        # Com vários workers o uvicorn importa o app em cada processo
+        uvicorn.run("server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
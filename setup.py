@@ -12,6 +12,7 @@ import json
 from pathlib import Path
 from utils.process_policy import process_policy
 from utils.process_finance import process_finance
+from utils.vector_index import build_search_index
 from colorama import init, Fore, Style
 
 # Inicializa colorama para cores no terminal
@@ -110,6 +111,7 @@ def setup():
         # Processamento de arquivos
         run_with_progress(process_policy, "📝 Processando política de compras")
         run_with_progress(process_finance, "💰 Processando regras financeiras")
+        run_with_progress(build_search_index, "🔎 Construindo índice de busca")
         
         # Verificação final
         if len(os.listdir('data/embeddings')) > 0:
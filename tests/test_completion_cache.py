@@ -0,0 +1,71 @@
+"""Testes do cache de respostas do modelo (utils/completion_cache.py)."""
+
+from types import SimpleNamespace
+
+import pytest
+from utils.completion_cache import CompletionCache, CachedChatClient
+
+
+def _chunk(content, finish_reason=None):
+    delta = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=finish_reason)])
+
+
+class _FakeCompletions:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return iter(self.chunks)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CompletionCache(str(tmp_path / 'completions.sqlite'), version='v1')
+    yield cache
+    cache.close()
+
+
+def _client(cache, chunks):
+    completions = _FakeCompletions(chunks)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return CachedChatClient(client, cache), completions
+
+
+REQUEST = {'model': 'gpt-4o-mini', 'messages': [{'role': 'user', 'content': 'oi'}], 'stream': True}
+
+
+def test_complete_stream_is_cached(cache):
+    client, completions = _client(cache, [_chunk('Olá, '), _chunk('tudo bem?', 'stop')])
+    list(client.chat.completions.create(**REQUEST))
+    stream = client.chat.completions.create(**REQUEST)
+    assert completions.calls == 1
+    assert [chunk.choices[0].delta.content for chunk in stream] == ['Olá, tudo bem?']
+
+
+def test_truncated_stream_is_not_cached(cache):
+    client, completions = _client(cache, [_chunk('Olá, '), _chunk('tudo', 'length')])
+    list(client.chat.completions.create(**REQUEST))
+    list(client.chat.completions.create(**REQUEST))
+    assert completions.calls == 2
+
+
+def test_usage_chunk_keeps_finish_reason(cache):
+    usage_chunk = SimpleNamespace(choices=[], usage=SimpleNamespace(total_tokens=10))
+    client, completions = _client(cache, [_chunk('Olá', 'length'), usage_chunk])
+    list(client.chat.completions.create(**REQUEST))
+    list(client.chat.completions.create(**REQUEST))
+    assert completions.calls == 2
+
+
+def test_set_version_keeps_entries_of_other_versions(tmp_path):
+    path = str(tmp_path / 'completions.sqlite')
+    old, new = CompletionCache(path, version='v1'), CompletionCache(path, version='v1')
+    old.put('k', 'resposta v1')
+    new.set_version('v2')
+    assert new.get('k') is None
+    assert old.get('k') == 'resposta v1'
+    old.close()
+    new.close()
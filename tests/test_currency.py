@@ -0,0 +1,24 @@
+"""Testes do extrator de valores monetários (utils/currency.py)."""
+
+import pytest
+from utils.currency import extract_amount
+
+
+@pytest.mark.parametrize("text, value", [
+    ("Posso comprar um notebook de R$ 8.500,00?", 8500.0),
+    ("compra de 12 mil para o marketing", 12000.0),
+    ("orçamento de R$ 1,5 milhão", 1_500_000.0),
+    ("um milhão e meio de reais", 1_500_000.0),
+    ("orçamento de um milhão e meio", 1_500_000.0),
+    ("meio milhão de reais", 500_000.0),
+    ("custa dois mil e meio", 2500.0),
+    ("dois mil e quinhentos reais", 2500.0),
+    ("compra de dois mil e quinhentos", 2500.0),
+    ("mil e quinhentos reais", 1500.0),
+])
+def test_extract_amount(text, value):
+    assert extract_amount(text).value == value
+
+
+def test_written_half_without_scale_is_not_money():
+    assert extract_amount("por meio de nota fiscal") is None
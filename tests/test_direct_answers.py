@@ -0,0 +1,87 @@
+"""Testes das respostas diretas (sem LLM) do agente financeiro."""
+
+import pytest
+from agents.finance_agent import FinanceAgent
+from agents.procurement_agent import ProcurementAgent
+from utils.resources import ResourceProvider
+
+FINANCE_RULES = {
+    "orcamentos": [
+        {"centro_custo": "Facilities", "orcamento_mensal": 30000, "disponivel": 18000, "responsavel": "Roberto Alves"},
+        {"centro_custo": "Marketing", "orcamento_mensal": 25000, "disponivel": 9000, "responsavel": "Júlia Rocha"},
+        {"centro_custo": "TI – Infraestrutura", "orcamento_mensal": 50000, "disponivel": 35000,
+         "responsavel": "Carlos Lima"},
+        {"centro_custo": "Facilities - Home Office", "orcamento_mensal": 15000, "disponivel": 6000,
+         "responsavel": "Roberto Alves"}
+    ],
+    "limites_aprovacao": [
+        {"valor_minimo": 0, "valor_maximo": 2000, "aprovadores": ["Gestor direto"], "tempo_estimado": "1 dia útil"},
+        {"valor_minimo": 2000.01, "valor_maximo": 10000, "aprovadores": ["Gestor direto", "Financeiro"],
+         "tempo_estimado": "3 dias úteis"},
+        {"valor_minimo": 10000.01, "valor_maximo": 1000000000,
+         "aprovadores": ["Gestor direto", "Financeiro", "Diretoria Executiva"], "tempo_estimado": "7 dias úteis"}
+    ]
+}
+
+
+@pytest.fixture
+def agent():
+    resources = ResourceProvider()
+    resources.set('config', {"embedding_settings": {"model": "text-embedding-ada-002"}})
+    resources.set('finance_rules', FINANCE_RULES)
+    return FinanceAgent(resources)
+
+
+@pytest.fixture
+def procurement(agent):
+    return ProcurementAgent(agent.resources, agent)
+
+
+@pytest.mark.parametrize("question", [
+    "Qual o orçamento 2025 de Marketing?",
+    "Quem aprova o orçamento 2025?",
+    "Quem aprova uma compra de 3500?",
+    "Posso comprar 2000 itens em Facilities?",
+])
+def test_year_or_bare_number_is_not_answered_directly(agent, question):
+    assert agent.direct_amount(question) is None
+    assert agent.direct_answer(question) is None
+
+
+@pytest.mark.parametrize("question, amount", [
+    ("Quem aprova uma compra de R$ 3.500?", 3500.0),
+    ("Quem aprova uma compra de 12 mil?", 12000.0),
+    ("Posso gastar 5 mil reais em Facilities?", 5000.0),
+])
+def test_amount_with_currency_or_multiplier_is_answered_directly(agent, question, amount):
+    assert agent.direct_amount(question) == amount
+    assert agent.direct_answer(question) is not None
+
+
+@pytest.mark.parametrize("question, amount", [
+    ("quem aprova 15000", 15000.0),
+    ("Quem aprova 7300?", 7300.0),
+])
+def test_bare_amount_after_approval_cue_is_answered_directly(agent, question, amount):
+    assert agent.direct_amount(question) == amount
+    answer = agent.direct_answer(question)
+    assert answer is not None and f"{amount:,.2f}" in answer
+
+
+def test_budget_of_cost_center(agent):
+    assert "Marketing" in agent.direct_answer("Qual o orçamento de Marketing?")
+
+
+def test_item_purchase_is_answered_directly(procurement):
+    answer = procurement.direct_answer("Posso comprar um notebook de R$ 8.000?")
+    assert answer is not None and "TI – Infraestrutura" in answer
+
+
+@pytest.mark.parametrize("question", [
+    "Quero comprar 5 notebooks de R$ 8.000 cada",
+    "Quero comprar notebooks de R$ 8.000 cada",
+    "Quem aprova R$ 5.000 para o presidente?",
+    "Posso comprar R$ 3.000 em Facilities - Home Office?",
+])
+def test_item_purchase_needing_full_pipeline_is_not_answered_directly(procurement, question):
+    assert procurement.direct_answer(question) is None
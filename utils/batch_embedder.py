@@ -0,0 +1,117 @@
+"""
+Geração de embeddings em lote para o pipeline de ingestão.
+Agrupa vários chunks em cada requisição até um orçamento de tokens medido com
+tiktoken e respeita os cabeçalhos de rate limit da API, aguardando a janela
+quando a cota restante não comporta o lote. As novas tentativas (429/5xx) ficam
+a cargo do transporte HTTP compartilhado (utils/http_client.py).
+"""
+
+import time
+from typing import List, Dict, Optional
+import openai
+from utils.http_client import parse_duration
+
+# Valores padrão de embedding_settings para o processamento em lote
+DEFAULT_BATCH_SETTINGS = {
+    "batch_max_tokens": 100000,
+    "batch_max_inputs": 512
+}
+
+# Limite de tokens por entrada dos modelos de embedding da OpenAI
+MAX_INPUT_TOKENS = 8191
+
+class BatchEmbedder:
+    """Gera embeddings de muitos textos com poucas requisições."""
+
+    def __init__(self, client: openai.OpenAI, model: str, settings: Dict = None):
+        """Inicializa o gerador com o cliente, o modelo e as configurações de lote."""
+        # Uma única camada de novas tentativas: a do transporte HTTP, não a do SDK
+        self.client = client.with_options(max_retries=0)
+        self.model = model
+        self.settings = {**DEFAULT_BATCH_SETTINGS, **(settings or {})}
+        self._encoding = None
+        self._remaining_tokens = None
+        self._remaining_requests = None
+        self._reset_tokens = 0.0
+        self._reset_requests = 0.0
+
+    def _count_tokens(self, text: str) -> int:
+        """Conta os tokens do texto com tiktoken (estimativa se indisponível)."""
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.encoding_for_model(self.model)
+            except Exception:
+                self._encoding = False
+        if self._encoding is False:
+            return max(1, len(text) // 4)
+        return len(self._encoding.encode(text))
+
+    def _make_batches(self, texts: List[str]) -> List[tuple]:
+        """Agrupa os índices dos textos em lotes (índices, tokens) dentro dos limites configurados."""
+        max_tokens = self.settings['batch_max_tokens']
+        max_inputs = self.settings['batch_max_inputs']
+        batches = []
+        current = []
+        current_tokens = 0
+
+        for i, text in enumerate(texts):
+            tokens = min(self._count_tokens(text), MAX_INPUT_TOKENS)
+            if current and (current_tokens + tokens > max_tokens or len(current) >= max_inputs):
+                batches.append((current, current_tokens))
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+
+        if current:
+            batches.append((current, current_tokens))
+        return batches
+
+    def _wait_for_capacity(self, tokens: int) -> None:
+        """Aguarda a janela de rate limit quando a cota restante não comporta o lote."""
+        wait = 0.0
+        if self._remaining_requests is not None and self._remaining_requests < 1:
+            wait = max(wait, self._reset_requests)
+        if self._remaining_tokens is not None and self._remaining_tokens < tokens:
+            wait = max(wait, self._reset_tokens)
+        if wait > 0:
+            time.sleep(wait)
+            self._remaining_requests = None
+            self._remaining_tokens = None
+
+    def _update_rate_limits(self, headers) -> None:
+        """Atualiza a cota restante a partir dos cabeçalhos x-ratelimit-*."""
+        try:
+            if headers.get('x-ratelimit-remaining-requests') is not None:
+                self._remaining_requests = int(headers['x-ratelimit-remaining-requests'])
+            if headers.get('x-ratelimit-remaining-tokens') is not None:
+                self._remaining_tokens = int(headers['x-ratelimit-remaining-tokens'])
+            self._reset_requests = parse_duration(headers.get('x-ratelimit-reset-requests'))
+            self._reset_tokens = parse_duration(headers.get('x-ratelimit-reset-tokens'))
+        except (TypeError, ValueError):
+            pass
+
+    def _request(self, inputs: List[str], tokens: int) -> List[List[float]]:
+        """Envia um lote à API (o transporte repete em caso de rate limit ou erro do servidor)."""
+        self._wait_for_capacity(tokens)
+        raw = self.client.embeddings.with_raw_response.create(input=inputs, model=self.model)
+        self._update_rate_limits(raw.headers)
+        response = raw.parse()
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Gera embeddings para todos os textos, na mesma ordem da entrada.
+
+        Lotes que falham definitivamente resultam em None para seus textos.
+        """
+        embeddings = [None] * len(texts)
+        for indices, tokens in self._make_batches(texts):
+            try:
+                vectors = self._request([texts[i] for i in indices], tokens)
+            except Exception as e:
+                print(f"Erro ao gerar embeddings do lote: {e}")
+                continue
+            for i, vector in zip(indices, vectors):
+                embeddings[i] = vector
+        return embeddings
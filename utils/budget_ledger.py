@@ -0,0 +1,181 @@
+"""
+Livro de orçamentos carregado de finance_rules.json.
+Mantém as faixas de aprovação e os centros de custo ordenados para consultas
+por busca binária, e o total disponível atualizado a cada alteração, de modo
+que as verificações financeiras não dependem do número de centros de custo.
+"""
+
+import bisect
+import json
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple, Iterable
+
+FINANCE_RULES_PATH = 'data/raw/finance_rules.json'
+
+
+def _fold(text: str) -> str:
+    """Remove acentos e caixa para comparação de nomes."""
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def compile_cost_center_names(names: Iterable[str]) -> Dict[str, List[re.Pattern]]:
+    """Prepara os nomes dos centros de custo para match_cost_centers.
+
+    Cada parte do nome ("TI", "Infraestrutura") vira um padrão de palavra inteira.
+    """
+    return {name: [re.compile(rf'\b{re.escape(_fold(part.strip()))}\b')
+                   for part in re.split(r'[–-]', name) if part.strip()]
+            for name in names}
+
+
+def match_cost_centers(text: str, compiled: Dict[str, List[re.Pattern]]) -> Tuple[str, ...]:
+    """Centros de custo citados no texto.
+
+    Prefere os nomes citados por completo e, entre eles, os com mais partes presentes;
+    mais de um resultado indica que o texto é ambíguo.
+    """
+    folded = _fold(text)
+    scores = {}
+    for name, parts in compiled.items():
+        found = sum(1 for part in parts if part.search(folded))
+        if found:
+            scores[name] = (found == len(parts), found)
+    best = max(scores.values(), default=None)
+    return tuple(sorted(name for name, score in scores.items() if score == best))
+
+
+@dataclass(frozen=True)
+class ApprovalBand:
+    """Faixa de valores com seus aprovadores."""
+    min_value: float
+    max_value: float
+    approvers: Tuple[str, ...]
+    estimated_time: str
+
+
+@dataclass(frozen=True)
+class CostCenter:
+    """Centro de custo e seu orçamento mensal."""
+    name: str
+    monthly_budget: float
+    available: float
+    owner: str
+
+    @property
+    def spent(self) -> float:
+        """Valor já utilizado no mês."""
+        return self.monthly_budget - self.available
+
+
+@dataclass(frozen=True)
+class BudgetCheck:
+    """Resultado da verificação de orçamento para um valor.
+
+    status é um de:
+        'exceeds_total'       o valor excede o disponível somando todos os centros
+        'center_ok'           o centro de custo informado comporta o valor
+        'center_insufficient' o centro de custo informado não comporta o valor
+        'suitable'            há centros de custo que comportam o valor (em suitable)
+        'none_suitable'       nenhum centro de custo comporta o valor
+    """
+    amount: float
+    status: str
+    total_available: float
+    cost_center: Optional[CostCenter] = None
+    suitable: Tuple[CostCenter, ...] = ()
+
+
+class BudgetLedger:
+    """Orçamentos e faixas de aprovação com consultas indexadas."""
+
+    def __init__(self, rules: Dict):
+        """Indexa as regras financeiras (formato de finance_rules.json)."""
+        bands = sorted(
+            (ApprovalBand(float(item.get("valor_minimo", 0)),
+                          float(item.get("valor_maximo", float("inf"))),
+                          tuple(item.get("aprovadores", [])),
+                          item.get("tempo_estimado", "Não especificado"))
+             for item in rules.get("limites_aprovacao", [])),
+            key=lambda band: band.min_value
+        )
+        self._bands = bands
+        self._band_minimums = [band.min_value for band in bands]
+
+        self._centers = {}
+        self._order = {}
+        for position, item in enumerate(rules.get("orcamentos", [])):
+            center = CostCenter(item["centro_custo"], item["orcamento_mensal"],
+                                item["disponivel"], item.get("responsavel", "Não informado"))
+            self._centers[center.name] = center
+            self._order[center.name] = position
+
+        # Centros ordenados pelo disponível, para "quem comporta X" por busca binária
+        self._by_available = sorted((center.available, self._order[name], name)
+                                    for name, center in self._centers.items())
+        self._total_available = sum(center.available for center in self._centers.values())
+        self._center_names = compile_cost_center_names(self._centers)
+
+    @classmethod
+    def from_file(cls, path: str = FINANCE_RULES_PATH) -> 'BudgetLedger':
+        """Carrega o livro a partir do arquivo de regras financeiras."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    @property
+    def total_available(self) -> float:
+        """Total disponível somando todos os centros de custo."""
+        return self._total_available
+
+    @property
+    def cost_centers(self) -> List[CostCenter]:
+        """Centros de custo na ordem do arquivo."""
+        return list(self._centers.values())
+
+    def cost_center(self, name: str) -> Optional[CostCenter]:
+        """Retorna o centro de custo pelo nome."""
+        return self._centers.get(name)
+
+    def find_cost_centers(self, text: str) -> List[CostCenter]:
+        """Centros de custo citados no texto (mais de um se o texto for ambíguo)."""
+        return [self._centers[name] for name in match_cost_centers(text, self._center_names)]
+
+    def approval_band(self, amount: float) -> Optional[ApprovalBand]:
+        """Faixa de aprovação que contém o valor (None se cair fora de todas)."""
+        index = bisect.bisect_right(self._band_minimums, amount) - 1
+        if index >= 0 and amount <= self._bands[index].max_value:
+            return self._bands[index]
+        return None
+
+    def centers_that_can_afford(self, amount: float) -> List[CostCenter]:
+        """Centros de custo com disponível >= valor, na ordem do arquivo."""
+        start = bisect.bisect_left(self._by_available, (amount,))
+        matches = sorted(self._by_available[start:], key=lambda entry: entry[1])
+        return [self._centers[name] for _, _, name in matches]
+
+    def check_budget(self, amount: float, department: str = None) -> BudgetCheck:
+        """Verifica o orçamento para um valor, opcionalmente em um centro de custo."""
+        total = self._total_available
+        if amount > total:
+            return BudgetCheck(amount, 'exceeds_total', total)
+
+        center = self._centers.get(department) if department else None
+        if center is not None:
+            status = 'center_insufficient' if amount > center.available else 'center_ok'
+            return BudgetCheck(amount, status, total, cost_center=center)
+
+        suitable = tuple(self.centers_that_can_afford(amount))
+        return BudgetCheck(amount, 'suitable' if suitable else 'none_suitable', total, suitable=suitable)
+
+    def update_available(self, name: str, available: float) -> CostCenter:
+        """Atualiza o disponível de um centro de custo mantendo os índices."""
+        old = self._centers[name]
+        entry = (old.available, self._order[name], name)
+        del self._by_available[bisect.bisect_left(self._by_available, entry)]
+        new = CostCenter(old.name, old.monthly_budget, available, old.owner)
+        self._centers[name] = new
+        bisect.insort(self._by_available, (available, self._order[name], name))
+        self._total_available += available - old.available
+        return new
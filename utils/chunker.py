@@ -0,0 +1,201 @@
+"""
+Chunker de markdown orientado a tokens.
+Percorre o documento linha a linha seguindo a árvore de títulos, mantém
+tabelas, listas e blocos de código inteiros e agrupa os blocos de cada seção
+até chunk_size tokens, repetindo até chunk_overlap tokens do chunk anterior.
+"""
+
+import re
+from typing import List, Dict, Iterable, Iterator, Callable
+
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+LIST_PATTERN = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+')
+FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Conta tokens com o tokenizador dos modelos de embedding (estimativa se indisponível)."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text))
+
+
+def _block_kind(line: str) -> str:
+    """Classifica a linha que inicia um bloco."""
+    if HEADING_PATTERN.match(line):
+        return 'heading'
+    if line.lstrip().startswith('|'):
+        return 'table'
+    if LIST_PATTERN.match(line):
+        return 'list'
+    return 'paragraph'
+
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[tuple]:
+    """Agrupa as linhas em blocos (tipo, texto) sem quebrar tabelas, listas ou código."""
+    kind = None
+    buffer = []
+    in_fence = False
+
+    def flush():
+        text = '\n'.join(buffer).strip('\n')
+        buffer.clear()
+        return (kind, text) if text.strip() else None
+
+    for raw_line in lines:
+        line = raw_line.rstrip('\n')
+
+        # Blocos de código ficam inteiros, inclusive linhas em branco
+        if in_fence:
+            buffer.append(line)
+            if FENCE_PATTERN.match(line):
+                in_fence = False
+            continue
+        if FENCE_PATTERN.match(line):
+            block = flush()
+            if block:
+                yield block
+            kind = 'code'
+            buffer.append(line)
+            in_fence = True
+            continue
+
+        if not line.strip():
+            block = flush()
+            if block:
+                yield block
+            kind = None
+            continue
+
+        line_kind = _block_kind(line)
+        # Títulos são sempre blocos próprios; tabelas e listas não se misturam com parágrafos
+        continues = (kind is not None and line_kind != 'heading' and kind != 'heading'
+                     and (line_kind == kind or (kind == 'list' and line_kind == 'paragraph')))
+        if not continues:
+            block = flush()
+            if block:
+                yield block
+            kind = line_kind
+        buffer.append(line)
+
+    block = flush()
+    if block:
+        yield block
+
+
+def _split_oversized(kind: str, text: str, chunk_size: int, chunk_overlap: int,
+                     counter: Callable[[str], int]) -> List[str]:
+    """Divide um bloco maior que chunk_size (tabelas por linhas, repetindo o cabeçalho)."""
+    if kind == 'table':
+        rows = text.split('\n')
+        header, body = rows[:2], rows[2:]
+        parts = []
+        current = []
+        for row in body:
+            candidate = '\n'.join(header + current + [row])
+            if current and counter(candidate) > chunk_size:
+                parts.append('\n'.join(header + current))
+                current = []
+            current.append(row)
+        parts.append('\n'.join(header + current))
+        return parts
+
+    # Texto corrido: janelas de frases (ou de linhas) respeitando o orçamento
+    pieces = re.split(r'(?<=[.!?;])\s+|\n', text)
+    parts = []
+    current = []
+    for piece in pieces:
+        if current and counter(' '.join(current + [piece])) > chunk_size:
+            parts.append(' '.join(current))
+            # Mantém o fim da janela anterior como sobreposição
+            overlap = []
+            for previous in reversed(current):
+                if counter(' '.join([previous] + overlap)) > chunk_overlap:
+                    break
+                overlap.insert(0, previous)
+            current = overlap
+        current.append(piece)
+    if current:
+        parts.append(' '.join(current))
+    return parts
+
+
+def iter_markdown_chunks(lines: Iterable[str], chunk_size: int = 1000, chunk_overlap: int = 200,
+                         counter: Callable[[str], int] = count_tokens) -> Iterator[Dict]:
+    """Gera chunks de markdown com o caminho de seções de cada um.
+
+    Cada chunk é um dicionário com 'content', 'section_path' (lista de títulos),
+    'part' (posição do chunk dentro da seção) e 'tokens'.
+    """
+    heading_stack = []
+    section_path = []
+    blocks = []
+    tokens = 0
+    part = 0
+    fresh = 0  # blocos de conteúdo ainda não emitidos
+
+    def emit():
+        nonlocal blocks, tokens, part, fresh
+        content = '\n\n'.join(text for text, _ in blocks)
+        chunk = {
+            'content': content,
+            'section_path': list(section_path),
+            'part': part,
+            'tokens': counter(content)
+        }
+        part += 1
+        # Sobreposição: repete os últimos blocos até chunk_overlap tokens
+        overlap = []
+        overlap_tokens = 0
+        for text, block_tokens in reversed(blocks):
+            if overlap_tokens + block_tokens > chunk_overlap or len(overlap) + 1 >= len(blocks):
+                break
+            overlap.insert(0, (text, block_tokens))
+            overlap_tokens += block_tokens
+        blocks = overlap
+        tokens = overlap_tokens
+        fresh = 0
+        return chunk
+
+    for kind, text in iter_blocks(lines):
+        if kind == 'heading':
+            # Nova seção: fecha o chunk atual e atualiza a pilha de títulos
+            if fresh:
+                yield emit()
+            blocks, tokens, part = [], 0, 0
+            match = HEADING_PATTERN.match(text)
+            level, title = len(match.group(1)), match.group(2)
+            heading_stack = [(lvl, ttl) for lvl, ttl in heading_stack if lvl < level] + [(level, title)]
+            section_path = [ttl for _, ttl in heading_stack]
+            blocks.append((text, counter(text)))
+            tokens = blocks[0][1]
+            continue
+
+        block_tokens = counter(text)
+        pieces = [(text, block_tokens)]
+        if block_tokens > chunk_size:
+            pieces = [(piece, counter(piece))
+                      for piece in _split_oversized(kind, text, chunk_size, chunk_overlap, counter)]
+
+        for piece, piece_tokens in pieces:
+            if tokens + piece_tokens > chunk_size:
+                if fresh:
+                    yield emit()
+                elif part:
+                    # A sobreposição não cabe junto com o bloco: descarta-a
+                    blocks, tokens = [], 0
+            blocks.append((piece, piece_tokens))
+            tokens += piece_tokens
+            fresh += 1
+
+    if fresh:
+        yield emit()
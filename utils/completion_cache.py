@@ -0,0 +1,323 @@
+"""
+Cache persistente de respostas da API de chat.
+Envolve os clientes OpenAI/AsyncOpenAI de forma transparente: chamadas a
+chat.completions.create com o mesmo modelo, mensagens e parâmetros são
+respondidas a partir de um SQLite (WAL) compartilhado por todos os processos
+do host e que sobrevive a reinícios. As entradas expiram pelo TTL, o
+tamanho é limitado (as mais antigas são descartadas) e a versão do corpus
+entra na chave, de modo que uma alteração nos documentos invalida o cache.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional
+from utils.embedding_cache import abandon_inherited
+from utils.streaming import chunk_text
+
+COMPLETION_CACHE_PATH = 'data/completion_cache.sqlite'
+
+# Valores padrão de cache_settings.completion_cache
+DEFAULT_COMPLETION_CACHE_SETTINGS = {
+    "enabled": True,
+    "path": COMPLETION_CACHE_PATH,
+    "ttl": 86400,
+    "max_size": 20000
+}
+
+# Parâmetros que não mudam o conteúdo da resposta e ficam fora da chave
+_TRANSPORT_PARAMS = {'stream', 'stream_options', 'timeout', 'extra_headers', 'extra_query', 'extra_body'}
+
+
+class CompletionCache:
+    """Respostas de chat em SQLite, indexadas por requisição e versão do corpus.
+
+    Vários processos podem compartilhar o arquivo em versões diferentes do corpus: cada um
+    lê apenas a sua versão, e as entradas antigas saem pelo TTL ou pelo limite de tamanho.
+    """
+
+    def __init__(self, path: str = COMPLETION_CACHE_PATH, ttl: float = 86400, max_size: int = 20000,
+                 version: str = ''):
+        """Abre (ou cria) o cache no caminho informado."""
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self) -> None:
+        """Abre a conexão e cria a tabela, se necessário."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS completions_created_at ON completions (created_at)")
+        self.conn.commit()
+
+    def reopen(self) -> None:
+        """Abre uma nova conexão com o mesmo arquivo (ex.: em um processo filho após fork).
+
+        A conexão herdada não é fechada: ela continua pertencendo ao processo pai.
+        """
+        with self._lock:
+            abandon_inherited(self.conn)
+            self._connect()
+
+    @classmethod
+    def from_settings(cls, settings: Dict, version: str = '') -> Optional['CompletionCache']:
+        """Cria o cache a partir de cache_settings.completion_cache (None se desabilitado ou indisponível)."""
+        settings = {**DEFAULT_COMPLETION_CACHE_SETTINGS, **(settings or {})}
+        if not settings['enabled']:
+            return None
+        try:
+            return cls(settings['path'], settings['ttl'], settings['max_size'], version)
+        except sqlite3.Error as e:
+            print(f"Erro ao abrir cache de respostas do modelo: {e}", file=sys.stderr)
+            return None
+
+    def key(self, request: Dict) -> Optional[str]:
+        """Chave da requisição (None se ela não puder ser reaproveitada, ex.: várias respostas ou ferramentas)."""
+        if request.get('n', 1) != 1 or 'tools' in request or 'functions' in request:
+            return None
+        params = {name: value for name, value in request.items() if name not in _TRANSPORT_PARAMS}
+        payload = json.dumps({'request': params, 'version': self.version},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        """Indica se uma entrada passou do TTL."""
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """Resposta em cache da requisição, se houver e não tiver expirado."""
+        with self._lock:
+            try:
+                row = self.conn.execute(
+                    "SELECT content, created_at FROM completions WHERE key = ? AND version = ?",
+                    (key, self.version)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Erro ao ler cache de respostas do modelo: {e}", file=sys.stderr)
+                row = None
+            if row is not None and not self._expired(row[1]):
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, content: str) -> None:
+        """Armazena uma resposta, descartando as expiradas e as mais antigas além do limite."""
+        with self._lock:
+            try:
+                now = time.time()
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO completions (key, version, content, created_at) VALUES (?, ?, ?, ?)",
+                        (key, self.version, content, now)
+                    )
+                    if self.ttl:
+                        self.conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl,))
+                    self.conn.execute(
+                        "DELETE FROM completions WHERE key IN (SELECT key FROM completions "
+                        "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_size,)
+                    )
+            except sqlite3.Error as e:
+                print(f"Erro ao gravar cache de respostas do modelo: {e}", file=sys.stderr)
+
+    def set_version(self, version: str) -> None:
+        """Passa a usar a versão do corpus informada.
+
+        As respostas de outras versões não são apagadas, pois outro processo pode ainda
+        estar nelas; elas deixam de ser lidas aqui e saem pelo TTL ou pelo limite de tamanho.
+        """
+        with self._lock:
+            self.version = version
+
+    def stats(self) -> Dict:
+        """Estatísticas de uso do cache."""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    def close(self) -> None:
+        """Fecha a conexão."""
+        self.conn.close()
+
+
+def _cached_completion(model: str, content: str) -> SimpleNamespace:
+    """Resposta no formato de ChatCompletion montada a partir do cache."""
+    message = SimpleNamespace(role='assistant', content=content)
+    return SimpleNamespace(model=model, usage=None,
+                           choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')])
+
+
+def _cached_chunk(content: str) -> SimpleNamespace:
+    """Fragmento no formato de ChatCompletionChunk com a resposta inteira do cache."""
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=content),
+                                                    finish_reason='stop')])
+
+
+def _completed_content(response) -> Optional[str]:
+    """Texto de uma resposta completa (None se ela foi truncada ou não tem texto)."""
+    choice = response.choices[0]
+    if getattr(choice, 'finish_reason', 'stop') not in (None, 'stop'):
+        return None
+    return choice.message.content
+
+
+def _finish_reason(chunk, current: Optional[str]) -> Optional[str]:
+    """finish_reason do fragmento, ou o último visto se ele não trouxer um (ex.: fragmento só com usage)."""
+    choices = getattr(chunk, 'choices', None) or []
+    reason = getattr(choices[0], 'finish_reason', None) if choices else None
+    return reason if reason is not None else current
+
+
+class _CachedStream:
+    """Stream de um único fragmento com a resposta em cache."""
+
+    def __init__(self, content: str):
+        self._content = content
+
+    def __iter__(self):
+        yield _cached_chunk(self._content)
+
+    def close(self) -> None:
+        pass
+
+
+class _AsyncCachedStream(_CachedStream):
+    """Versão assíncrona de _CachedStream."""
+
+    async def __aiter__(self):
+        yield _cached_chunk(self._content)
+
+    async def close(self) -> None:
+        pass
+
+
+class _RecordingStream:
+    """Repassa um stream da API e guarda a resposta quando ele é consumido até o fim.
+
+    Respostas truncadas (finish_reason diferente de 'stop', ex.: 'length') não são guardadas.
+    """
+
+    def __init__(self, stream, on_complete: Callable[[str], None]):
+        self._stream = stream
+        self._on_complete = on_complete
+
+    def __iter__(self):
+        parts = []
+        finish_reason = None
+        for chunk in self._stream:
+            parts.append(chunk_text(chunk))
+            finish_reason = _finish_reason(chunk, finish_reason)
+            yield chunk
+        if any(parts) and finish_reason in (None, 'stop'):
+            self._on_complete("".join(parts))
+
+    def close(self) -> None:
+        close = getattr(self._stream, 'close', None)
+        if close is not None:
+            close()
+
+
+class _AsyncRecordingStream(_RecordingStream):
+    """Versão assíncrona de _RecordingStream."""
+
+    async def __aiter__(self):
+        parts = []
+        finish_reason = None
+        async for chunk in self._stream:
+            parts.append(chunk_text(chunk))
+            finish_reason = _finish_reason(chunk, finish_reason)
+            yield chunk
+        if any(parts) and finish_reason in (None, 'stop'):
+            self._on_complete("".join(parts))
+
+    async def close(self) -> None:
+        close = getattr(self._stream, 'close', None)
+        if close is not None:
+            await close()
+
+
+class _CachedCompletions:
+    """chat.completions com cache."""
+
+    def __init__(self, completions, cache: CompletionCache):
+        self._completions = completions
+        self._cache = cache
+
+    def create(self, **kwargs):
+        key = self._cache.key(kwargs)
+        if key is None:
+            return self._completions.create(**kwargs)
+        content = self._cache.get(key)
+        if content is not None:
+            return _CachedStream(content) if kwargs.get('stream') else _cached_completion(kwargs.get('model'), content)
+
+        response = self._completions.create(**kwargs)
+        if kwargs.get('stream'):
+            return _RecordingStream(response, lambda text: self._cache.put(key, text))
+        content = _completed_content(response)
+        if content:
+            self._cache.put(key, content)
+        return response
+
+
+class _AsyncCachedCompletions(_CachedCompletions):
+    """Versão assíncrona de _CachedCompletions."""
+
+    async def create(self, **kwargs):
+        key = self._cache.key(kwargs)
+        if key is None:
+            return await self._completions.create(**kwargs)
+        content = self._cache.get(key)
+        if content is not None:
+            return (_AsyncCachedStream(content) if kwargs.get('stream')
+                    else _cached_completion(kwargs.get('model'), content))
+
+        response = await self._completions.create(**kwargs)
+        if kwargs.get('stream'):
+            return _AsyncRecordingStream(response, lambda text: self._cache.put(key, text))
+        content = _completed_content(response)
+        if content:
+            self._cache.put(key, content)
+        return response
+
+
+class CachedChatClient:
+    """Cliente OpenAI cujas chamadas de chat passam pelo cache; o restante é repassado ao cliente original."""
+
+    _completions_class = _CachedCompletions
+
+    def __init__(self, client, cache: CompletionCache):
+        self._client = client
+        self.cache = cache
+        self.chat = SimpleNamespace(completions=self._completions_class(client.chat.completions, cache))
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+
+class AsyncCachedChatClient(CachedChatClient):
+    """Versão de CachedChatClient para AsyncOpenAI."""
+
+    _completions_class = _AsyncCachedCompletions
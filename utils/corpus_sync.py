@@ -0,0 +1,190 @@
+"""
+Sincroniza edições em data/raw/ com um RAGAgent em execução.
+Compara os chunks atuais de cada fonte com os do armazenamento e aplica apenas
+as diferenças via RAGAgent.upsert/delete, sem reconstruir o índice.
+
+Uso como CLI (atualiza o armazenamento e o índice em disco; instâncias em
+execução com o watcher ativo recarregam a nova versão automaticamente):
+    python -m utils.corpus_sync            # sincroniza uma vez
+    python -m utils.corpus_sync --watch    # continua observando data/raw/
+"""
+
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+from typing import List, Dict, Callable, Optional
+from utils.process_policy import chunk_policy, POLICY_SOURCE, POLICY_PATH
+from utils.process_finance import chunk_finance, FINANCE_SOURCE, FINANCE_PATH
+from utils.embedding_cache import EmbeddingCache, embed_with_cache
+from utils.embedding_store import STORE_DIR
+
+# Fontes conhecidas: nome -> (caminho, função que gera os chunks a partir do arquivo)
+SOURCES = {
+    POLICY_SOURCE: (POLICY_PATH, chunk_policy),
+    FINANCE_SOURCE: (FINANCE_PATH, lambda f: chunk_finance(json.load(f)))
+}
+
+# Trava que elege, entre os processos do servidor, o único observador que grava o armazenamento
+WATCHER_LEASE_PATH = os.path.join(STORE_DIR, '.watcher.lock')
+
+
+def load_source_chunks(source: str) -> List[Dict]:
+    """Lê o arquivo bruto de uma fonte e gera seus chunks."""
+    path, make_chunks = SOURCES[source]
+    with open(path, 'r', encoding='utf-8') as f:
+        return make_chunks(f)
+
+
+def sync_source(rag_agent, source: str) -> Dict:
+    """Aplica no RAGAgent as diferenças entre o arquivo da fonte e o armazenamento."""
+    chunks = load_source_chunks(source)
+
+    with rag_agent.store.lock:
+        rag_agent.reload_if_changed()
+        store = rag_agent.store
+        existing = {chunk_id: row for chunk_id, row in store.row_by_id.items()
+                    if store.metadata[row].get('source') == source}
+
+        changed = [chunk for chunk in chunks
+                   if chunk['id'] not in existing
+                   or store.contents[existing[chunk['id']]] != chunk['content']
+                   or store.metadata[existing[chunk['id']]] != chunk['metadata']]
+        new_ids = {chunk['id'] for chunk in chunks}
+        removed = [chunk_id for chunk_id in existing if chunk_id not in new_ids]
+
+        if changed:
+            # O cache evita chamadas à API para textos já conhecidos e coleta os que sumiram
+            cache = EmbeddingCache()
+            try:
+                embeddings = embed_with_cache(rag_agent.get_embedder(), cache,
+                                              [chunk['content'] for chunk in chunks], source)
+            finally:
+                cache.close()
+            by_id = {chunk['id']: embedding for chunk, embedding in zip(chunks, embeddings)}
+            for chunk in changed:
+                chunk['embedding'] = by_id.get(chunk['id'])
+            rag_agent.upsert(changed)
+        if removed:
+            rag_agent.delete(removed)
+
+    return {'source': source, 'upserted': len(changed), 'deleted': len(removed)}
+
+
+class CorpusWatcher:
+    """Observa data/raw/ e envia as edições para um RAGAgent em execução."""
+
+    def __init__(self, rag_agent, interval: float = 2.0, on_change: Optional[Callable] = None,
+                 lease_path: Optional[str] = None):
+        """Inicializa o observador.
+
+        Args:
+            rag_agent: Agente cujo armazenamento e índice serão atualizados
+            interval: Intervalo entre verificações, em segundos
+            on_change: Função chamada após qualquer alteração no corpus
+            lease_path: Trava compartilhada entre processos: só o observador que a obtém
+                sincroniza data/raw/; os demais apenas recarregam o que ele gravou
+                (None: este observador sempre sincroniza)
+        """
+        self.rag_agent = rag_agent
+        self.interval = interval
+        self.on_change = on_change
+        self.lease_path = lease_path
+        self._lease = None
+        self._mtimes = {}
+        self._check_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _holds_lease(self) -> bool:
+        """Indica se este observador sincroniza data/raw/, tentando obter a trava se ainda não a tem.
+
+        A trava é mantida enquanto o processo existir; se ele terminar, outro observador a obtém.
+        """
+        if self.lease_path is None or self._lease is not None:
+            return True
+        os.makedirs(os.path.dirname(self.lease_path) or '.', exist_ok=True)
+        lease = open(self.lease_path, 'a')
+        try:
+            fcntl.flock(lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lease.close()
+            return False
+        self._lease = lease
+        return True
+
+    def check(self) -> List[Dict]:
+        """Verifica alterações uma vez e retorna o resumo das fontes sincronizadas."""
+        results = []
+        with self._check_lock:
+            changed = self.rag_agent.reload_if_changed()
+            sources = SOURCES.items() if self._holds_lease() else ()
+
+            for source, (path, _) in sources:
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                if self._mtimes.get(source) == mtime:
+                    continue
+                result = sync_source(self.rag_agent, source)
+                self._mtimes[source] = mtime
+                if result['upserted'] or result['deleted']:
+                    results.append(result)
+
+        if (changed or results) and self.on_change:
+            self.on_change()
+        return results
+
+    def _run(self) -> None:
+        """Laço da thread de observação."""
+        while not self._stop.is_set():
+            try:
+                for result in self.check():
+                    print(f"Corpus atualizado: {result['source']} "
+                          f"({result['upserted']} chunks atualizados, {result['deleted']} removidos)")
+            except Exception as e:
+                print(f"Erro ao sincronizar documentos: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> 'CorpusWatcher':
+        """Inicia a observação em uma thread em segundo plano."""
+        self._thread = threading.Thread(target=self._run, name='corpus-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Interrompe a observação."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._lease is not None:
+            self._lease.close()
+            self._lease = None
+
+
+def main():
+    from agents.rag_agent import RAGAgent
+
+    watcher = CorpusWatcher(RAGAgent())
+    if '--watch' in sys.argv:
+        print("Observando data/raw/ (Ctrl+C para encerrar)...")
+        watcher.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            watcher.stop()
+        return
+
+    results = watcher.check()
+    if not results:
+        print("Nenhuma alteração encontrada.")
+    for result in results:
+        print(f"{result['source']}: {result['upserted']} chunks atualizados, {result['deleted']} removidos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Extração de valores monetários em reais a partir de texto livre.
+Reconhece separadores de milhar, vírgula decimal, multiplicadores ("mil", "k",
+"milhões") e valores por extenso ("quinze mil reais"), atribuindo a cada valor
+encontrado uma confiança de que ele realmente é um preço.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+# Números por extenso
+_UNITS = {
+    "zero": 0, "um": 1, "uma": 1, "dois": 2, "duas": 2, "três": 3, "tres": 3, "quatro": 4,
+    "cinco": 5, "seis": 6, "sete": 7, "oito": 8, "nove": 9, "dez": 10, "onze": 11, "doze": 12,
+    "treze": 13, "quatorze": 14, "catorze": 14, "quinze": 15, "dezesseis": 16, "dezessete": 17,
+    "dezoito": 18, "dezenove": 19, "vinte": 20, "trinta": 30, "quarenta": 40, "cinquenta": 50,
+    "sessenta": 60, "setenta": 70, "oitenta": 80, "noventa": 90, "cem": 100, "cento": 100,
+    "duzentos": 200, "duzentas": 200, "trezentos": 300, "trezentas": 300, "quatrocentos": 400,
+    "quatrocentas": 400, "quinhentos": 500, "quinhentas": 500, "seiscentos": 600,
+    "seiscentas": 600, "setecentos": 700, "setecentas": 700, "oitocentos": 800,
+    "oitocentas": 800, "novecentos": 900, "novecentas": 900
+}
+_SCALES = {
+    "mil": 1_000, "milhão": 1_000_000, "milhao": 1_000_000, "milhões": 1_000_000,
+    "milhoes": 1_000_000, "bilhão": 1_000_000_000, "bilhao": 1_000_000_000,
+    "bilhões": 1_000_000_000, "bilhoes": 1_000_000_000
+}
+# "meio milhão", "um milhão e meio", "dois mil e meio"
+_HALF = {"meio", "meia"}
+
+_CURRENCY_PREFIX = r'(?P<currency>r\$\s*)?'
+_CURRENCY_SUFFIX = r'(?P<reais>\s*(?:reais|real)\b)?'
+_MULTIPLIER = r'(?:\s*(?P<multiplier>mil\b|k\b|milh(?:ão|ao|ões|oes)\b|mi\b|bilh(?:ão|ao|ões|oes)\b|bi\b))?'
+
+# Valores numéricos: 8.500,00 | 8500,5 | 8500 | 8.5 mil | 8,500.00
+_NUMERIC_PATTERN = re.compile(
+    _CURRENCY_PREFIX +
+    r'(?P<number>\d{1,3}(?:\.\d{3})+(?:,\d+)?'   # milhar com ponto, decimal com vírgula
+    r'|\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?'          # formato inglês
+    r'|\d+(?:[,.]\d+)?)'                          # sem separador de milhar
+    + _MULTIPLIER + _CURRENCY_SUFFIX,
+    re.IGNORECASE
+)
+
+_NUMBER_WORD = '|'.join(sorted(list(_UNITS) + list(_SCALES) + list(_HALF), key=len, reverse=True))
+_WRITTEN_PATTERN = re.compile(
+    _CURRENCY_PREFIX +
+    rf'(?P<number>(?:{_NUMBER_WORD})\b(?:(?:\s+e\s+|\s+)(?:{_NUMBER_WORD})\b)*)'
+    + _CURRENCY_SUFFIX,
+    re.IGNORECASE
+)
+
+# Palavras que indicam preço logo antes do número
+_PRICE_CUE = re.compile(
+    r'(?:valor|custa|custo|preço|preco|orçamento|orcamento|compra|gasto|pagar|aprova|aprovar|por|de|até|ate|acima|abaixo)'
+    r'\s*(?:de|do|da)?\s*$',
+    re.IGNORECASE
+)
+# Unidades que indicam que o número não é um preço
+_NON_MONEY_UNIT = re.compile(
+    r'^\s*(?:%|x\b|dias?\b|meses\b|mês\b|mes\b|anos?\b|horas?\b|unidades?\b|itens\b|pessoas\b|'
+    r'funcionários\b|funcionarios\b|polegadas\b|"|gb\b|tb\b|mb\b|ghz\b|hz\b|pol\b|º|ª)',
+    re.IGNORECASE
+)
+
+_MULTIPLIERS = {"mil": 1_000, "k": 1_000, "mi": 1_000_000, "bi": 1_000_000_000}
+
+
+@dataclass(frozen=True)
+class MoneyAmount:
+    """Valor monetário encontrado no texto."""
+    value: float
+    confidence: float
+    span: Tuple[int, int]
+    text: str
+
+
+def _multiplier_value(word: Optional[str]) -> int:
+    """Fator de um multiplicador ("mil", "k", "milhões"...)."""
+    if not word:
+        return 1
+    word = word.lower()
+    if word.startswith('milh'):
+        return 1_000_000
+    if word.startswith('bilh'):
+        return 1_000_000_000
+    return _MULTIPLIERS[word]
+
+
+def _parse_number(number: str, has_multiplier: bool) -> float:
+    """Converte o texto numérico para float, interpretando os separadores."""
+    if re.fullmatch(r'\d{1,3}(?:\.\d{3})+(?:,\d+)?', number):
+        return float(number.replace('.', '').replace(',', '.'))
+    if re.fullmatch(r'\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?', number) and not has_multiplier:
+        return float(number.replace(',', ''))
+    return float(number.replace(',', '.'))
+
+
+def _parse_written(words: str) -> Optional[float]:
+    """Converte um número por extenso ("mil e quinhentos", "um milhão e meio") em float."""
+    total = 0
+    current = 0
+    scale = 0
+    for word in re.findall(r'\w+', words.lower()):
+        if word == 'e':
+            continue
+        if word in _UNITS:
+            current += _UNITS[word]
+        elif word in _SCALES:
+            scale = _SCALES[word]
+            total += (current or 1) * scale
+            current = 0
+        elif word in _HALF:
+            # Depois de uma escala vale metade dela; antes, multiplica a escala seguinte
+            if scale and not current:
+                total += scale / 2
+            else:
+                current += 0.5
+        else:
+            return None
+    return float(total + current)
+
+
+def _confidence(text: str, match: re.Match, value: float, has_multiplier: bool, written: bool) -> float:
+    """Estima a confiança de que o número encontrado é um valor em reais."""
+    if match.group('currency') or match.group('reais'):
+        return 0.95 if not written else 0.9
+    after = text[match.end():]
+    if _NON_MONEY_UNIT.match(after):
+        return 0.0
+    before = text[:match.start()]
+    cue = bool(_PRICE_CUE.search(before))
+    if has_multiplier:
+        return 0.85 if cue else 0.75
+    if written:
+        # Números pequenos por extenso ("um notebook") quase nunca são preços
+        return 0.6 if value >= 1000 and cue else (0.4 if value >= 1000 else 0.0)
+    if '.' in match.group('number') and value >= 1000:
+        return 0.75 if cue else 0.6
+    if cue:
+        return 0.6 if value >= 100 else 0.3
+    return 0.4 if value >= 1000 else 0.15
+
+
+def extract_amounts(text: str) -> List[MoneyAmount]:
+    """Retorna todos os candidatos a valor monetário do texto, na ordem em que aparecem."""
+    amounts = []
+    taken = []
+    for pattern, written in ((_NUMERIC_PATTERN, False), (_WRITTEN_PATTERN, True)):
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            if any(start < t_end and t_start < end for t_start, t_end in taken):
+                continue
+            number = match.group('number')
+            multiplier = match.groupdict().get('multiplier')
+            try:
+                if written:
+                    value = _parse_written(number)
+                    if value is None:
+                        continue
+                else:
+                    value = _parse_number(number, bool(multiplier)) * _multiplier_value(multiplier)
+            except ValueError:
+                continue
+            # O sufixo "mil" por extenso já foi tratado como escala
+            confidence = _confidence(text, match, value, bool(multiplier) or (written and value >= 1000), written)
+            if confidence <= 0:
+                continue
+            taken.append((start, end))
+            amounts.append(MoneyAmount(round(value, 2), confidence, (start, end), match.group(0).strip()))
+    return sorted(amounts, key=lambda amount: amount.span)
+
+
+def extract_amount(text: str, min_confidence: float = 0.0) -> Optional[MoneyAmount]:
+    """Retorna o valor monetário mais provável do texto (None se nenhum atingir min_confidence)."""
+    candidates = [amount for amount in extract_amounts(text) if amount.confidence >= min_confidence]
+    if not candidates:
+        return None
+    # Maior confiança; em empate, o primeiro que aparece
+    return max(candidates, key=lambda amount: (amount.confidence, -amount.span[0]))
@@ -0,0 +1,293 @@
+"""
+Cache de embeddings endereçado por conteúdo.
+Cada embedding é armazenado em SQLite sob o hash do nome do modelo mais o
+texto do chunk, de modo que rodar o setup novamente só chama a API para
+chunks novos ou editados. Chunks que deixam de existir são coletados.
+Também mantém o cache de embeddings das perguntas usado pelo RAGAgent.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Iterable, Optional
+import numpy as np
+
+CACHE_PATH = 'data/embedding_cache.sqlite'
+
+# Conexões SQLite herdadas do processo pai por fork: o filho deixa de usá-las
+# mas as mantém referenciadas, pois fechá-las (inclusive pelo coletor de lixo)
+# pode fazer checkpoint e remover o WAL que o pai ainda está usando
+_inherited_connections = []
+
+
+def abandon_inherited(conn: Optional[sqlite3.Connection]) -> None:
+    """Deixa de usar, sem fechar, uma conexão herdada de outro processo por fork."""
+    if conn is not None:
+        _inherited_connections.append(conn)
+
+
+def cache_key(model: str, text: str) -> str:
+    """Calcula a chave de cache de um texto para um modelo."""
+    return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Cache persistente de embeddings em SQLite."""
+
+    def __init__(self, path: str = CACHE_PATH):
+        """Abre (ou cria) o arquivo de cache."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS refs (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (source, key)
+            );
+        """)
+        self.conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Retorna os embeddings em cache para as chaves informadas."""
+        found = {}
+        keys = list(set(keys))
+        # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+        for start in range(0, len(keys), 500):
+            block = keys[start:start + 500]
+            placeholders = ','.join('?' * len(block))
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", block
+            )
+            for key, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        """Armazena embeddings no cache."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+            [(key, model, np.asarray(vector, dtype=np.float32).tobytes(), now)
+             for key, vector in items.items()]
+        )
+        self.conn.commit()
+
+    def retain(self, source: str, keys: Iterable[str]) -> int:
+        """Define as chaves em uso por uma fonte e remove embeddings sem referência.
+
+        Retorna o número de embeddings removidos do cache.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM refs WHERE source = ?", (source,))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO refs (source, key) VALUES (?, ?)",
+                [(source, key) for key in set(keys)]
+            )
+            removed = self.conn.execute(
+                "DELETE FROM embeddings WHERE key NOT IN (SELECT key FROM refs)"
+            ).rowcount
+        return removed
+
+    def close(self) -> None:
+        """Fecha a conexão com o cache."""
+        self.conn.close()
+
+
+def embed_with_cache(embedder, cache: EmbeddingCache, texts: List[str], source: str) -> List[List[float]]:
+    """Gera embeddings consultando o cache e chamando a API só para textos novos.
+
+    Ao final, as chaves da fonte são atualizadas e os chunks que sumiram são coletados.
+    Textos cujo embedding não pôde ser gerado recebem None.
+    """
+    keys = [cache_key(embedder.model, text) for text in texts]
+    cached = cache.get_many(keys)
+
+    # Apenas textos sem embedding em cache vão para a API
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    new_items = {}
+    if missing:
+        new_embeddings = embedder.embed([texts[i] for i in missing])
+        new_items = {keys[i]: emb for i, emb in zip(missing, new_embeddings) if emb}
+        cache.put_many(embedder.model, new_items)
+        cached.update(new_items)
+
+    # Vetores vazios devolvidos pelo gerador não entram no cache: contam como falha
+    failed = len({keys[i] for i in missing} - set(new_items))
+    removed = cache.retain(source, [key for key in keys if key in cached])
+    print(f"{source}: {len(texts) - len(missing)} embeddings reaproveitados do cache, "
+          f"{len(new_items)} gerados, {removed} removidos.")
+    if failed:
+        print(f"{source}: falha ao gerar {failed} embeddings; esses textos ficam sem embedding (None).")
+
+    return [cached.get(key) for key in keys]
+
+
+QUERY_CACHE_PATH = 'data/query_cache.sqlite'
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(text: str) -> str:
+    """Normaliza uma pergunta para uso como chave (caixa, espaços e pontuação final)."""
+    return _WHITESPACE.sub(' ', text).strip().rstrip('?!.;: ').casefold()
+
+
+class QueryEmbeddingCache:
+    """Cache LRU com TTL de embeddings de perguntas, com camada persistente opcional.
+
+    A camada em memória é consultada primeiro; perdas caem na camada SQLite
+    (se habilitada), que sobrevive a reinícios do processo.
+    """
+
+    def __init__(self, model: str, max_size: int = 1000, ttl: float = 3600,
+                 persistent: bool = False, path: str = QUERY_CACHE_PATH,
+                 persistent_max_size: int = 50000):
+        """Inicializa o cache para um modelo de embedding."""
+        self.model = model
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persistent_max_size = persistent_max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.persistent = persistent
+        self.path = path
+        self.conn = None
+        if persistent:
+            self._connect()
+
+    def _connect(self) -> None:
+        """Abre a camada persistente."""
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"Erro ao abrir cache persistente de consultas: {e}")
+            self.conn = None
+
+    @classmethod
+    def from_settings(cls, settings: Dict, model: str) -> Optional['QueryEmbeddingCache']:
+        """Cria o cache a partir de cache_settings (None se desabilitado)."""
+        if not settings.get('enabled', True):
+            return None
+        return cls(model,
+                   max_size=settings.get('max_size', 1000),
+                   ttl=settings.get('ttl', 3600),
+                   persistent=settings.get('persistent', False),
+                   path=settings.get('persistent_path', QUERY_CACHE_PATH),
+                   persistent_max_size=settings.get('persistent_max_size', 50000))
+
+    def _expired(self, created_at: float) -> bool:
+        """Indica se uma entrada passou do TTL."""
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def get(self, query: str) -> Optional[List[float]]:
+        """Retorna o embedding em cache da pergunta, se houver."""
+        key = cache_key(self.model, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+            if self.conn is not None:
+                try:
+                    row = self.conn.execute(
+                        "SELECT vector, created_at FROM query_embeddings WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    # Base travada ou corrompida: conta como ausência, sem interromper a busca
+                    print(f"Erro ao ler cache de consultas: {e}")
+                    row = None
+                if row is not None and not self._expired(row[1]):
+                    vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+                    self._remember(key, vector, row[1])
+                    self.hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, embedding: List[float]) -> None:
+        """Armazena o embedding de uma pergunta."""
+        key = cache_key(self.model, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            self._remember(key, embedding, now)
+            if self.conn is not None:
+                try:
+                    with self.conn:
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                            (key, np.asarray(embedding, dtype=np.float32).tobytes(), now)
+                        )
+                        # Mantém a camada persistente dentro do limite, descartando as mais antigas
+                        self.conn.execute(
+                            "DELETE FROM query_embeddings WHERE key IN (SELECT key FROM query_embeddings "
+                            "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.persistent_max_size,)
+                        )
+                except sqlite3.Error as e:
+                    print(f"Erro ao gravar cache de consultas: {e}")
+
+    def _remember(self, key: str, embedding: List[float], created_at: float) -> None:
+        """Insere na camada em memória, removendo as entradas menos usadas."""
+        self._entries[key] = (embedding, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Estatísticas de uso do cache."""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    def clear(self) -> None:
+        """Esvazia a camada em memória."""
+        with self._lock:
+            self._entries.clear()
+
+    def close(self) -> None:
+        """Fecha a camada persistente."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def reopen(self) -> None:
+        """Abre uma nova conexão com a camada persistente (ex.: em um processo filho após fork).
+
+        A conexão herdada não é fechada: ela continua pertencendo ao processo pai.
+        """
+        abandon_inherited(self.conn)
+        self.conn = None
+        if self.persistent:
+            self._connect()
@@ -0,0 +1,414 @@
+"""
+Armazenamento binário dos embeddings.
+Os vetores ficam em uma única matriz float32 contígua, aberta com np.memmap,
+e o id, o conteúdo e os metadados de cada chunk ficam em um arquivo JSONL compacto.
+Os vetores são normalizados (norma L2 = 1) na gravação, de modo que o produto
+interno entre eles é a similaridade de cosseno.
+
+Atualizações incrementais acrescentam linhas ao fim dos arquivos e marcam as
+linhas substituídas ou removidas como apagadas no manifesto; o setup compacta
+o armazenamento ao regravá-lo por completo.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from typing import List, Dict, Optional, Iterable
+import numpy as np
+
+# Diretório padrão do armazenamento
+STORE_DIR = 'data/embeddings'
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = '.lock'
+STORE_VERSION = 2
+
+
+class StoreLock:
+    """Trava reentrante entre threads e processos para escrita no armazenamento."""
+
+    def __init__(self, path: str):
+        """Inicializa a trava sobre o arquivo informado."""
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+        return False
+
+
+class EmbeddingStore:
+    """Matriz de embeddings mapeada em memória com sidecar de conteúdo e metadados.
+
+    O manifesto é o ponto de commit: ele registra quantas linhas dos arquivos de
+    vetores e de chunks são válidas e quais foram apagadas, e só é substituído
+    (de forma atômica) depois que os dados foram gravados por completo.
+    """
+
+    def __init__(self, path: str = STORE_DIR):
+        """Abre o armazenamento sem copiar nem interpretar os vetores."""
+        self.path = path
+        self.lock = StoreLock(os.path.join(path, LOCK_FILE))
+        self._load()
+
+    def _load(self) -> None:
+        """Carrega manifesto, vetores e sidecar da geração publicada."""
+        self.manifest = self._read_manifest()
+        self.vectors = self._open_vectors()
+        self.ids, self.contents, self.metadata = self._read_chunks()
+        self.deleted = set(self.manifest.get('deleted', []))
+        self.row_by_id = {chunk_id: row for row, chunk_id in enumerate(self.ids)
+                          if row not in self.deleted}
+
+    @property
+    def count(self) -> int:
+        """Número de linhas no armazenamento (incluindo as apagadas)."""
+        return self.manifest.get('count', 0)
+
+    @property
+    def live_count(self) -> int:
+        """Número de chunks ativos no armazenamento."""
+        return self.count - len(self.deleted)
+
+    @property
+    def dimension(self) -> int:
+        """Dimensão dos vetores."""
+        return self.manifest.get('dim', 0)
+
+    @property
+    def normalized(self) -> bool:
+        """Indica se os vetores foram gravados com norma L2 unitária."""
+        return self.manifest.get('normalized', False)
+
+    @property
+    def corpus_hash(self) -> str:
+        """Hash do conteúdo do corpus, atualizado a cada gravação."""
+        return self.manifest.get('corpus_hash', '')
+
+    def live_rows(self) -> List[int]:
+        """Linhas ativas (não apagadas), em ordem."""
+        if not self.deleted:
+            return list(range(self.count))
+        return [row for row in range(self.count) if row not in self.deleted]
+
+    def live_vectors(self) -> np.ndarray:
+        """Vetores das linhas ativas (sem cópia quando não há linhas apagadas)."""
+        if not self.deleted:
+            return self.vectors
+        return self.vectors[self.live_rows()]
+
+    def live_vector_ids(self) -> np.ndarray:
+        """Ids numéricos (int64) dos vetores ativos, na ordem de live_rows()."""
+        return np.array([vector_id(self.ids[row]) for row in self.live_rows()], dtype=np.int64)
+
+    def _read_manifest(self) -> Dict:
+        """Lê o manifesto do armazenamento, se existir."""
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _open_vectors(self) -> np.ndarray:
+        """Mapeia a matriz de vetores em memória (somente leitura)."""
+        if self.count == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.memmap(
+            os.path.join(self.path, self.manifest['vectors']),
+            dtype=np.float32,
+            mode='r',
+            shape=(self.count, self.dimension)
+        )
+
+    def _read_chunks(self) -> tuple:
+        """Lê ids, conteúdo e metadados do sidecar JSONL."""
+        ids = []
+        contents = []
+        metadata = []
+        if self.count == 0:
+            return ids, contents, metadata
+        with open(os.path.join(self.path, self.manifest['chunks']), 'r', encoding='utf-8') as f:
+            for row, line in enumerate(f):
+                if row >= self.count:
+                    break
+                record = json.loads(line)
+                ids.append(record.get('id') or default_chunk_id(record['metadata'], row))
+                contents.append(record['content'])
+                metadata.append(record['metadata'])
+        return ids, contents, metadata
+
+    def refresh(self) -> bool:
+        """Recarrega o armazenamento se outro processo publicou uma nova versão."""
+        manifest = self._read_manifest()
+        if (manifest.get('generation') == self.manifest.get('generation')
+                and manifest.get('corpus_hash') == self.corpus_hash):
+            return False
+        self._load()
+        return True
+
+    def replace_source(self, source: str, records: List[Dict]) -> None:
+        """Substitui todos os chunks de uma fonte pelos novos registros e compacta.
+
+        Cada registro deve ter as chaves 'embedding', 'content' e 'metadata'
+        (e opcionalmente 'id'). Chunks de outras fontes são preservados.
+        """
+        with self.lock:
+            self.refresh()
+            keep = [row for row in self.live_rows() if self.metadata[row].get('source') != source]
+            vectors = [self.vectors[keep]] if keep else []
+            if records:
+                vectors.append(np.asarray([r['embedding'] for r in records], dtype=np.float32))
+
+            ids = [self.ids[row] for row in keep] + [
+                r.get('id') or default_chunk_id(r['metadata'], i) for i, r in enumerate(records)
+            ]
+            contents = [self.contents[row] for row in keep] + [r['content'] for r in records]
+            metadata = [self.metadata[row] for row in keep] + [r['metadata'] for r in records]
+            matrix = np.vstack(vectors) if vectors else np.zeros((0, self.dimension), dtype=np.float32)
+
+            self.write(matrix, ids, contents, metadata)
+
+    def compact(self) -> None:
+        """Regrava o armazenamento sem as linhas apagadas."""
+        with self.lock:
+            self.refresh()
+            rows = self.live_rows()
+            self.write(self.vectors[rows],
+                       [self.ids[row] for row in rows],
+                       [self.contents[row] for row in rows],
+                       [self.metadata[row] for row in rows])
+
+    def write(self, matrix: np.ndarray, ids: List[str], contents: List[str], metadata: List[Dict]) -> None:
+        """Grava uma nova geração do armazenamento e a publica atomicamente."""
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            matrix = normalize_vectors(matrix)
+            generation = self.manifest.get('generation', 0) + 1
+            vectors_file = f'vectors.{generation}.f32'
+            chunks_file = f'chunks.{generation}.jsonl'
+
+            # Grava a matriz contígua de vetores
+            with open(os.path.join(self.path, vectors_file), 'wb') as f:
+                matrix.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Grava o sidecar compacto com id, conteúdo e metadados
+            with open(os.path.join(self.path, chunks_file), 'wb') as f:
+                for line in _encode_records(ids, contents, metadata):
+                    f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                chunks_bytes = f.tell()
+
+            previous = self.manifest
+            manifest = {
+                'version': STORE_VERSION,
+                'generation': generation,
+                'dtype': 'float32',
+                'normalized': True,
+                'dim': int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+                'count': int(matrix.shape[0]),
+                'deleted': [],
+                'vectors': vectors_file,
+                'chunks': chunks_file,
+                'chunks_bytes': chunks_bytes,
+                'corpus_hash': compute_corpus_hash(matrix, ids, contents, metadata)
+            }
+            self._write_manifest(manifest)
+
+            # Remove a geração anterior; leitores que ainda a mapeiam mantêm acesso
+            for key in ('vectors', 'chunks'):
+                old_file = previous.get(key)
+                if old_file and old_file != manifest[key]:
+                    try:
+                        os.remove(os.path.join(self.path, old_file))
+                    except OSError:
+                        pass
+
+            self._load()
+
+    def upsert(self, records: List[Dict]) -> Dict:
+        """Insere ou substitui chunks pelo id, acrescentando-os ao fim do armazenamento.
+
+        Cada registro deve ter 'id', 'embedding', 'content' e 'metadata'.
+        Retorna {'added': [ids], 'replaced': [ids]}.
+        """
+        # Se o mesmo id aparecer mais de uma vez, vale o último
+        records = list({r['id']: r for r in records}.values())
+        if not records:
+            return {'added': [], 'replaced': []}
+
+        with self.lock:
+            self.refresh()
+            ids = [r['id'] for r in records]
+            replaced = [chunk_id for chunk_id in ids if chunk_id in self.row_by_id]
+            if self.count == 0:
+                self.write(np.asarray([r['embedding'] for r in records], dtype=np.float32), ids,
+                           [r['content'] for r in records], [r['metadata'] for r in records])
+                return {'added': ids, 'replaced': []}
+            if 'chunks_bytes' not in self.manifest:
+                # Armazenamentos da versão anterior são regravados no formato atual
+                self.compact()
+
+            matrix = normalize_vectors([r['embedding'] for r in records])
+            contents = [r['content'] for r in records]
+            metadata = [r['metadata'] for r in records]
+            vectors_path = os.path.join(self.path, self.manifest['vectors'])
+            chunks_path = os.path.join(self.path, self.manifest['chunks'])
+
+            # Descarta restos de gravações interrompidas antes de acrescentar
+            with open(vectors_path, 'r+b') as f:
+                f.truncate(self.count * self.dimension * 4)
+                f.seek(0, os.SEEK_END)
+                matrix.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(chunks_path, 'r+b') as f:
+                f.truncate(self.manifest['chunks_bytes'])
+                f.seek(0, os.SEEK_END)
+                for line in _encode_records(ids, contents, metadata):
+                    f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                chunks_bytes = f.tell()
+
+            deleted = self.deleted | {self.row_by_id[chunk_id] for chunk_id in replaced}
+            manifest = {
+                **self.manifest,
+                'count': self.count + len(records),
+                'deleted': sorted(deleted),
+                'chunks_bytes': chunks_bytes,
+                'corpus_hash': _chain_hash(self.corpus_hash, 'upsert', ids, matrix, contents, metadata)
+            }
+            self._write_manifest(manifest)
+
+            # Atualiza o estado em memória sem reler o sidecar
+            first_row = self.count
+            self.manifest = manifest
+            self.deleted = deleted
+            self.vectors = self._open_vectors()
+            self.ids.extend(ids)
+            self.contents.extend(contents)
+            self.metadata.extend(metadata)
+            for offset, chunk_id in enumerate(ids):
+                self.row_by_id[chunk_id] = first_row + offset
+
+        return {'added': [i for i in ids if i not in replaced], 'replaced': replaced}
+
+    def delete(self, chunk_ids: Iterable[str]) -> List[str]:
+        """Marca chunks como apagados. Retorna os ids que existiam."""
+        with self.lock:
+            self.refresh()
+            removed = [chunk_id for chunk_id in dict.fromkeys(chunk_ids) if chunk_id in self.row_by_id]
+            if not removed:
+                return []
+
+            deleted = self.deleted | {self.row_by_id[chunk_id] for chunk_id in removed}
+            manifest = {
+                **self.manifest,
+                'deleted': sorted(deleted),
+                'corpus_hash': _chain_hash(self.corpus_hash, 'delete', removed)
+            }
+            self._write_manifest(manifest)
+
+            self.manifest = manifest
+            self.deleted = deleted
+            for chunk_id in removed:
+                del self.row_by_id[chunk_id]
+        return removed
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        """Substitui o manifesto de forma atômica."""
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, manifest_path)
+
+
+def default_chunk_id(metadata: Dict, row: int) -> str:
+    """Id padrão de um chunk: fonte mais o número do chunk ou da regra."""
+    number = metadata.get('chunk_id', metadata.get('rule_id', row))
+    return f"{metadata.get('source', 'unknown')}#{number}"
+
+
+def vector_id(chunk_id: str) -> int:
+    """Id numérico estável (int64 positivo) de um chunk, usado no índice FAISS."""
+    digest = hashlib.sha1(chunk_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') & 0x7FFFFFFFFFFFFFFF
+
+
+def read_corpus_hash(path: str = STORE_DIR) -> str:
+    """Hash do corpus publicado, lido só do manifesto ('' se não houver armazenamento)."""
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f).get('corpus_hash', '')
+    except (OSError, ValueError):
+        return ''
+
+
+def normalize_vectors(matrix: np.ndarray) -> np.ndarray:
+    """Retorna uma cópia float32 contígua dos vetores com norma L2 unitária."""
+    matrix = np.array(matrix, dtype=np.float32, copy=True, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return np.ascontiguousarray(matrix)
+
+
+def compute_corpus_hash(matrix: np.ndarray, ids: List[str], contents: List[str], metadata: List[Dict]) -> str:
+    """Calcula um hash estável dos vetores, ids, conteúdos e metadados do corpus."""
+    digest = hashlib.sha256()
+    digest.update(str(matrix.shape).encode('utf-8'))
+    digest.update(memoryview(np.ascontiguousarray(matrix, dtype=np.float32)).cast('B'))
+    for chunk_id, content, meta in zip(ids, contents, metadata):
+        digest.update(chunk_id.encode('utf-8'))
+        digest.update(content.encode('utf-8'))
+        digest.update(json.dumps(meta, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _chain_hash(previous: str, operation: str, ids: List[str], matrix: np.ndarray = None,
+                contents: List[str] = None, metadata: List[Dict] = None) -> str:
+    """Deriva o novo hash do corpus a partir do anterior e de uma operação incremental."""
+    digest = hashlib.sha256(f"{previous}\0{operation}".encode('utf-8'))
+    if matrix is not None:
+        digest.update(compute_corpus_hash(matrix, ids, contents, metadata).encode('utf-8'))
+    else:
+        for chunk_id in ids:
+            digest.update(chunk_id.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _encode_records(ids: List[str], contents: List[str], metadata: List[Dict]) -> Iterable[bytes]:
+    """Serializa os registros do sidecar, um JSON compacto por linha."""
+    for chunk_id, content, meta in zip(ids, contents, metadata):
+        line = json.dumps({'id': chunk_id, 'content': content, 'metadata': meta},
+                          ensure_ascii=False, separators=(',', ':'))
+        yield (line + '\n').encode('utf-8')
+
+
+def open_store(path: str = STORE_DIR) -> Optional[EmbeddingStore]:
+    """Abre o armazenamento de embeddings, retornando None se estiver vazio."""
+    store = EmbeddingStore(path)
+    return store if store.count > 0 else None
@@ -1,25 +1,24 @@
 import json
 import os
 from typing import List, Dict
-import openai
-from tqdm import tqdm
-import time
+from utils.embedding_store import EmbeddingStore, default_chunk_id
+from utils.batch_embedder import BatchEmbedder
+from utils.embedding_cache import EmbeddingCache, embed_with_cache
+from utils.resources import get_provider
+from utils.process_policy import POLICY_SOURCE, policy_chunk_id
 
 def load_config() -> Dict:
     with open('config/rag_config.json', 'r') as f:
         return json.load(f)
 
-def get_embedding(text: str, config: Dict) -> List[float]:
-    """Get embedding for a text using OpenAI's API."""
-    try:
-        response = openai.Embedding.create(
-            input=text,
-            model=config['embedding_settings']['model']
-        )
-        return response['data'][0]['embedding']
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return None
+def chunk_record_id(chunk: Dict, row: int) -> str:
+    """Same id the ingestion scripts give the chunk, so upserts can replace it."""
+    if chunk.get('id'):
+        return chunk['id']
+    metadata = chunk['metadata']
+    if metadata.get('source') == POLICY_SOURCE and 'section' in metadata:
+        return policy_chunk_id(metadata)
+    return default_chunk_id(metadata, row)
 
 def process_chunks():
     config = load_config()
@@ -34,29 +33,38 @@ def process_chunks():
             if file.endswith('.json'):
                 chunk_files.append(os.path.join(root, file))
     
-    # Process each chunk file
-    for chunk_file in tqdm(chunk_files, desc="Processing chunks"):
-        # Read chunk
+    # Read all chunks
+    chunks = []
+    for chunk_file in chunk_files:
         with open(chunk_file, 'r', encoding='utf-8') as f:
-            chunk = json.load(f)
-        
-        # Generate embedding
-        embedding = get_embedding(chunk['content'], config)
-        
-        if embedding:
-            # Add embedding to chunk
-            chunk['embedding'] = embedding
-            
-            # Save updated chunk
-            embedding_file = os.path.join(
-                'data/embeddings',
-                os.path.basename(chunk_file)
+            chunks.append(json.load(f))
+    
+    # Group chunks by source
+    chunks_by_source = {}
+    for chunk in chunks:
+        source = chunk['metadata'].get('source', 'unknown')
+        chunks_by_source.setdefault(source, []).append(chunk)
+    
+    # Generate embeddings in token-budgeted batches, skipping cached chunks
+    embedding_settings = config['embedding_settings']
+    embedder = BatchEmbedder(get_provider().client, embedding_settings['model'], embedding_settings)
+    cache = EmbeddingCache()
+    store = EmbeddingStore()
+    try:
+        for source, source_chunks in chunks_by_source.items():
+            embeddings = embed_with_cache(
+                embedder, cache, [chunk['content'] for chunk in source_chunks], source
             )
-            with open(embedding_file, 'w', encoding='utf-8') as f:
-                json.dump(chunk, f, ensure_ascii=False, indent=2)
             
-            # Respect rate limits
-            time.sleep(0.1)  # 100ms delay between requests
+            # Write the source's vectors to the memory-mapped store
+            records = [
+                {'id': chunk_record_id(chunk, row), 'embedding': embedding,
+                 'content': chunk['content'], 'metadata': chunk['metadata']}
+                for row, (chunk, embedding) in enumerate(zip(source_chunks, embeddings)) if embedding
+            ]
+            store.replace_source(source, records)
+    finally:
+        cache.close()
 
 def main():
     # Check for OpenAI API key
@@ -0,0 +1,416 @@
+"""
+Clientes HTTP compartilhados para a API da OpenAI.
+Um único pool de conexões (keep-alive, HTTP/2 quando o pacote h2 está
+instalado) por processo, novas tentativas com jitter em 429/5xx respeitando
+Retry-After e um limitador que restringe requisições simultâneas, requisições
+por minuto e tokens por minuto. Tudo é feito na camada de transporte do httpx,
+de modo que vale para qualquer chamada do SDK.
+"""
+
+import asyncio
+import importlib.util
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+import httpx
+
+# Valores padrão de http_settings
+DEFAULT_HTTP_SETTINGS = {
+    "http2": True,
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "connect_timeout": 5.0,
+    "timeout": 60.0,
+    "max_retries": 4,
+    "backoff_base": 0.5,
+    "backoff_max": 30.0,
+    "max_concurrency": 16,
+    "requests_per_minute": 0,
+    "tokens_per_minute": 0,
+    "completion_tokens_estimate": 500
+}
+
+# Respostas que valem uma nova tentativa
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> float:
+    """Converte durações da API (ex.: '1s', '6m0s', '20ms') em segundos."""
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    return sum(float(amount) * _DURATION_UNITS[unit]
+               for amount, unit in _DURATION_PATTERN.findall(value))
+
+
+def retry_after(headers) -> float:
+    """Espera pedida pelo servidor (retry-after-ms ou retry-after), em segundos."""
+    if not headers:
+        return 0.0
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return parse_duration(headers['retry-after'])
+    except ValueError:
+        pass
+    return 0.0
+
+
+def backoff_delay(attempt: int, base: float, maximum: float, headers=None) -> float:
+    """Espera antes da tentativa seguinte: Retry-After, ou exponencial com jitter."""
+    requested = retry_after(headers)
+    if requested > 0:
+        return min(requested, maximum)
+    return min(base * (2 ** attempt), maximum) * random.uniform(0.5, 1.0)
+
+
+def estimate_tokens(body: bytes, completion_estimate: int) -> int:
+    """Estimativa dos tokens consumidos por uma requisição (entrada + saída esperada)."""
+    try:
+        payload = json.loads(body) if body else {}
+    except (ValueError, UnicodeDecodeError):
+        return max(1, len(body) // 4)
+    if not isinstance(payload, dict):
+        return max(1, len(body) // 4)
+    texts = []
+    if 'messages' in payload:
+        texts = [str(message.get('content') or '') for message in payload['messages']]
+    elif 'input' in payload:
+        texts = payload['input'] if isinstance(payload['input'], list) else [payload['input']]
+    prompt = sum(len(str(text)) for text in texts) // 4
+    if 'messages' in payload:
+        prompt += payload.get('max_tokens') or payload.get('max_completion_tokens') or completion_estimate
+    return max(1, prompt)
+
+
+class _SlotWaiter:
+    """Quem aguarda uma vaga do limitador: uma thread (Event) ou uma corrotina (Future do seu laço)."""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.granted = False
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+    def wake(self) -> bool:
+        """Entrega a vaga; False se o laço de quem aguardava já foi encerrado."""
+        if self.loop is None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:
+            return False
+        return True
+
+
+class RequestLimiter:
+    """Limite de requisições simultâneas e cotas por minuto (token bucket), por processo.
+
+    Serve tanto ao cliente síncrono quanto ao assíncrono, em qualquer laço de eventos.
+    """
+
+    def __init__(self, max_concurrency: int = 16, requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0):
+        """Inicializa o limitador (0 desativa a cota correspondente)."""
+        self.max_concurrency = max_concurrency
+        # Vagas livres e fila de quem aguarda (threads e corrotinas, em ordem de chegada)
+        self._free_slots = max_concurrency
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._buckets = {}
+        for name, per_minute in (('requests', requests_per_minute), ('tokens', tokens_per_minute)):
+            if per_minute:
+                self._buckets[name] = [float(per_minute), per_minute / 60.0, float(per_minute)]
+        self._updated_at = time.monotonic()
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: Dict) -> 'RequestLimiter':
+        """Cria o limitador a partir de http_settings."""
+        settings = {**DEFAULT_HTTP_SETTINGS, **(settings or {})}
+        return cls(settings['max_concurrency'], settings['requests_per_minute'],
+                   settings['tokens_per_minute'])
+
+    def reserve(self, tokens: int) -> float:
+        """Desconta uma requisição e seus tokens das cotas; retorna quanto esperar antes de enviá-la."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated_at
+            self._updated_at = now
+            wait = 0.0
+            for name, bucket in self._buckets.items():
+                available, rate, capacity = bucket
+                available = min(capacity, available + elapsed * rate)
+                # A cota pode ficar negativa: quem chega depois espera a dívida ser paga
+                available -= min(1 if name == 'requests' else tokens, capacity)
+                bucket[0] = available
+                if available < 0:
+                    wait = max(wait, -available / rate)
+            if wait > 0:
+                self.waits += 1
+                self.waited_seconds += wait
+            return wait
+
+    def _try_acquire(self, waiter: Optional['_SlotWaiter'] = None) -> bool:
+        """Ocupa uma vaga livre se ninguém aguarda; senão, põe waiter na fila (chamada com _lock)."""
+        if self._free_slots > 0 and not self._waiters:
+            self._free_slots -= 1
+            return True
+        if waiter is not None:
+            self._waiters.append(waiter)
+        return False
+
+    def acquire(self) -> None:
+        """Ocupa uma vaga de requisição simultânea (bloqueante)."""
+        if not self.max_concurrency:
+            return
+        waiter = _SlotWaiter()
+        with self._lock:
+            if self._try_acquire(waiter):
+                return
+        # release() passa a vaga diretamente a quem está na fila
+        waiter.event.wait()
+
+    async def acquire_async(self) -> None:
+        """Ocupa uma vaga de requisição simultânea sem bloquear o laço de eventos."""
+        if not self.max_concurrency:
+            return
+        waiter = _SlotWaiter(asyncio.get_running_loop())
+        with self._lock:
+            if self._try_acquire(waiter):
+                return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                # A vaga chegou junto com o cancelamento: repassa-a ao próximo
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Libera a vaga ocupada por acquire(), entregando-a ao primeiro da fila."""
+        if not self.max_concurrency:
+            return
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self._free_slots += 1
+                    return
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+            if waiter.wake():
+                return
+
+    def stats(self) -> Dict:
+        """Esperas impostas pelas cotas por minuto."""
+        return {'waits': self.waits, 'waited_seconds': round(self.waited_seconds, 3)}
+
+
+class _RetryPolicy:
+    """Parâmetros de nova tentativa comuns aos transportes síncrono e assíncrono."""
+
+    def __init__(self, limiter: RequestLimiter, settings: Dict):
+        self.limiter = limiter
+        self.max_retries = settings['max_retries']
+        self.backoff_base = settings['backoff_base']
+        self.backoff_max = settings['backoff_max']
+        self.completion_estimate = settings['completion_tokens_estimate']
+
+    def should_retry(self, attempt: int, response: Optional[httpx.Response]) -> bool:
+        """Indica se a resposta (None em erro de conexão) merece nova tentativa."""
+        if attempt >= self.max_retries:
+            return False
+        return response is None or response.status_code in RETRY_STATUS
+
+    def delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Espera antes da próxima tentativa."""
+        headers = response.headers if response is not None else None
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max, headers)
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Corpo da resposta que devolve a vaga do limitador quando é fechado."""
+
+    def __init__(self, stream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def _release_once(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release_once()
+
+
+class _AsyncReleasingStream(_ReleasingStream, httpx.AsyncByteStream):
+    """Versão assíncrona de _ReleasingStream."""
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release_once()
+
+
+def _release_on_close(response: httpx.Response, stream: httpx.SyncByteStream) -> httpx.Response:
+    """A mesma resposta, com o corpo trocado pelo que libera a vaga ao ser fechado."""
+    return httpx.Response(status_code=response.status_code, headers=response.headers,
+                          stream=stream, extensions=response.extensions)
+
+
+class LimitedTransport(httpx.BaseTransport):
+    """Transporte síncrono com limitador e novas tentativas."""
+
+    def __init__(self, transport: httpx.BaseTransport, limiter: RequestLimiter, settings: Dict):
+        self._transport = transport
+        self._policy = _RetryPolicy(limiter, settings)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        policy = self._policy
+        body = request.read()
+        attempt = 0
+        while True:
+            wait = policy.limiter.reserve(estimate_tokens(body, policy.completion_estimate))
+            if wait > 0:
+                time.sleep(wait)
+            policy.limiter.acquire()
+            response = None
+            handed_over = False
+            try:
+                response = self._transport.handle_request(request)
+                if not policy.should_retry(attempt, response):
+                    # A vaga só é liberada quando o corpo (ex.: um stream) for fechado
+                    handed_over = True
+                    return _release_on_close(response, _ReleasingStream(response.stream, policy.limiter.release))
+                response.read()
+                response.close()
+            except httpx.TransportError:
+                if not policy.should_retry(attempt, None):
+                    raise
+            finally:
+                if not handed_over:
+                    policy.limiter.release()
+            delay = policy.delay(attempt, response)
+            print(f"Falha temporária na API ({response.status_code if response is not None else 'conexão'}), "
+                  f"nova tentativa em {delay:.1f}s", file=sys.stderr)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncLimitedTransport(httpx.AsyncBaseTransport):
+    """Transporte assíncrono com limitador e novas tentativas."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: RequestLimiter, settings: Dict):
+        self._transport = transport
+        self._policy = _RetryPolicy(limiter, settings)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        policy = self._policy
+        body = await request.aread()
+        attempt = 0
+        while True:
+            wait = policy.limiter.reserve(estimate_tokens(body, policy.completion_estimate))
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await policy.limiter.acquire_async()
+            response = None
+            handed_over = False
+            try:
+                response = await self._transport.handle_async_request(request)
+                if not policy.should_retry(attempt, response):
+                    handed_over = True
+                    return _release_on_close(response,
+                                             _AsyncReleasingStream(response.stream, policy.limiter.release))
+                await response.aread()
+                await response.aclose()
+            except httpx.TransportError:
+                if not policy.should_retry(attempt, None):
+                    raise
+            finally:
+                if not handed_over:
+                    policy.limiter.release()
+            delay = policy.delay(attempt, response)
+            print(f"Falha temporária na API ({response.status_code if response is not None else 'conexão'}), "
+                  f"nova tentativa em {delay:.1f}s", file=sys.stderr)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _http2_available(settings: Dict) -> bool:
+    """HTTP/2 só é usado se habilitado e se o pacote h2 estiver instalado."""
+    if not settings['http2']:
+        return False
+    if importlib.util.find_spec('h2') is None:
+        print("Pacote h2 não instalado; usando HTTP/1.1 com keep-alive.", file=sys.stderr)
+        return False
+    return True
+
+
+def _pool_options(settings: Dict) -> Dict:
+    """Opções do pool de conexões e de timeout."""
+    return {
+        'limits': httpx.Limits(max_connections=settings['max_connections'],
+                               max_keepalive_connections=settings['max_keepalive_connections'],
+                               keepalive_expiry=settings['keepalive_expiry']),
+        'http2': _http2_available(settings)
+    }
+
+
+def _timeout(settings: Dict) -> httpx.Timeout:
+    """Timeout das requisições, com conexão mais curta."""
+    return httpx.Timeout(settings['timeout'], connect=settings['connect_timeout'])
+
+
+def create_http_client(limiter: RequestLimiter, settings: Dict = None) -> httpx.Client:
+    """Cliente httpx síncrono com pool, limitador e novas tentativas."""
+    settings = {**DEFAULT_HTTP_SETTINGS, **(settings or {})}
+    transport = LimitedTransport(httpx.HTTPTransport(**_pool_options(settings)), limiter, settings)
+    return httpx.Client(transport=transport, timeout=_timeout(settings), follow_redirects=True)
+
+
+def create_async_http_client(limiter: RequestLimiter, settings: Dict = None) -> httpx.AsyncClient:
+    """Cliente httpx assíncrono com pool, limitador e novas tentativas."""
+    settings = {**DEFAULT_HTTP_SETTINGS, **(settings or {})}
+    transport = AsyncLimitedTransport(httpx.AsyncHTTPTransport(**_pool_options(settings)), limiter, settings)
+    return httpx.AsyncClient(transport=transport, timeout=_timeout(settings), follow_redirects=True)
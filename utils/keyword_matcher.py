@@ -0,0 +1,96 @@
+"""
+Busca de muitas palavras-chave em uma única passada (autômato de Aho-Corasick).
+O autômato é montado uma vez e encontra todas as ocorrências, com sua posição,
+em tempo proporcional ao tamanho do texto, independentemente do número de
+palavras-chave do catálogo.
+"""
+
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+
+# Final de palavra após a palavra-chave, aceitando o plural ("notebook" em "notebooks")
+_WORD_END = re.compile(r'(?:e?s)?(?!\w)')
+
+
+@dataclass(frozen=True)
+class KeywordHit:
+    """Ocorrência de uma palavra-chave no texto."""
+    keyword: str
+    category: str
+    start: int
+    end: int
+    # Posição da categoria e da palavra-chave no catálogo (ordem de prioridade)
+    priority: tuple
+
+
+class KeywordMatcher:
+    """Autômato de Aho-Corasick sobre um catálogo categoria -> palavras-chave.
+
+    A correspondência é por substring, como `keyword in text`.
+    """
+
+    def __init__(self, catalog: Dict[str, Iterable[str]]):
+        """Monta o autômato a partir do catálogo."""
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for category_index, (category, keywords) in enumerate(catalog.items()):
+            for keyword_index, keyword in enumerate(keywords):
+                self._add(keyword, (keyword, category, (category_index, keyword_index)))
+        self._build_failure_links()
+
+    def _add(self, keyword: str, payload: tuple) -> None:
+        """Insere uma palavra-chave na trie."""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(payload)
+
+    def _build_failure_links(self) -> None:
+        """Calcula os links de falha em largura e propaga as saídas."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                candidate = self._goto[fail].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """Retorna todas as ocorrências das palavras-chave no texto, na ordem em que terminam."""
+        hits = []
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword, category, priority in output[state]:
+                end = position + 1
+                hits.append(KeywordHit(keyword, category, end - len(keyword), end, priority))
+        return hits
+
+    def find_words(self, text: str) -> List[KeywordHit]:
+        """Como find_all, mas só as ocorrências que são palavras inteiras ("ide" não casa em "presidente")."""
+        return [hit for hit in self.find_all(text)
+                if (hit.start == 0 or not text[hit.start - 1].isalnum()) and _WORD_END.match(text, hit.end)]
+
+    @staticmethod
+    def first(hits: List[KeywordHit]) -> KeywordHit:
+        """Ocorrência de maior prioridade (primeira categoria e palavra-chave do catálogo)."""
+        return min(hits, key=lambda hit: hit.priority) if hits else None
@@ -0,0 +1,121 @@
+"""
+Agrupamento dinâmico de requisições simultâneas (micro-batching).
+Itens que chegam dentro de uma janela curta (alguns milissegundos) ou até
+completar um lote são processados juntos por uma única função de lote, e cada
+chamador recebe o seu resultado. Serve tanto a threads quanto a corrotinas,
+que aguardam o mesmo Future sem bloquear o laço de eventos.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Valores padrão de batching_settings
+DEFAULT_BATCHING_SETTINGS = {
+    "enabled": True,
+    "window_ms": 5,
+    "max_batch": 64,
+    "max_inflight": 4
+}
+
+
+class MicroBatcher:
+    """Coleta itens de vários chamadores e os processa em lotes.
+
+    process_batch recebe a lista de itens e retorna a lista de resultados na
+    mesma ordem; uma exceção é repassada a todos os chamadores do lote. Até
+    max_inflight lotes são processados ao mesmo tempo, enquanto o próximo é coletado.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], window: float = 0.005,
+                 max_batch: int = 64, max_inflight: int = 4, name: str = 'micro-batcher'):
+        """Inicializa o agrupador; a thread coletora só é criada no primeiro uso."""
+        self.process_batch = process_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.max_inflight = max_inflight
+        self.name = name
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._executor = None
+        self.batches = 0
+        self.items = 0
+
+    @classmethod
+    def from_settings(cls, process_batch: Callable[[List[Any]], List[Any]], settings: Dict,
+                      name: str = 'micro-batcher') -> Optional['MicroBatcher']:
+        """Cria o agrupador a partir de batching_settings (None se desabilitado)."""
+        settings = {**DEFAULT_BATCHING_SETTINGS, **(settings or {})}
+        if not settings['enabled']:
+            return None
+        return cls(process_batch, settings['window_ms'] / 1000, settings['max_batch'],
+                   settings['max_inflight'], name)
+
+    def _start(self) -> None:
+        """Cria a thread coletora e o pool que processa os lotes."""
+        with self._lock:
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(self.max_inflight, thread_name_prefix=self.name)
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Enfileira um item; o Future recebe seu resultado quando o lote for processado."""
+        if self._thread is None:
+            self._start()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def run(self, item: Any) -> Any:
+        """Processa um item no próximo lote e aguarda o resultado."""
+        return self.submit(item).result()
+
+    async def run_async(self, item: Any) -> Any:
+        """Versão assíncrona de run."""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _run(self) -> None:
+        """Laço da thread coletora: fecha um lote pela janela ou pelo tamanho máximo."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._process, batch)
+
+    def _process(self, batch: List[tuple]) -> None:
+        """Processa um lote e entrega a cada chamador o seu resultado."""
+        # Chamadores que desistiram (ex.: tempo esgotado) não entram no lote
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+        try:
+            results = self.process_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self) -> Dict:
+        """Lotes processados e tamanho médio."""
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch': self.items / self.batches if self.batches else 0.0
+        }
@@ -2,43 +2,19 @@
 Processa as regras financeiras e gera embeddings para busca semântica.
 """
 
+import glob
 import json
 import os
 from typing import List, Dict, Any
-from openai import OpenAI
 import numpy as np
-from dotenv import load_dotenv
-
-# Carrega variáveis de ambiente
-load_dotenv()
-
-# Inicializa o cliente OpenAI
-client = OpenAI()
+from utils.embedding_store import EmbeddingStore
+from utils.batch_embedder import BatchEmbedder
+from utils.embedding_cache import EmbeddingCache, embed_with_cache
+from utils.resources import get_provider
 
 def load_config() -> Dict:
-    """Carrega configuração do arquivo."""
-    try:
-        with open('config/rag_config.json', 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Erro ao carregar configuração: {e}")
-        return {
-            "embedding_settings": {
-                "model": "text-embedding-ada-002"
-            }
-        }
-
-def get_embedding(text: str, config: Dict) -> List[float]:
-    """Gera embedding para o texto usando OpenAI API."""
-    try:
-        response = client.embeddings.create(
-            input=text,
-            model=config['embedding_settings']['model']
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"Erro ao gerar embedding: {e}")
-        return None
+    """Configuração do processo (config/rag_config.json)."""
+    return get_provider().config
 
 def extract_keywords_from_dict(data: Any) -> List[str]:
     """Extrai palavras-chave de um dicionário ou lista."""
@@ -58,7 +34,26 @@ def extract_keywords_from_dict(data: Any) -> List[str]:
             elif isinstance(item, str):
                 keywords.extend(item.split())
     
-    return list(set(keywords))
+    # Ordena para que os metadados (e o hash do corpus) sejam estáveis entre execuções
+    return sorted(set(keywords))
+
+FINANCE_SOURCE = 'finance_rules.json'
+FINANCE_PATH = 'data/raw/finance_rules.json'
+
+def chunk_finance(rules: Any) -> List[Dict]:
+    """Converte as regras financeiras em chunks com id, conteúdo e metadados."""
+    chunks = []
+    for i, rule in enumerate(rules):
+        chunks.append({
+            'id': f'{FINANCE_SOURCE}#{i}',
+            'content': json.dumps(rule, ensure_ascii=False),
+            'metadata': {
+                'source': FINANCE_SOURCE,
+                'rule_id': i,
+                'keywords': extract_keywords_from_dict(rule)
+            }
+        })
+    return chunks
 
 def process_finance():
     """Processa as regras financeiras e gera embeddings."""
@@ -70,51 +65,54 @@ def process_finance():
     os.makedirs('data/embeddings', exist_ok=True)
     os.makedirs('data/metadata', exist_ok=True)
     
+    # Remove os arquivos de uma execução anterior (o número de regras pode ter diminuído)
+    for pattern in ('data/chunks/finance_chunk_*.json', 'data/metadata/finance_metadata_*.json'):
+        for path in glob.glob(pattern):
+            os.remove(path)
+    
     try:
         # Lê o arquivo de regras financeiras
-        with open('data/raw/finance_rules.json', 'r', encoding='utf-8') as f:
+        with open(FINANCE_PATH, 'r', encoding='utf-8') as f:
             rules = json.load(f)
         
+        # Converte cada regra em chunk
+        chunks = chunk_finance(rules)
+        
+        # Gera os embeddings em lote, reaproveitando os que já estão em cache
+        embedding_settings = config['embedding_settings']
+        embedder = BatchEmbedder(get_provider().client, embedding_settings['model'], embedding_settings)
+        cache = EmbeddingCache()
+        try:
+            embeddings = embed_with_cache(embedder, cache, [c['content'] for c in chunks], FINANCE_SOURCE)
+        finally:
+            cache.close()
+        
         # Processa cada regra
-        for i, rule in enumerate(rules):
-            # Converte regra para texto
-            rule_text = json.dumps(rule, ensure_ascii=False)
-            
-            # Gera embedding
-            embedding = get_embedding(rule_text, config)
+        records = []
+        for chunk, embedding in zip(chunks, embeddings):
             if not embedding:
                 continue
             
-            # Extrai palavras-chave
-            keywords = extract_keywords_from_dict(rule)
-            
-            # Prepara metadados
-            metadata = {
-                'source': 'finance_rules.json',
-                'rule_id': i,
-                'keywords': keywords
-            }
+            i = chunk['metadata']['rule_id']
             
             # Salva chunk
             chunk_data = {
-                'content': rule_text,
-                'metadata': metadata
+                'id': chunk['id'],
+                'content': chunk['content'],
+                'metadata': chunk['metadata']
             }
             with open(f'data/chunks/finance_chunk_{i}.json', 'w', encoding='utf-8') as f:
                 json.dump(chunk_data, f, ensure_ascii=False, indent=2)
             
-            # Salva embedding
-            embedding_data = {
-                'embedding': embedding,
-                'content': rule_text,
-                'metadata': metadata
-            }
-            with open(f'data/embeddings/finance_embedding_{i}.json', 'w', encoding='utf-8') as f:
-                json.dump(embedding_data, f, ensure_ascii=False, indent=2)
+            # Acumula embedding para o armazenamento binário
+            records.append({**chunk, 'embedding': embedding})
             
             # Salva metadados
             with open(f'data/metadata/finance_metadata_{i}.json', 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2)
+                json.dump(chunk['metadata'], f, ensure_ascii=False, indent=2)
+        
+        # Salva todos os embeddings das regras de uma só vez
+        EmbeddingStore().replace_source(FINANCE_SOURCE, records)
         
         print("Regras financeiras processadas com sucesso!")
         
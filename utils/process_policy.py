@@ -2,43 +2,71 @@
 Processa a política de compras e gera embeddings para busca semântica.
 """
 
+import glob
+import io
 import json
 import os
-from typing import List, Dict
-from openai import OpenAI
+from typing import List, Dict, Iterable
 import numpy as np
-from dotenv import load_dotenv
+from utils.embedding_store import EmbeddingStore
+from utils.batch_embedder import BatchEmbedder
+from utils.embedding_cache import EmbeddingCache, embed_with_cache
+from utils.resources import get_provider, POLICY_PATH
+from utils.chunker import iter_markdown_chunks
 
-# Carrega variáveis de ambiente
-load_dotenv()
+def load_config() -> Dict:
+    """Configuração do processo (config/rag_config.json)."""
+    return get_provider().config
 
-# Inicializa o cliente OpenAI
-client = OpenAI()
+POLICY_SOURCE = 'politica.md'
 
-def load_config() -> Dict:
-    """Carrega configuração do arquivo."""
-    try:
-        with open('config/rag_config.json', 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Erro ao carregar configuração: {e}")
-        return {
-            "embedding_settings": {
-                "model": "text-embedding-ada-002"
-            }
+def chunk_policy(lines: Iterable[str], chunk_settings: Dict = None) -> List[Dict]:
+    """Divide a política em chunks por seção do markdown, com id, conteúdo e metadados.
+
+    Os ids combinam o caminho da seção com a posição do chunk dentro dela, de modo
+    que editar uma seção não altera os ids das demais. Seções repetidas (mesmo
+    caminho de títulos) são distinguidas pela ordem em que aparecem.
+    """
+    if isinstance(lines, str):
+        lines = io.StringIO(lines)
+    if chunk_settings is None:
+        chunk_settings = load_config().get('chunk_settings', {})
+
+    chunks = []
+    occurrences = {}
+    for chunk in iter_markdown_chunks(lines,
+                                      chunk_size=chunk_settings.get('chunk_size', 1000),
+                                      chunk_overlap=chunk_settings.get('chunk_overlap', 200)):
+        section = ' > '.join(chunk['section_path'])
+        if chunk['part'] == 0:
+            occurrences[section] = occurrences.get(section, -1) + 1
+        metadata = {
+            'source': POLICY_SOURCE,
+            'section': section,
+            'section_path': chunk['section_path'],
+            'occurrence': occurrences.get(section, 0),
+            'part': chunk['part'],
+            'tokens': chunk['tokens']
         }
+        chunks.append({
+            'id': policy_chunk_id(metadata),
+            'content': chunk['content'],
+            'metadata': metadata
+        })
 
-def get_embedding(text: str, config: Dict) -> List[float]:
-    """Gera embedding para o texto usando OpenAI API."""
-    try:
-        response = client.embeddings.create(
-            input=text,
-            model=config['embedding_settings']['model']
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"Erro ao gerar embedding: {e}")
-        return None
+    ids = [chunk['id'] for chunk in chunks]
+    if len(set(ids)) != len(ids):
+        duplicated = sorted({chunk_id for chunk_id in ids if ids.count(chunk_id) > 1})
+        raise ValueError(f"Ids de chunk repetidos na política: {duplicated}")
+    return chunks
+
+def policy_chunk_id(metadata: Dict) -> str:
+    """Id de um chunk da política a partir da seção, da ocorrência dela e da parte."""
+    section = metadata['section']
+    occurrence = metadata.get('occurrence', 0)
+    if occurrence:
+        section = f"{section} ({occurrence + 1})"
+    return f"{POLICY_SOURCE}#{section}#{metadata['part']}"
 
 def process_policy():
     """Processa a política de compras e gera embeddings."""
@@ -50,51 +78,49 @@ def process_policy():
     os.makedirs('data/embeddings', exist_ok=True)
     os.makedirs('data/metadata', exist_ok=True)
     
+    # Remove os arquivos de uma execução anterior (o número de chunks pode ter diminuído)
+    for pattern in ('data/chunks/chunk_*.json', 'data/metadata/metadata_*.json'):
+        for path in glob.glob(pattern):
+            os.remove(path)
+    
     try:
-        # Lê o arquivo da política
-        with open('data/raw/politica.md', 'r', encoding='utf-8') as f:
-            content = f.read()
+        # Lê a política linha a linha, dividindo-a em chunks pelas seções
+        with open(POLICY_PATH, 'r', encoding='utf-8') as f:
+            chunks = chunk_policy(f, config.get('chunk_settings'))
         
-        # Divide o conteúdo em chunks
-        chunks = content.split('\n\n')
+        # Gera os embeddings em lote, reaproveitando os que já estão em cache
+        embedding_settings = config['embedding_settings']
+        embedder = BatchEmbedder(get_provider().client, embedding_settings['model'], embedding_settings)
+        cache = EmbeddingCache()
+        try:
+            embeddings = embed_with_cache(embedder, cache, [c['content'] for c in chunks], POLICY_SOURCE)
+        finally:
+            cache.close()
         
         # Processa cada chunk
-        for i, chunk in enumerate(chunks):
-            if not chunk.strip():
-                continue
-                
-            # Gera embedding
-            embedding = get_embedding(chunk, config)
+        records = []
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
             if not embedding:
                 continue
             
-            # Prepara metadados
-            metadata = {
-                'source': 'politica.md',
-                'section': f'secao_{i+1}',
-                'chunk_id': i
-            }
-            
             # Salva chunk
             chunk_data = {
-                'content': chunk,
-                'metadata': metadata
+                'id': chunk['id'],
+                'content': chunk['content'],
+                'metadata': chunk['metadata']
             }
             with open(f'data/chunks/chunk_{i}.json', 'w', encoding='utf-8') as f:
                 json.dump(chunk_data, f, ensure_ascii=False, indent=2)
             
-            # Salva embedding
-            embedding_data = {
-                'embedding': embedding,
-                'content': chunk,
-                'metadata': metadata
-            }
-            with open(f'data/embeddings/embedding_{i}.json', 'w', encoding='utf-8') as f:
-                json.dump(embedding_data, f, ensure_ascii=False, indent=2)
+            # Acumula embedding para o armazenamento binário
+            records.append({**chunk, 'embedding': embedding})
             
             # Salva metadados
             with open(f'data/metadata/metadata_{i}.json', 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2)
+                json.dump(chunk['metadata'], f, ensure_ascii=False, indent=2)
+        
+        # Salva todos os embeddings da política de uma só vez
+        EmbeddingStore().replace_source(POLICY_SOURCE, records)
         
         print("Política de compras processada com sucesso!")
         
@@ -0,0 +1,255 @@
+"""
+Classificador local de perguntas (procurement, finance ou combined).
+Combina pesos de palavras-chave com um pequeno modelo logístico sobre os
+embeddings das perguntas, treinado com as decisões anteriores do modelo de
+linguagem. O Coordinator só chama o LLM quando a confiança local é baixa.
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional
+import numpy as np
+from utils.embedding_cache import cache_key, normalize_query, abandon_inherited
+
+CATEGORIES = ("procurement", "finance", "combined")
+
+CLASSIFIER_PATH = 'data/classifier_examples.sqlite'
+
+# Valores padrão de classifier_settings
+DEFAULT_CLASSIFIER_SETTINGS = {
+    "enabled": True,
+    "confidence_threshold": 0.75,
+    "model_weight": 0.6,
+    "min_examples": 20,
+    "retrain_every": 10,
+    "max_examples": 5000,
+    "examples_path": CLASSIFIER_PATH
+}
+
+# Pesos das palavras-chave de cada domínio (baseados em MultiAgentSystem.detect_domain)
+FINANCE_KEYWORDS = {
+    "orçamento": 2.0, "orcamento": 2.0, "verba": 2.0, "quem aprova": 2.0, "aprovação": 1.5,
+    "aprovacao": 1.5, "aprovar": 1.5, "disponível": 1.0, "disponivel": 1.0, "gasto": 1.0,
+    "recurso": 1.0, "financeiro": 1.5, "custo": 1.0, "valor": 1.0, "alternativa": 0.5,
+    "dividir compra": 1.0, "realocar": 1.0, "transferência": 1.0, "transferencia": 1.0
+}
+PROCUREMENT_KEYWORDS = {
+    "permitido": 2.0, "proibido": 2.0, "pode comprar": 1.5, "posso comprar": 1.0, "regra": 1.0,
+    "política": 1.5, "politica": 1.5, "processo": 1.5, "requisição": 1.5, "requisicao": 1.5,
+    "categoria": 1.0, "item": 1.0, "comprar": 1.0, "prazo": 1.0, "etapa": 1.0,
+    "preencher": 1.0, "formulário": 1.5, "formulario": 1.5, "documento": 1.0, "fornecedor": 1.0,
+    "cotação": 1.0, "cotacao": 1.0
+}
+
+_AMOUNT_PATTERN = re.compile(r'r\$\s*\d|\d+\s*(?:reais|mil\b|k\b)', re.IGNORECASE)
+
+
+def _sigmoid(x: float) -> float:
+    """Função logística."""
+    return 1.0 / (1.0 + math.exp(-x))
+
+
+def keyword_probabilities(question: str) -> np.ndarray:
+    """Distribuição (procurement, finance, combined) a partir das palavras-chave."""
+    text = question.lower()
+    procurement = sum(weight for keyword, weight in PROCUREMENT_KEYWORDS.items() if keyword in text)
+    finance = sum(weight for keyword, weight in FINANCE_KEYWORDS.items() if keyword in text)
+    if _AMOUNT_PATTERN.search(text):
+        finance += 1.0
+
+    if procurement == 0 and finance == 0:
+        return np.full(3, 1 / 3)
+
+    # "combined" é provável quando os dois domínios aparecem com pesos parecidos
+    margin = finance - procurement
+    combined = math.exp(-margin ** 2 / 2) * (1 - math.exp(-min(procurement, finance)))
+    finance_share = (1 - combined) * _sigmoid(1.5 * margin)
+    return np.array([1 - combined - finance_share, finance_share, combined])
+
+
+class SoftmaxModel:
+    """Regressão logística multinomial treinada por gradiente descendente."""
+
+    def __init__(self, l2: float = 1e-3, learning_rate: float = 0.5, epochs: int = 200):
+        """Inicializa o modelo sem pesos (não treinado)."""
+        self.l2 = l2
+        self.learning_rate = learning_rate
+        self.epochs = epochs
+        self.weights = None
+        self.bias = None
+
+    def fit(self, vectors: np.ndarray, labels: np.ndarray) -> None:
+        """Treina o modelo com vetores normalizados e rótulos inteiros."""
+        n, dimension = vectors.shape
+        targets = np.zeros((n, len(CATEGORIES)), dtype=np.float32)
+        targets[np.arange(n), labels] = 1.0
+        weights = np.zeros((dimension, len(CATEGORIES)), dtype=np.float32)
+        bias = np.zeros(len(CATEGORIES), dtype=np.float32)
+        for _ in range(self.epochs):
+            error = self._softmax(vectors @ weights + bias) - targets
+            weights -= self.learning_rate * (vectors.T @ error / n + self.l2 * weights)
+            bias -= self.learning_rate * error.mean(axis=0)
+        self.weights, self.bias = weights, bias
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        """Softmax numericamente estável por linha."""
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    @property
+    def trained(self) -> bool:
+        """Indica se o modelo já foi treinado."""
+        return self.weights is not None
+
+    def predict(self, vector: np.ndarray) -> np.ndarray:
+        """Distribuição de probabilidade das categorias para um vetor."""
+        return self._softmax(np.asarray(vector, dtype=np.float32) @ self.weights + self.bias)
+
+
+class QuestionClassifier:
+    """Classificador local com fallback para o LLM quando a confiança é baixa."""
+
+    def __init__(self, settings: Dict = None):
+        """Inicializa o classificador e carrega os exemplos salvos."""
+        self.settings = {**DEFAULT_CLASSIFIER_SETTINGS, **(settings or {})}
+        self.threshold = self.settings['confidence_threshold']
+        self.model = SoftmaxModel()
+        self._lock = threading.Lock()
+        self._new_examples = 0
+        self.keyword_hits = 0
+        self.model_hits = 0
+        self.fallbacks = 0
+        self.conn = None
+        self._connect()
+        if self.conn is not None:
+            self._train()
+
+    def _connect(self) -> None:
+        """Abre (ou cria) a base de exemplos."""
+        try:
+            path = self.settings['examples_path']
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS examples (
+                    key TEXT PRIMARY KEY,
+                    label TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"Erro ao abrir exemplos do classificador: {e}")
+            self.conn = None
+
+    def reopen(self) -> None:
+        """Abre uma nova conexão com a base de exemplos (ex.: em um processo filho após fork).
+
+        A conexão herdada não é fechada: ela continua pertencendo ao processo pai.
+        """
+        with self._lock:
+            abandon_inherited(self.conn)
+            self.conn = None
+            self._connect()
+
+    @classmethod
+    def from_settings(cls, settings: Dict) -> Optional['QuestionClassifier']:
+        """Cria o classificador a partir de classifier_settings (None se desabilitado)."""
+        settings = {**DEFAULT_CLASSIFIER_SETTINGS, **(settings or {})}
+        return cls(settings) if settings['enabled'] else None
+
+    def _train(self) -> None:
+        """Treina o modelo com os exemplos salvos, se houver exemplos suficientes."""
+        if self.conn is None:
+            return
+        rows = self.conn.execute("SELECT label, vector FROM examples").fetchall()
+        labels = np.array([CATEGORIES.index(label) for label, _ in rows], dtype=np.int64)
+        # Exige exemplos suficientes de ao menos duas categorias
+        counts = np.bincount(labels, minlength=len(CATEGORIES)) if len(rows) else np.zeros(len(CATEGORIES))
+        if (counts >= self.settings['min_examples']).sum() < 2:
+            return
+        vectors = np.stack([np.frombuffer(vector, dtype=np.float32) for _, vector in rows])
+        self.model.fit(vectors, labels)
+
+    @property
+    def uses_embeddings(self) -> bool:
+        """Indica se o modelo sobre embeddings já pode ser usado."""
+        return self.model.trained
+
+    def predict(self, question: str, embedding: Optional[np.ndarray] = None) -> Dict:
+        """Classifica localmente a pergunta.
+
+        Returns:
+            Dict: 'category', 'confidence', 'source' ('keywords' ou 'model') e
+                  'confident' (se a confiança atinge o limiar configurado)
+        """
+        probabilities = keyword_probabilities(question)
+        source = 'keywords'
+        if embedding is not None and self.model.trained:
+            # Média geométrica ponderada: palavras-chave sem sinal (uniforme) não diluem o modelo
+            weight = self.settings['model_weight']
+            combined = (np.maximum(probabilities, 1e-9) ** (1 - weight)
+                        * np.maximum(self.model.predict(embedding), 1e-9) ** weight)
+            probabilities = combined / combined.sum()
+            source = 'model'
+        best = int(np.argmax(probabilities))
+        confidence = float(probabilities[best])
+        return {
+            'category': CATEGORIES[best],
+            'confidence': confidence,
+            'source': source,
+            'confident': confidence >= self.threshold
+        }
+
+    def record_local(self, prediction: Dict) -> None:
+        """Contabiliza uma classificação resolvida localmente."""
+        with self._lock:
+            if prediction['source'] == 'model':
+                self.model_hits += 1
+            else:
+                self.keyword_hits += 1
+
+    def record_fallback(self, question: str, embedding: Optional[np.ndarray], category: str) -> None:
+        """Contabiliza uma chamada ao LLM e guarda sua decisão como exemplo de treino."""
+        with self._lock:
+            self.fallbacks += 1
+            if self.conn is None or embedding is None or category not in CATEGORIES:
+                return
+            try:
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO examples (key, label, vector, created_at) VALUES (?, ?, ?, ?)",
+                        (cache_key('classifier', normalize_query(question)), category,
+                         np.asarray(embedding, dtype=np.float32).tobytes(), time.time())
+                    )
+                    self.conn.execute(
+                        "DELETE FROM examples WHERE key IN (SELECT key FROM examples "
+                        "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.settings['max_examples'],)
+                    )
+            except sqlite3.Error as e:
+                print(f"Erro ao salvar exemplo do classificador: {e}")
+                return
+            self._new_examples += 1
+            if self._new_examples >= self.settings['retrain_every']:
+                self._new_examples = 0
+                self._train()
+
+    def stats(self) -> Dict:
+        """Taxas de classificação local e de chamadas ao LLM."""
+        local = self.keyword_hits + self.model_hits
+        total = local + self.fallbacks
+        return {
+            'keywords': self.keyword_hits,
+            'model': self.model_hits,
+            'llm': self.fallbacks,
+            'fast_path_rate': local / total if total else 0.0,
+            'fallback_rate': self.fallbacks / total if total else 0.0
+        }
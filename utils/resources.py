@@ -0,0 +1,183 @@
+"""
+Recursos compartilhados do processo: clientes da OpenAI (sobre um único pool
+de conexões e limitador de requisições), configuração, regras financeiras e
+texto da política. Nada é criado na importação: cada recurso é construído
+na primeira vez em que é pedido e reaproveitado por todos os agentes.
+"""
+
+import json
+import threading
+from typing import Any, Callable, Dict, Optional
+from utils.budget_ledger import BudgetLedger, FINANCE_RULES_PATH
+from utils.completion_cache import CompletionCache, CachedChatClient, AsyncCachedChatClient
+from utils.embedding_store import read_corpus_hash
+from utils.http_client import RequestLimiter, create_http_client, create_async_http_client
+
+CONFIG_PATH = 'config/rag_config.json'
+POLICY_PATH = 'data/raw/politica.md'
+
+# Configuração mínima usada quando o arquivo não pode ser lido
+DEFAULT_CONFIG = {
+    "embedding_settings": {
+        "model": "text-embedding-ada-002"
+    }
+}
+
+EMPTY_FINANCE_RULES = {
+    "orcamentos": [],
+    "limites_aprovacao": []
+}
+
+
+class ResourceProvider:
+    """Cria sob demanda e guarda os recursos compartilhados pelos agentes.
+
+    Recursos podem ser injetados com set() (ex.: clientes falsos em testes e
+    benchmarks), dispensando credenciais e acesso à rede.
+    """
+
+    def __init__(self, config_path: str = CONFIG_PATH, finance_rules_path: str = FINANCE_RULES_PATH,
+                 policy_path: str = POLICY_PATH):
+        """Inicializa o provedor sem criar nenhum recurso."""
+        self.config_path = config_path
+        self.finance_rules_path = finance_rules_path
+        self.policy_path = policy_path
+        self._resources = {}
+        self._lock = threading.RLock()
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """Retorna o recurso, criando-o na primeira chamada."""
+        try:
+            return self._resources[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = factory()
+            return self._resources[name]
+
+    def set(self, name: str, value: Any) -> None:
+        """Injeta um recurso já construído (ex.: 'client', 'config')."""
+        with self._lock:
+            self._resources[name] = value
+
+    def discard(self, *names: str) -> None:
+        """Descarta recursos para que sejam recriados no próximo acesso."""
+        with self._lock:
+            for name in names:
+                self._resources.pop(name, None)
+
+    def _load_config(self) -> Dict:
+        """Carrega configuração do arquivo."""
+        try:
+            with open(self.config_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Erro ao carregar configuração: {e}")
+            return json.loads(json.dumps(DEFAULT_CONFIG))
+
+    def _load_finance_rules(self) -> Dict:
+        """Carrega regras financeiras do arquivo JSON."""
+        try:
+            with open(self.finance_rules_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Erro ao carregar regras financeiras: {e}")
+            return json.loads(json.dumps(EMPTY_FINANCE_RULES))
+
+    def _load_policy(self) -> str:
+        """Carrega o texto da política de compras."""
+        try:
+            with open(self.policy_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except Exception as e:
+            print(f"Erro ao carregar a política: {e}")
+            return ""
+
+    def _create_limiter(self) -> RequestLimiter:
+        """Limitador de concorrência e de cotas por minuto comum aos dois clientes."""
+        return RequestLimiter.from_settings(self.settings('http_settings'))
+
+    def _create_completion_cache(self) -> Optional[CompletionCache]:
+        """Cache persistente das respostas de chat, na versão atual do corpus."""
+        return CompletionCache.from_settings(self.settings('cache_settings').get('completion_cache'),
+                                             read_corpus_hash())
+    
+    def _create_client(self):
+        """Cria o cliente OpenAI síncrono sobre o pool compartilhado (lendo o .env nesse momento)."""
+        from dotenv import load_dotenv
+        from openai import OpenAI
+        load_dotenv()
+        # As novas tentativas ficam no transporte, que respeita o limitador
+        client = OpenAI(http_client=create_http_client(self.limiter, self.settings('http_settings')),
+                        max_retries=0)
+        cache = self.completion_cache
+        return CachedChatClient(client, cache) if cache is not None else client
+
+    def _create_async_client(self):
+        """Cria o cliente AsyncOpenAI sobre o pool compartilhado (lendo o .env nesse momento)."""
+        from dotenv import load_dotenv
+        from openai import AsyncOpenAI
+        load_dotenv()
+        client = AsyncOpenAI(http_client=create_async_http_client(self.limiter, self.settings('http_settings')),
+                             max_retries=0)
+        cache = self.completion_cache
+        return AsyncCachedChatClient(client, cache) if cache is not None else client
+
+    @property
+    def config(self) -> Dict:
+        """Conteúdo de config/rag_config.json."""
+        return self._get('config', self._load_config)
+
+    def settings(self, section: str, defaults: Optional[Dict] = None) -> Dict:
+        """Seção da configuração sobre os valores padrão."""
+        return {**(defaults or {}), **self.config.get(section, {})}
+
+    @property
+    def client(self):
+        """Cliente OpenAI compartilhado."""
+        return self._get('client', self._create_client)
+
+    @property
+    def async_client(self):
+        """Cliente AsyncOpenAI compartilhado."""
+        return self._get('async_client', self._create_async_client)
+
+    @property
+    def completion_cache(self) -> Optional[CompletionCache]:
+        """Cache de respostas de chat compartilhado pelos dois clientes (None se desabilitado)."""
+        return self._get('completion_cache', self._create_completion_cache)
+
+    @property
+    def limiter(self) -> RequestLimiter:
+        """Limitador de requisições à API compartilhado pelo processo."""
+        return self._get('limiter', self._create_limiter)
+
+    @property
+    def finance_rules(self) -> Dict:
+        """Conteúdo de data/raw/finance_rules.json."""
+        return self._get('finance_rules', self._load_finance_rules)
+
+    @property
+    def ledger(self) -> BudgetLedger:
+        """Orçamentos e faixas de aprovação indexados."""
+        return self._get('ledger', lambda: BudgetLedger(self.finance_rules))
+
+    @property
+    def policy(self) -> str:
+        """Texto da política de compras."""
+        return self._get('policy', self._load_policy)
+
+
+_default_provider = None
+_default_lock = threading.Lock()
+
+
+def get_provider() -> ResourceProvider:
+    """Provedor padrão do processo, criado no primeiro uso."""
+    global _default_provider
+    if _default_provider is None:
+        with _default_lock:
+            if _default_provider is None:
+                _default_provider = ResourceProvider()
+    return _default_provider
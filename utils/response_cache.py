@@ -0,0 +1,195 @@
+"""
+Cache semântico de respostas do Coordinator.
+Perguntas são comparadas pelo embedding (vizinho mais próximo por cosseno),
+mas só entre perguntas com as mesmas entidades (valores, centro de custo e
+itens), para que "compra de R$ 8.500" nunca reutilize a resposta de "compra de
+R$ 12.000", nem "notebook de R$ 5 mil" a de "monitor de R$ 5 mil".
+Os embeddings ficam em uma matriz pré-alocada, atualizada a cada inserção ou
+remoção, de modo que a busca não copia os vetores a cada pergunta.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional, Iterable
+import numpy as np
+from utils.embedding_cache import normalize_query
+from utils.budget_ledger import compile_cost_center_names, match_cost_centers
+from utils.keyword_matcher import KeywordMatcher
+
+# Valores padrão de cache_settings.response_cache
+DEFAULT_RESPONSE_CACHE_SETTINGS = {
+    "enabled": True,
+    "max_size": 1000,
+    "ttl": 3600,
+    "similarity_threshold": 0.95
+}
+
+_NUMBER_PATTERN = re.compile(r'(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d+))?\s*(mil\b|k\b)?', re.IGNORECASE)
+
+
+def extract_numbers(text: str) -> tuple:
+    """Extrai os valores numéricos da pergunta no formato brasileiro (8.500,00, 10 mil)."""
+    values = []
+    for integer, fraction, multiplier in _NUMBER_PATTERN.findall(text):
+        value = float(f"{integer.replace('.', '')}.{fraction or 0}")
+        if multiplier:
+            value *= 1000
+        values.append(round(value, 2))
+    return tuple(sorted(values))
+
+
+class ResponseCache:
+    """Cache de respostas limitado (LRU + TTL) com busca por similaridade de perguntas."""
+
+    def __init__(self, max_size: int = 1000, ttl: float = 3600,
+                 similarity_threshold: float = 0.95, cost_centers: Iterable[str] = (),
+                 item_keywords: Iterable[str] = ()):
+        """Inicializa o cache.
+
+        Args:
+            max_size: Número máximo de respostas mantidas
+            ttl: Tempo de vida de cada resposta, em segundos (0 desativa)
+            similarity_threshold: Cosseno mínimo para reutilizar a resposta de outra pergunta
+            cost_centers: Nomes dos centros de custo reconhecidos como entidades
+            item_keywords: Palavras-chave de itens reconhecidas como entidades
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._cost_centers = compile_cost_center_names(cost_centers)
+        self._items = KeywordMatcher({'itens': list(item_keywords)})
+        self._entries = OrderedDict()  # texto normalizado -> (entidades, linha na matriz, resposta, criado_em)
+        # Embeddings das perguntas em cache: uma linha por entrada, alocada no primeiro put
+        self._matrix = None
+        self._free_rows = []
+        self._key_by_row = {}
+        self._rows_by_entities = {}  # entidades -> linhas das perguntas com essas entidades
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict, cost_centers: Iterable[str] = (),
+                      item_keywords: Iterable[str] = ()) -> Optional['ResponseCache']:
+        """Cria o cache a partir de cache_settings.response_cache (None se desabilitado)."""
+        settings = {**DEFAULT_RESPONSE_CACHE_SETTINGS, **(settings or {})}
+        if not settings['enabled']:
+            return None
+        return cls(settings['max_size'], settings['ttl'], settings['similarity_threshold'],
+                   cost_centers, item_keywords)
+
+    def extract_entities(self, question: str) -> tuple:
+        """Entidades que precisam coincidir para reutilizar uma resposta."""
+        items = tuple(sorted({hit.keyword for hit in self._items.find_all(question.lower())}))
+        return extract_numbers(question), match_cost_centers(question, self._cost_centers), items
+
+    def _store_vector(self, key: str, entities: tuple, embedding) -> Optional[int]:
+        """Grava o embedding em uma linha livre da matriz (None se não houver embedding)."""
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_size + 1, vector.shape[0]), dtype=np.float32)
+            self._free_rows = list(range(self.max_size, -1, -1))
+        if vector.shape[0] != self._matrix.shape[1] or not self._free_rows:
+            return None
+        row = self._free_rows.pop()
+        self._matrix[row] = vector
+        self._key_by_row[row] = key
+        self._rows_by_entities.setdefault(entities, set()).add(row)
+        return row
+
+    def _remove(self, key: str) -> None:
+        """Remove uma entrada e libera sua linha da matriz."""
+        entities, row = self._entries.pop(key)[:2]
+        if row is not None:
+            rows = self._rows_by_entities[entities]
+            rows.discard(row)
+            if not rows:
+                del self._rows_by_entities[entities]
+            del self._key_by_row[row]
+            self._free_rows.append(row)
+
+    def _expired(self, created_at: float) -> bool:
+        """Indica se uma entrada passou do TTL."""
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def _purge_expired(self) -> None:
+        """Remove as entradas vencidas."""
+        for key in [key for key, entry in self._entries.items() if self._expired(entry[3])]:
+            self._remove(key)
+            self.expirations += 1
+
+    def get(self, question: str, embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        """Retorna a resposta de uma pergunta igual ou semanticamente equivalente.
+
+        Args:
+            question: Pergunta do usuário
+            embedding: Embedding normalizado da pergunta (sem ele, só há acerto exato)
+        """
+        key = normalize_query(question)
+        entities = self.extract_entities(question)
+        with self._lock:
+            self._purge_expired()
+
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == entities:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[2]
+
+            rows = self._rows_by_entities.get(entities)
+            if embedding is not None and rows:
+                # Vizinho mais próximo entre as perguntas com as mesmas entidades
+                rows = np.fromiter(rows, dtype=np.intp, count=len(rows))
+                similarities = (self._matrix @ np.asarray(embedding, dtype=np.float32).reshape(-1))[rows]
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    best_key = self._key_by_row[int(rows[best])]
+                    self._entries.move_to_end(best_key)
+                    self.semantic_hits += 1
+                    return self._entries[best_key][2]
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, response: str, embedding: Optional[np.ndarray] = None) -> None:
+        """Armazena a resposta de uma pergunta."""
+        key = normalize_query(question)
+        entities = self.extract_entities(question)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            row = self._store_vector(key, entities, embedding)
+            self._entries[key] = (entities, row, response, time.time())
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Esvazia o cache (ex.: após alteração no corpus)."""
+        with self._lock:
+            self._entries.clear()
+            self._rows_by_entities.clear()
+            self._key_by_row.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict:
+        """Estatísticas de uso do cache."""
+        hits = self.exact_hits + self.semantic_hits
+        total = hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': hits,
+            'exact_hits': self.exact_hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'hit_rate': hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
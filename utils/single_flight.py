@@ -0,0 +1,103 @@
+"""
+Agrupamento de chamadas idênticas em andamento (single-flight).
+Quando várias perguntas iguais chegam ao mesmo tempo, só a primeira percorre o
+pipeline; as demais aguardam o resultado dela em vez de repetir busca,
+classificação e chamadas ao modelo. Serve a threads e a corrotinas.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Executa uma única vez as chamadas simultâneas com a mesma chave.
+
+    Se a chamada líder falhar ou for interrompida, quem a aguardava executa a
+    sua própria, de modo que um cliente que desiste não afeta os outros.
+    """
+
+    def __init__(self):
+        """Inicializa sem chamadas em andamento."""
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key: str) -> tuple:
+        """Entra na chamada em andamento da chave ou passa a liderá-la.
+
+        Returns:
+            tuple: (Future com o resultado, True se quem chamou é o líder)
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            # Em execução, o Future não pode ser cancelado por quem o aguarda
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def complete(self, key: str, future: Future, result: Any) -> None:
+        """Encerra a chamada do líder e entrega o resultado a quem aguarda."""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        future.set_result(result)
+
+    def fail(self, key: str, future: Future, error: BaseException) -> None:
+        """Encerra a chamada do líder sem resultado; quem aguarda executa a sua."""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if not isinstance(error, Exception):
+            # Interrupções (cancelamento, GeneratorExit) não são repassadas como tais
+            error = RuntimeError(f"Chamada líder interrompida: {error!r}")
+        future.set_exception(error)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Executa fn uma única vez entre as chamadas simultâneas com a mesma chave."""
+        future, leader = self.join(key)
+        if not leader:
+            try:
+                return future.result()
+            except Exception:
+                return fn()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.fail(key, future, e)
+            raise
+        self.complete(key, future, result)
+        return result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Versão assíncrona de do."""
+        future, leader = self.join(key)
+        if not leader:
+            try:
+                # shield: cancelar quem aguarda não afeta o Future compartilhado
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except Exception:
+                return await fn()
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.fail(key, future, e)
+            raise
+        self.complete(key, future, result)
+        return result
+
+    def stats(self) -> Dict:
+        """Chamadas executadas e chamadas que aproveitaram uma em andamento."""
+        total = self.leaders + self.coalesced
+        return {
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'rate': self.coalesced / total if total else 0.0
+        }
@@ -0,0 +1,72 @@
+"""
+Tempos das etapas de cada pergunta (busca, classificação, agentes...).
+O temporizador da pergunta em andamento fica em uma ContextVar, de modo que
+perguntas simultâneas, em threads ou tarefas asyncio, não se misturam e o
+coordenador mede suas etapas sem receber o temporizador como argumento.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+_current_timer = contextvars.ContextVar('stage_timer', default=None)
+
+
+class StageTimer:
+    """Acumula a duração de cada etapa de uma pergunta."""
+
+    def __init__(self):
+        """Inicia a contagem do tempo total."""
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self.first_fragment = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        """Soma a duração de uma etapa (etapas repetidas são acumuladas)."""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def mark_first_fragment(self) -> None:
+        """Registra o momento em que o primeiro fragmento da resposta ficou pronto."""
+        if self.first_fragment is None:
+            self.first_fragment = time.perf_counter() - self.started_at
+
+    def summary(self) -> Dict:
+        """Durações em milissegundos."""
+        summary = {
+            'etapas_ms': {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()},
+            'total_ms': round((time.perf_counter() - self.started_at) * 1000, 1)
+        }
+        if self.first_fragment is not None:
+            summary['primeiro_fragmento_ms'] = round(self.first_fragment * 1000, 1)
+        return summary
+
+
+def current_timer() -> Optional[StageTimer]:
+    """Temporizador da pergunta em andamento (None fora de uma medição)."""
+    return _current_timer.get()
+
+
+@contextmanager
+def measure() -> Iterator[StageTimer]:
+    """Mede as etapas executadas dentro do bloco, no contexto atual."""
+    timer = StageTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Registra a duração do bloco como a etapa name, se houver medição em andamento."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - started_at)
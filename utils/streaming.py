@@ -0,0 +1,47 @@
+"""
+Geração de respostas em streaming.
+Converte as respostas em streaming da API de chat em fragmentos de texto,
+para que os agentes possam repassá-los à medida que chegam.
+"""
+
+from typing import AsyncIterator, Dict, Iterator, List
+
+CHAT_MODEL = "gpt-3.5-turbo"
+
+
+def chunk_text(chunk) -> str:
+    """Texto de um fragmento da resposta em streaming ('' se não houver)."""
+    choices = getattr(chunk, 'choices', None)
+    if not choices:
+        return ''
+    delta = getattr(choices[0], 'delta', None)
+    return getattr(delta, 'content', None) or ''
+
+
+def stream_completion(client, messages: List[Dict], model: str = CHAT_MODEL) -> Iterator[str]:
+    """Gera os fragmentos de texto de uma resposta do modelo."""
+    stream = client.chat.completions.create(model=model, messages=messages, stream=True)
+    try:
+        for chunk in stream:
+            text = chunk_text(chunk)
+            if text:
+                yield text
+    finally:
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            close()
+
+
+async def stream_completion_async(async_client, messages: List[Dict],
+                                  model: str = CHAT_MODEL) -> AsyncIterator[str]:
+    """Versão assíncrona de stream_completion."""
+    stream = await async_client.chat.completions.create(model=model, messages=messages, stream=True)
+    try:
+        async for chunk in stream:
+            text = chunk_text(chunk)
+            if text:
+                yield text
+    finally:
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            await close()
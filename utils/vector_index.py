@@ -0,0 +1,235 @@
+"""
+Construção e persistência do índice FAISS.
+O tipo do índice (Flat, IVF-Flat, HNSW ou IVF-PQ) é escolhido em
+search_settings.index do rag_config.json. O índice é gravado junto ao
+armazenamento de embeddings e carregado com mmap, sendo reconstruído apenas
+quando o hash do corpus ou os parâmetros de construção mudam.
+Todos os índices usam produto interno sobre vetores normalizados, ou seja,
+a pontuação retornada pela busca é a similaridade de cosseno. Os vetores são
+adicionados com o id numérico de cada chunk (IndexIDMap2), o que permite
+inserir e remover chunks sem reconstruir o índice.
+"""
+
+import json
+import os
+from typing import Dict, Optional, List
+import numpy as np
+import faiss
+from utils.embedding_store import EmbeddingStore, STORE_DIR
+
+INDEX_FILE = 'index.faiss'
+INDEX_META_FILE = 'index_meta.json'
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+
+# Valores padrão de search_settings.index
+DEFAULT_INDEX_SETTINGS = {
+    "type": "auto",
+    "auto_flat_max": 20000,
+    "auto_hnsw_max": 500000,
+    "nlist": 1024,
+    "nprobe": 16,
+    "M": 32,
+    "efConstruction": 200,
+    "efSearch": 64,
+    "pq_m": 64,
+    "pq_nbits": 8,
+    "train_sample": 100000
+}
+
+# Pontos de treino por centróide recomendados pelo FAISS
+MIN_POINTS_PER_CENTROID = 39
+
+
+def load_index_settings() -> Dict:
+    """Carrega search_settings.index do arquivo de configuração."""
+    try:
+        with open('config/rag_config.json', 'r') as f:
+            config = json.load(f)
+        return config.get('search_settings', {}).get('index', {})
+    except Exception as e:
+        print(f"Erro ao carregar configuração: {e}")
+        return {}
+
+
+def resolve_index_spec(settings: Dict, count: int, dimension: int) -> Dict:
+    """Resolve o tipo e os parâmetros de construção do índice para o corpus."""
+    settings = {**DEFAULT_INDEX_SETTINGS, **(settings or {})}
+    index_type = settings['type']
+
+    # Escolha automática pelo tamanho do corpus
+    if index_type == 'auto':
+        if count <= settings['auto_flat_max']:
+            index_type = 'flat'
+        elif count <= settings['auto_hnsw_max']:
+            index_type = 'hnsw'
+        else:
+            index_type = 'ivf_pq'
+
+    if index_type not in INDEX_TYPES:
+        print(f"Tipo de índice desconhecido '{index_type}'. Usando 'flat'.")
+        index_type = 'flat'
+
+    spec = {'type': index_type, 'dimension': dimension, 'metric': 'inner_product', 'id_map': True}
+    if index_type == 'hnsw':
+        spec['M'] = int(settings['M'])
+        spec['efConstruction'] = int(settings['efConstruction'])
+    elif index_type in ('ivf_flat', 'ivf_pq'):
+        # Limita nlist para que cada centróide tenha pontos suficientes de treino
+        spec['nlist'] = max(1, min(int(settings['nlist']), count // MIN_POINTS_PER_CENTROID))
+        spec['train_sample'] = int(settings['train_sample'])
+        if index_type == 'ivf_pq':
+            # m precisa dividir a dimensão e nbits não pode exceder o corpus
+            pq_m = min(int(settings['pq_m']), dimension)
+            while dimension % pq_m:
+                pq_m -= 1
+            spec['pq_m'] = pq_m
+            spec['pq_nbits'] = max(1, min(int(settings['pq_nbits']),
+                                           int(np.log2(max(count // MIN_POINTS_PER_CENTROID, 2)))))
+    return spec
+
+
+def _factory_string(spec: Dict) -> str:
+    """Monta a descrição do índice para faiss.index_factory."""
+    if spec['type'] == 'hnsw':
+        return f"IDMap2,HNSW{spec['M']},Flat"
+    if spec['type'] == 'ivf_flat':
+        return f"IDMap2,IVF{spec['nlist']},Flat"
+    if spec['type'] == 'ivf_pq':
+        return f"IDMap2,IVF{spec['nlist']},PQ{spec['pq_m']}x{spec['pq_nbits']}"
+    return "IDMap2,Flat"
+
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    """Retorna o índice interno, sem o mapeamento de ids."""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def build_index(vectors: np.ndarray, spec: Dict, ids: np.ndarray) -> faiss.Index:
+    """Cria, treina (quando necessário) e popula um índice FAISS com os ids dos chunks."""
+    index = faiss.index_factory(spec['dimension'], _factory_string(spec), faiss.METRIC_INNER_PRODUCT)
+
+    if spec['type'] == 'hnsw':
+        _base_index(index).hnsw.efConstruction = spec['efConstruction']
+
+    if not index.is_trained:
+        # Treina com uma amostra aleatória para limitar o custo em corpora grandes
+        sample = vectors
+        if len(vectors) > spec['train_sample']:
+            rows = np.random.default_rng(0).choice(len(vectors), spec['train_sample'], replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def update_index(index: faiss.Index, remove_ids: List[int], vectors: np.ndarray,
+                 add_ids: List[int]) -> bool:
+    """Remove e adiciona vetores no índice pelo id.
+
+    Retorna False se o tipo de índice não suporta remoção (ex.: HNSW), caso em
+    que o chamador deve reconstruí-lo.
+    """
+    if remove_ids:
+        try:
+            index.remove_ids(np.asarray(remove_ids, dtype=np.int64))
+        except RuntimeError:
+            return False
+    if len(add_ids):
+        index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32),
+                           np.asarray(add_ids, dtype=np.int64))
+    return True
+
+
+def apply_search_params(index: faiss.Index, settings: Dict) -> None:
+    """Aplica os parâmetros de busca (nprobe, efSearch) ao índice carregado."""
+    settings = {**DEFAULT_INDEX_SETTINGS, **(settings or {})}
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = int(settings['nprobe'])
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = int(settings['efSearch'])
+
+
+def save_index(index: faiss.Index, corpus_hash: str, spec: Dict, path: str = STORE_DIR) -> None:
+    """Grava o índice e seus metadados de forma atômica."""
+    os.makedirs(path, exist_ok=True)
+    index_path = os.path.join(path, INDEX_FILE)
+    tmp_path = index_path + '.tmp'
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, index_path)
+
+    meta = {
+        'corpus_hash': corpus_hash,
+        'spec': spec,
+        'ntotal': int(index.ntotal)
+    }
+    meta_path = os.path.join(path, INDEX_META_FILE)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def _read_index_meta(path: str) -> Dict:
+    """Lê os metadados do índice persistido, se existirem."""
+    meta_path = os.path.join(path, INDEX_META_FILE)
+    if not os.path.exists(meta_path):
+        return {}
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def load_index(corpus_hash: str, spec: Dict, path: str = STORE_DIR) -> Optional[faiss.Index]:
+    """Carrega o índice persistido com mmap se ele corresponder ao corpus e à configuração."""
+    index_path = os.path.join(path, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return None
+    meta = _read_index_meta(path)
+    if meta.get('corpus_hash') != corpus_hash or meta.get('spec') != spec:
+        return None
+
+    try:
+        # Com mmap, vários processos no mesmo host compartilham o page cache
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(index_path)
+
+
+def load_or_build_index(store: EmbeddingStore, settings: Dict = None) -> tuple:
+    """Carrega o índice persistido ou o reconstrói se o corpus ou a configuração mudaram.
+
+    Retorna o índice e a especificação com que ele foi construído.
+    """
+    spec = resolve_index_spec(settings, store.live_count, store.dimension)
+    index = load_index(store.corpus_hash, spec, store.path)
+
+    if index is None:
+        print(f"Índice de busca desatualizado ou ausente. Reconstruindo ({spec['type']})...")
+        index = build_index(store.live_vectors(), spec, store.live_vector_ids())
+        try:
+            save_index(index, store.corpus_hash, spec, store.path)
+        except Exception as e:
+            print(f"Erro ao salvar índice: {e}")
+
+    apply_search_params(index, settings)
+    return index, spec
+
+
+def build_search_index(path: str = STORE_DIR) -> bool:
+    """Constrói e persiste o índice do armazenamento atual (usado pelo setup)."""
+    store = EmbeddingStore(path)
+    if store.live_count == 0:
+        print("Nenhum embedding encontrado para indexar.")
+        return False
+    spec = resolve_index_spec(load_index_settings(), store.live_count, store.dimension)
+    index = build_index(store.live_vectors(), spec, store.live_vector_ids())
+    save_index(index, store.corpus_hash, spec, store.path)
+    print(f"Índice {spec['type']} salvo com {index.ntotal} vetores.")
+    return True